@@ -0,0 +1,209 @@
+"""
+Benchmarks of the analysis and I/O hot paths. No display is needed: nothing here
+creates a QApplication.
+
+Synthetic WAV files of several lengths and sample rates are generated in a temporary
+directory. For each file the script times loading, short term feature extraction,
+pitch and formant tracking, assembling the features into an Array and a DataFrame,
+saving and restoring them through a session store, and building and querying a plot
+decimation pyramid.
+
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --baseline results.json --threshold 0.2
+
+With --baseline, every case is compared with the stored results and the script exits
+with status 1 if any case got slower than the threshold allows.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+from praatkatili.decimate import MinMaxPyramid
+from praatkatili.features import FEATURE_LABELS, short_term_feature_matrix
+from praatkatili.formants import formant_track
+from praatkatili.pitch import pitch_track
+from praatkatili.session import SessionStore
+from praatkatili.wav import to_float
+
+# (seconds, sample rate) of the synthetic recordings
+SIGNALS = [(1, 16000), (10, 16000), (10, 44100), (60, 44100)]
+QUICK_SIGNALS = [(1, 16000), (5, 44100)]
+WINDOW = .05
+STEP = .025
+PITCH_STEP = .01
+FORMANT_WINDOW = .025
+PLOT_WIDTH = 1000
+
+
+def write_wav(path, seconds, sample_rate, seed=0):
+    """
+    Writes a mono 16 bit recording of a few harmonics with a wandering pitch, plus noise.
+    :param path:
+    :param seconds:
+    :param sample_rate:
+    :param seed:
+    :return:
+    """
+    rng = np.random.RandomState(seed)
+    t = np.arange(int(seconds * sample_rate)) / float(sample_rate)
+    f0 = 150 + 50 * np.sin(2 * np.pi * .5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    signal = sum(np.sin(k * phase) / k for k in range(1, 6)) + .05 * rng.randn(len(t))
+    samples = (signal / np.abs(signal).max() * 2 ** 14).astype("<i2")
+    w = wave.open(path, "wb")
+    try:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(samples.tobytes())
+    finally:
+        w.close()
+
+
+def measure(fn, repeat):
+    """
+    :param fn: called without arguments; a fresh setup belongs inside fn
+    :param repeat:
+    :return: dict of the best and median wall clock time in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"best": min(times), "median": float(np.median(times)), "repeat": repeat}
+
+
+def bench_file(path, label, repeat, scratch):
+    # imports PyQt5 modules, but creates no widgets
+    from praatkatili.resources import Array, WAVFile, resource_from_session
+
+    results = {}
+
+    def load():
+        resource = WAVFile(path, alias=label)
+        # mapping is lazy; converting touches every sample
+        to_float(resource.data)
+        return resource
+
+    results["load"] = measure(load, repeat)
+    resource = load()
+    Fs = resource.sample_rate
+    signal = resource.data
+
+    results["features"] = measure(lambda: short_term_feature_matrix(signal, Fs, WINDOW * Fs, STEP * Fs), repeat)
+    matrix = short_term_feature_matrix(signal, Fs, WINDOW * Fs, STEP * Fs)
+
+    results["pitch"] = measure(lambda: pitch_track(signal, Fs, PITCH_STEP * Fs), repeat)
+    results["formants"] = measure(lambda: formant_track(signal, Fs, FORMANT_WINDOW * Fs, PITCH_STEP * Fs),
+                                  repeat)
+
+    def assemble():
+        Array(alias=label, data=matrix, labels=FEATURE_LABELS).frame
+
+    results["assemble"] = measure(assemble, repeat)
+    array = Array(alias=label, data=matrix, labels=FEATURE_LABELS)
+
+    def session():
+        directory = tempfile.mkdtemp(dir=scratch)
+        store = SessionStore(directory)
+        store.save([array.to_session(store)], [])
+        manifest = SessionStore(directory).load()
+        restored = resource_from_session(manifest["resources"][0], store)
+        np.asarray(restored.data).sum()
+        shutil.rmtree(directory)
+
+    results["session"] = measure(session, repeat)
+
+    def decimate():
+        pyramid = MinMaxPyramid(signal)
+        x0, x1 = pyramid.x_range()
+        pyramid.query(x0, x1, PLOT_WIDTH)
+        pyramid.query(x0, x0 + (x1 - x0) / 10., PLOT_WIDTH)
+
+    results["decimate"] = measure(decimate, repeat)
+    return results
+
+
+def run(signals, repeat):
+    scratch = tempfile.mkdtemp(prefix="praatkatili-bench-")
+    results = {}
+    try:
+        for seconds, sample_rate in signals:
+            label = "{}s_{}Hz".format(seconds, sample_rate)
+            path = os.path.join(scratch, label + ".wav")
+            write_wav(path, seconds, sample_rate)
+            for case, timing in bench_file(path, label, repeat, scratch).items():
+                results["{}/{}".format(case, label)] = timing
+                print("{:<28}{:>10.2f} ms".format("{}/{}".format(case, label), timing["best"] * 1000))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return {"meta": {"python": platform.python_version(),
+                     "numpy": np.__version__,
+                     "platform": platform.platform(),
+                     "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "results": results}
+
+
+def compare(current, baseline, threshold):
+    """
+    :param current: results of run()
+    :param baseline: stored results of run()
+    :param threshold: relative slowdown of the best time tolerated, e.g. .2 for 20%
+    :return: names of the cases that regressed
+    """
+    regressions = []
+    print("{:<28}{:>12}{:>12}{:>9}".format("case", "baseline ms", "current ms", "ratio"))
+    for name, timing in sorted(current["results"].items()):
+        old = baseline["results"].get(name)
+        if old is None:
+            print("{:<28}{:>12}{:>12.2f}".format(name, "-", timing["best"] * 1000))
+            continue
+        # the best of several runs is the least disturbed by other load on the machine
+        ratio = timing["best"] / old["best"]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("{:<28}{:>12.2f}{:>12.2f}{:>9.2f}{}".format(name, old["best"] * 1000,
+                                                          timing["best"] * 1000, ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the PraatKatili hot paths.")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=.2,
+                        help="tolerated relative slowdown of a case (default .2)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case (default 5)")
+    parser.add_argument("--quick", action="store_true", help="only short recordings")
+    args = parser.parse_args(argv)
+
+    current = run(QUICK_SIGNALS if args.quick else SIGNALS, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=1, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print("{} case(s) slower than the baseline by more than {:.0%}.".format(len(regressions),
+                                                                                  args.threshold))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+"""
+PraatKatili. Start the application with python -m praatkatili.katil.
+"""
+
+
+def attach(alias, directory=None):
+    """
+    The data of a resource published by a running PraatKatili, without copying it;
+    for notebook kernels. See praatkatili.bridge.
+    :param alias:
+    :param directory:
+    :return:
+    """
+    # imported here, so that importing the package stays cheap
+    from praatkatili.bridge import attach
+    return attach(alias, directory)
@@ -0,0 +1,201 @@
+"""
+Periodic, incremental saving of the session.
+
+The main window reports what changes: resources as they are added or transformed,
+and the possibility of any change after a command in the IPython console, upon which
+resources are compared by Resource.session_identity. That can miss a few elements
+changed in place, so resources whose data may change in place are saved anyway when
+the window closes. Plots count the changes to their
+data (PlotCanvas.revision); their view is compared on its own, and a change of view
+only rewrites the few numbers it consists of. Every AUTOSAVE_INTERVAL seconds, and once
+more when the window closes, the changed resources are snapshotted and the changed
+plots described on the GUI thread, and written on a worker thread: their array
+payloads are hashed and stored there, the session entries of unchanged ones are taken
+from the previous save, and the manifest is replaced atomically. Window geometry and
+state are stored only when they differ from the last save.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5 import QtCore
+
+from praatkatili.perf import perf
+from praatkatili.resources import FutureRelay
+
+
+def _write_session(store, resources, plots, entries, externalized):
+    """
+    Runs on the autosave thread.
+    :param store: SessionStore
+    :param resources: list of (key, snapshot of the resource to describe, or None to
+    reuse its entry)
+    :param plots: list of (key, tab group, revision, view state, plot dict to externalize,
+    or None to reuse the last one with this view)
+    :param entries: session entries of the last save, by key
+    :param externalized: (revision, view state, externalized plot dict) of the last save,
+    by key
+    :return: the new entries and externalized plots, by key
+    """
+    with perf.action("session.autosave"):
+        new_entries, new_plots = {}, {}
+        for key, resource in resources:
+            new_entries[key] = entries[key] if resource is None else resource.to_session(store)
+        for key, tab_group, revision, view, plot in plots:
+            if plot is None:
+                plot = dict(externalized[key][2], **view)
+            else:
+                plot = store.externalize(plot)
+            new_plots[key] = revision, view, plot
+        store.save([new_entries[key] for key, _ in resources],
+                   [(tab_group, new_plots[key][2]) for key, tab_group, _, _, _ in plots])
+    return new_entries, new_plots
+
+
+class SessionAutosave(QtCore.QObject):
+    """
+    Tracks the changes to the session of a main window and saves only those, off the
+    GUI thread.
+    """
+
+    def __init__(self, main_window, interval, store=None):
+        """
+        :param main_window: Katil
+        :param interval: seconds between saves; 0 saves only when asked to
+        :param store: SessionStore; nothing is saved until one is set
+        """
+        super(SessionAutosave, self).__init__(main_window)
+        self.main_window = main_window
+        self.store = store
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(int(interval * 1000))
+        self.timer.timeout.connect(self.save)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._relay = FutureRelay(self)
+        self._relay.finished.connect(self._collect)
+        # (future, arguments) of the save being written
+        self._pending = None
+        # state of the last save
+        self._entries = {}
+        self._plots = {}
+        self._window = None
+        self._identities = {}
+        # resources changed since
+        self._dirty = set()
+        self._check_all = False
+
+    def start(self):
+        if self.timer.interval() > 0:
+            self.timer.start()
+
+    def mark(self, resources=None):
+        """
+        Marks resources as changed.
+        :param resources: None for any resource whose session identity changed
+        :return:
+        """
+        if resources is None:
+            self._check_all = True
+        else:
+            self._dirty.update(id(r) for r in resources)
+
+    def _save_window(self):
+        window = (bytes(self.main_window.saveGeometry()), bytes(self.main_window.saveState()))
+        if window == self._window:
+            return
+        settings = self.main_window.settings
+        settings.setValue("Katil/geometry", self.main_window.saveGeometry())
+        settings.setValue("Katil/windowState", self.main_window.saveState())
+        # drop the pickled resources of sessions saved before the session store existed
+        settings.remove("Katil/resources")
+        settings.remove("Katil/plots")
+        self._window = window
+
+    def _snapshot(self, closing=False):
+        """
+        Describes the session on the GUI thread, leaving out what has not changed.
+        :param closing: also describe the resources that may have changed in place,
+            see Resource.may_change_in_place
+        :return: arguments for _write_session, or None if nothing changed at all
+        """
+        check_all, self._check_all = self._check_all, False
+        dirty, self._dirty = self._dirty, set()
+        resources, identities, changed = [], {}, False
+        for resource in self.main_window.resources:
+            key = id(resource)
+            stale = key in dirty or key not in self._entries or (closing and resource.may_change_in_place())
+            if stale or check_all:
+                identities[key] = resource.session_identity()
+                stale = stale or identities[key] != self._identities.get(key)
+            else:
+                identities[key] = self._identities[key]
+            resources.append((key, resource.snapshot() if stale else None))
+            changed = changed or stale
+        self._identities = identities
+        plots = []
+        for dock in self.main_window.plots:
+            key, revision, view = id(dock), dock.canvas.revision, dock.canvas.view_state()
+            last = self._plots.get(key)
+            stale = last is None or last[0] != revision
+            plot = dock.canvas.to_dict(self.main_window.resources) if stale else None
+            plots.append((key, dock.tab_group, revision, view, plot))
+            changed = changed or stale or last[1] != view
+        # removed resources or plots only change the manifest
+        keys = (set(k for k, _ in resources), set(p[0] for p in plots))
+        if not changed and keys == (set(self._entries), set(self._plots)):
+            return None
+        return self.store, resources, plots, dict(self._entries), dict(self._plots)
+
+    def save(self):
+        """
+        Starts saving the changes, unless a save is still running; what changes in the
+        meantime is saved the next time.
+        :return:
+        """
+        if self.store is None or self._pending is not None:
+            return
+        self._save_window()
+        args = self._snapshot()
+        if args is None:
+            return
+        future = self._executor.submit(_write_session, *args)
+        self._pending = future, args
+        self._relay.watch(future, args)
+
+    def _collect(self, future, args):
+        # flush() may have collected it already
+        if self._pending is None or self._pending[0] is not future:
+            return
+        self._pending = None
+        self._apply(future, args)
+
+    def _apply(self, future, args):
+        _, resources, plots, _, _ = args
+        try:
+            self._entries, self._plots = future.result()
+        except Exception as e:
+            print("Autosave failed: {}".format(e))
+            # written again next time
+            self._dirty.update(key for key, resource in resources if resource is not None)
+            for key, _, _, _, plot in plots:
+                if plot is not None:
+                    self._plots.pop(key, None)
+            return
+
+    def flush(self):
+        """
+        Saves the changes and waits until they are written, when the window closes.
+        :return:
+        """
+        if self.store is None:
+            return
+        self.timer.stop()
+        if self._pending is not None:
+            future, args = self._pending
+            self._pending = None
+            future.exception()
+            self._apply(future, args)
+        self._save_window()
+        args = self._snapshot(closing=True)
+        if args is not None:
+            future = self._executor.submit(_write_session, *args)
+            future.exception()
+            self._apply(future, args)
@@ -0,0 +1,238 @@
+"""
+Short term feature extraction, pitch or formant tracking over many WAV files,
+without the GUI:
+
+    python -m praatkatili.batch "recordings/**/*.wav" -o features --window .05 --step .025
+    python -m praatkatili.batch "recordings/**/*.wav" -o formants --analysis formants
+
+Every input file gets its own result matrix in the output directory, at the same
+path relative to the inputs' common directory; pitch and formant tracks have the
+frame times as their first column. Files are processed in parallel by worker
+processes that each load their own files, using the loaders and the analysis code
+of the GUI. Outputs are written atomically, each with a small JSON file next to it
+recording the analysis parameters. Files whose output is newer than the file itself
+and was made with the same parameters are skipped, so an interrupted run continues
+where it stopped when started again, and a run with other parameters redoes them.
+
+Neither this module nor anything it imports needs Qt.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from praatkatili.features import EXTRACTOR_VERSION, FEATURE_LABELS, as_mono, short_term_feature_matrix
+from praatkatili.formants import formant_track
+from praatkatili.parallel import default_workers
+from praatkatili.pitch import pitch_track
+from praatkatili.wav import load_wav
+
+FORMATS = ("npy", "npz", "csv")
+# analysis: (output suffix, default window, default step), in seconds; pitch
+# windows follow from the pitch floor
+ANALYSES = {"features": ("stf", .05, .05),
+            "pitch": ("pitch", None, .01),
+            "formants": ("formants", .025, .01)}
+
+
+def find_inputs(patterns):
+    """
+    :param patterns: glob patterns; ** matches any number of directories
+    :return: sorted absolute paths, without duplicates
+    """
+    paths = set()
+    for pattern in patterns:
+        for path in glob.glob(os.path.expanduser(pattern), recursive=True):
+            if os.path.isfile(path):
+                paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+
+def output_path(path, root, output_dir, fmt, analysis="features"):
+    relative = os.path.relpath(path, root)
+    return os.path.join(output_dir, "{}.{}.{}".format(os.path.splitext(relative)[0], ANALYSES[analysis][0], fmt))
+
+
+def params_path(out):
+    return out + ".json"
+
+
+def analysis_params(analysis, window, step):
+    """
+    :return: what determines an output besides the input file, as recorded next to it
+    """
+    params = {"analysis": analysis, "window": window, "step": step}
+    if analysis == "features":
+        params["version"] = EXTRACTOR_VERSION
+    return params
+
+
+def is_done(path, out, params):
+    """
+    :param path: input file
+    :param out: its output file
+    :param params: see analysis_params
+    :return: whether out is newer than path and was made with params
+    """
+    try:
+        if os.path.getmtime(out) < os.path.getmtime(path):
+            return False
+        with open(params_path(out)) as f:
+            return json.load(f) == params
+    except (OSError, ValueError):
+        return False
+
+
+def analyze(analysis, signal, Fs, window, step):
+    """
+    :param analysis: one of ANALYSES
+    :param signal: 1-D samples
+    :param Fs: sample rate
+    :param window: in seconds; unused for pitch
+    :param step: in seconds
+    :return: result matrix, its column labels
+    """
+    if analysis == "features":
+        return short_term_feature_matrix(signal, Fs, window * Fs, step * Fs), FEATURE_LABELS
+    if analysis == "pitch":
+        track = pitch_track(signal, Fs, step * Fs)
+    else:
+        track = formant_track(signal, Fs, window * Fs, step * Fs)
+    return np.column_stack((track.index.values, track.values)), ["Time"] + list(track.columns)
+
+
+def write_features(out, features, fmt, Fs, window, step, labels=FEATURE_LABELS):
+    """
+    Writes a result matrix to out, through a temporary file so that an interrupted
+    run never leaves a partial output behind.
+    """
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    tmp = "{}.{}.tmp".format(out, os.getpid())
+    with open(tmp, "wb") as f:
+        if fmt == "npy":
+            np.save(f, features)
+        elif fmt == "npz":
+            np.savez(f, features=features, labels=np.array(labels),
+                     sample_rate=Fs, window=window, step=step)
+        else:
+            np.savetxt(f, features, delimiter=",", header=",".join(labels), comments="")
+    os.replace(tmp, out)
+
+
+def write_params(out, params):
+    tmp = "{}.{}.tmp".format(params_path(out), os.getpid())
+    with open(tmp, "w") as f:
+        json.dump(params, f)
+    os.replace(tmp, params_path(out))
+
+
+def process_file(path, out, window, step, fmt, analysis="features"):
+    """
+    Runs in a worker process.
+    :param path: WAV file
+    :param out: output file
+    :param window: in seconds
+    :param step: in seconds
+    :param fmt: one of FORMATS
+    :param analysis: one of ANALYSES
+    :return: number of frames
+    """
+    Fs, data = load_wav(path)
+    result, labels = analyze(analysis, as_mono(data), Fs, window, step)
+    # the parameters of an earlier output must not vouch for this one if it is interrupted
+    try:
+        os.remove(params_path(out))
+    except OSError:
+        pass
+    write_features(out, result, fmt, Fs, window, step, labels)
+    write_params(out, analysis_params(analysis, window, step))
+    return len(result)
+
+
+def run(paths, output_dir, window=None, step=None, fmt="npy", workers=None, force=False, root=None,
+        analysis="features"):
+    """
+    :param paths: WAV files
+    :param output_dir:
+    :param window: in seconds; the analysis' default if None
+    :param step: in seconds; the analysis' default if None
+    :param fmt: one of FORMATS
+    :param workers: worker processes, all cores by default
+    :param force: also process files whose output is up to date, see is_done
+    :param root: directory the outputs mirror; the common directory of paths by default
+    :param analysis: one of ANALYSES
+    :return: list of (path, error message) of the files that failed
+    """
+    if not paths:
+        return []
+    _, default_window, default_step = ANALYSES[analysis]
+    window = default_window if window is None else window
+    step = default_step if step is None else step
+    if root is None:
+        root = os.path.commonpath([os.path.dirname(p) for p in paths])
+    jobs = [(p, output_path(p, root, output_dir, fmt, analysis)) for p in paths]
+    params = analysis_params(analysis, window, step)
+    todo = [(p, out) for p, out in jobs if force or not is_done(p, out, params)]
+    print("{} files, {} already done.".format(len(jobs), len(jobs) - len(todo)))
+
+    failed = []
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=workers or default_workers()) as pool:
+        futures = {pool.submit(process_file, p, out, window, step, fmt, analysis): p for p, out in todo}
+        try:
+            for i, future in enumerate(as_completed(futures)):
+                path = futures[future]
+                try:
+                    frames = future.result()
+                except Exception as e:
+                    failed.append((path, str(e)))
+                    print("[{}/{}] {} failed: {}".format(i + 1, len(todo), path, e))
+                else:
+                    print("[{}/{}] {}: {} frames".format(i + 1, len(todo), path, frames))
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            print("Interrupted; finished files are kept and skipped on the next run.")
+            raise
+    print("Done in {:.1f} s, {} failed.".format(time.time() - started, len(failed)))
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m praatkatili.batch",
+                                     description="Extracts the 34 short term features, or the pitch "
+                                                 "or formant tracks, of WAV files.")
+    parser.add_argument("inputs", nargs="+", help="WAV files or glob patterns (quote them; ** recurses)")
+    parser.add_argument("-o", "--output", required=True, help="output directory")
+    parser.add_argument("--analysis", choices=sorted(ANALYSES), default="features",
+                        help="what to extract (default features)")
+    parser.add_argument("--window", type=float, default=None,
+                        help="window size in seconds (default .05 for features, .025 for formants)")
+    parser.add_argument("--step", type=float, default=None,
+                        help="step size in seconds (default .05 for features, .01 otherwise)")
+    parser.add_argument("--format", choices=FORMATS, default="npy", help="output format (default npy)")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--force", action="store_true", help="also redo files whose output is up to date and was made with the same "
+                             "parameters")
+    args = parser.parse_args(argv)
+
+    paths = find_inputs(args.inputs)
+    if not paths:
+        print("No input files match {}.".format(" ".join(args.inputs)))
+        return 1
+    try:
+        failed = run(paths, args.output, args.window, args.step, args.format, args.workers, args.force,
+                     analysis=args.analysis)
+    except KeyboardInterrupt:
+        return 130
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
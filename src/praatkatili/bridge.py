@@ -0,0 +1,333 @@
+"""
+Publishes the data of resources to other processes, such as the kernels of the
+notebook dock, without copying it per process.
+
+The main window's Bridge writes an index of the resources it offers, with their
+types, labels and sample rates, into a directory of its own. Their data is published
+only when a kernel first attaches one: attach() leaves a request in the directory,
+the main window serves it by putting the resource's buffer in POSIX shared memory
+and adding shapes and dtypes to the index, and attach() maps what the index then
+describes. A resource that changes is offered again, and published again on the
+next attach. Memory mapped files are not copied at all: the index points at the
+file, and attaching maps it again, sharing the OS page cache. The notebook server,
+and with it every kernel, finds the directory in the PRAATKATILI_BRIDGE environment
+variable. In a kernel:
+
+    import praatkatili
+    signal = praatkatili.attach("recording.wav")
+
+Attached arrays are read-only views of the shared buffers. Like features and perf,
+this module does not import Qt, so kernels need not have it.
+"""
+import glob
+import json
+import os
+import shutil
+import tempfile
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from praatkatili.parallel import share
+from praatkatili.util import sanitize_alias
+
+ENV_VAR = "PRAATKATILI_BRIDGE"
+INDEX = "index.json"
+REQUESTS = "requests"
+# seconds attach() waits for the main window to publish a resource
+ATTACH_TIMEOUT = 30
+ATTACH_POLL = .05
+
+# blocks attached by this process; kept open for as long as it runs, since the
+# arrays handed out are views into them
+_attached = {}
+
+
+class BridgeError(Exception):
+    pass
+
+
+def _column(values):
+    column = np.asarray(values)
+    if column.dtype.hasobject:
+        # text; fixed width strings can be shared
+        column = column.astype(str)
+    return column
+
+
+class Bridge(object):
+    """
+    Publishing side, owned by the main window. Blocks are unlinked when a resource
+    is offered again, unpublished or the bridge is closed; processes that attached
+    them keep their views.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or tempfile.mkdtemp(prefix="praatkatili-bridge-")
+        self.request_dir = os.path.join(self.directory, REQUESTS)
+        os.makedirs(self.request_dir, exist_ok=True)
+        self.entries = {}
+        # alias: resource, for the requests to publish it
+        self._offered = {}
+        # alias: shared arrays backing the entry
+        self._blocks = {}
+        self._write_index()
+
+    def environment(self):
+        """
+        :return: copy of os.environ pointing child processes at this bridge, with this
+            package on their path
+        """
+        env = dict(os.environ)
+        env[ENV_VAR] = self.directory
+        package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env["PYTHONPATH"] = os.pathsep.join(p for p in (package_root, env.get("PYTHONPATH")) if p)
+        return env
+
+    def _share(self, array, blocks):
+        spec, shared = share(array)
+        if shared is not None:
+            blocks.append(shared)
+        return list(spec)
+
+    def _describe(self, data, blocks):
+        import pandas as pd
+        if isinstance(data, pd.Series):
+            name = data.name
+            data = data.to_frame()
+            if name is None:
+                data.columns = [None]
+            kind = "Series"
+        elif isinstance(data, pd.DataFrame):
+            kind = "DataFrame"
+        else:
+            array = np.asanyarray(data)
+            if array.dtype.hasobject:
+                raise BridgeError("Arrays of Python objects cannot be shared.")
+            return {"kind": "ndarray", "block": self._share(array, blocks)}
+        index = data.index
+        plain = isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1
+        return {"kind": kind,
+                "columns": [{"name": None if c is None else str(c),
+                             "block": self._share(_column(data.iloc[:, i]), blocks)}
+                            for i, c in enumerate(data.columns)],
+                "index": None if plain else self._share(_column(index), blocks),
+                "index_name": None if index.name is None else str(index.name)}
+
+    def _entry(self, resource):
+        return {"alias": resource.alias,
+                "type": resource.__class__.__name__,
+                "sample_rate": getattr(resource, "sample_rate", None),
+                "labels": getattr(resource, "labels", None)}
+
+    def offer(self, resources):
+        """
+        Lists resources in the index without their data, which is published when a
+        kernel asks for it; for resources published before, because it changed.
+        :param resources:
+        :return:
+        """
+        for resource in resources:
+            self._release(resource.alias)
+            self._offered[resource.alias] = resource
+            self.entries[resource.alias] = self._entry(resource)
+        self._write_index()
+
+    def publish(self, resource, request=None):
+        """
+        Publishes, or republishes, the data of a resource under its alias. Loads the
+        resource if it is not loaded yet. If that fails, the error is recorded in
+        the index for attach() to report, and raised.
+        :param resource:
+        :param request: id of the request served, see attach
+        :return:
+        """
+        blocks = []
+        entry = self._entry(resource)
+        entry["request"] = request
+        try:
+            desc = self._describe(resource.data, blocks)
+        except Exception as e:
+            for block in blocks:
+                block.release()
+            self._release(resource.alias)
+            entry["error"] = str(e)
+            self.entries[resource.alias] = entry
+            self._write_index()
+            raise
+        self._release(resource.alias)
+        entry["data"] = desc
+        self.entries[resource.alias] = entry
+        self._offered[resource.alias] = resource
+        self._blocks[resource.alias] = blocks
+        self._write_index()
+
+    def serve_requests(self):
+        """
+        Publishes the resources kernels asked for since the last call; what cannot be
+        published is reported and skipped.
+        :return: aliases of the resources asked for
+        """
+        served = []
+        try:
+            names = sorted(os.listdir(self.request_dir))
+        except OSError:
+            # closed
+            return served
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.request_dir, name)
+            try:
+                with open(path) as f:
+                    request = json.load(f)
+                os.remove(path)
+            except (OSError, ValueError):
+                continue
+            alias = request.get("alias")
+            resource = self._offered.get(alias)
+            if resource is None:
+                continue
+            served.append(alias)
+            try:
+                self.publish(resource, request.get("id"))
+            except Exception as e:
+                print("Could not publish {}: {}".format(alias, e))
+        return served
+
+    def unpublish(self, alias):
+        self._offered.pop(alias, None)
+        if alias in self.entries:
+            del self.entries[alias]
+            self._release(alias)
+            self._write_index()
+
+    def _release(self, alias):
+        for block in self._blocks.pop(alias, []):
+            block.release()
+
+    def _write_index(self):
+        path = os.path.join(self.directory, INDEX)
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp, "w") as f:
+            json.dump({"pid": os.getpid(), "resources": list(self.entries.values())}, f)
+        os.replace(tmp, path)
+
+    def close(self):
+        for alias in list(self._blocks):
+            self._release(alias)
+        self.entries = {}
+        self._offered = {}
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def find_directory():
+    """
+    :return: the bridge directory of the notebook server this process was started
+        from, or else the most recently updated one
+    """
+    directory = os.environ.get(ENV_VAR)
+    if directory:
+        return directory
+    indices = glob.glob(os.path.join(tempfile.gettempdir(), "praatkatili-bridge-*", INDEX))
+    if not indices:
+        raise BridgeError("No PraatKatili instance publishes resources.")
+    return os.path.dirname(max(indices, key=os.path.getmtime))
+
+
+def published(directory=None):
+    """
+    :param directory: bridge directory, see find_directory
+    :return: index entries of the offered resources: alias, type, sample_rate and
+        labels, and the description of the data once published
+    """
+    try:
+        with open(os.path.join(directory or find_directory(), INDEX)) as f:
+            return json.load(f)["resources"]
+    except (OSError, ValueError) as e:
+        raise BridgeError("Cannot read the published resources: {}".format(e))
+
+
+def _attach_block(spec):
+    if spec[0] == "file":
+        _, filename, offset, shape, dtype = spec
+        return np.memmap(filename, dtype=np.dtype(dtype), mode="r", offset=offset, shape=tuple(shape))
+    _, name, shape, dtype = spec
+    shm = _attached.get(name)
+    if shm is None:
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # before Python 3.13 every attach is tracked, and the tracker would unlink
+            # the block when this process exits
+            from multiprocessing import resource_tracker
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+        _attached[name] = shm
+    array = np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=shm.buf)
+    array.flags.writeable = False
+    return array
+
+
+def _find(entries, alias):
+    matches = [e for e in entries if e["alias"] == alias] or \
+              [e for e in entries if sanitize_alias(e["alias"]) == alias]
+    return matches[0] if matches else None
+
+
+def _request(directory, alias, timeout):
+    """
+    Asks the main window to publish a resource, and waits for it.
+    :return: its index entry, with the description of the data
+    """
+    request = "{}-{}".format(os.getpid(), time.time())
+    path = os.path.join(directory, REQUESTS, "{}.json".format(request))
+    with open(path + ".tmp", "w") as f:
+        json.dump({"alias": alias, "id": request}, f)
+    os.replace(path + ".tmp", path)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        entry = _find(published(directory), alias)
+        if entry is None:
+            break
+        if "data" in entry:
+            return entry
+        if entry.get("request") == request and "error" in entry:
+            raise BridgeError("Cannot publish {}: {}".format(alias, entry["error"]))
+        time.sleep(ATTACH_POLL)
+    raise BridgeError("PraatKatili did not publish {} within {} s.".format(alias, timeout))
+
+
+def attach(alias, directory=None, timeout=ATTACH_TIMEOUT):
+    """
+    The data of a published resource, without copying it.
+    :param alias: alias of the resource, as shown in the resource list, or the name
+        it has in the IPython console
+    :param directory: bridge directory, see find_directory
+    :param timeout: seconds to wait for the main window to publish the resource
+    :return: read-only ndarray, or Series or DataFrame over read-only columns
+    """
+    directory = directory or find_directory()
+    entries = published(directory)
+    entry = _find(entries, alias)
+    if entry is None:
+        raise KeyError("No published resource {!r}; published are: {}".format(
+            alias, ", ".join(e["alias"] for e in entries)))
+    if "data" not in entry:
+        entry = _request(directory, entry["alias"], timeout)
+    desc = entry["data"]
+    try:
+        if desc["kind"] == "ndarray":
+            return _attach_block(desc["block"])
+        import pandas as pd
+        index = None if desc["index"] is None else pd.Index(_attach_block(desc["index"]), name=desc["index_name"])
+        columns = [c["name"] for c in desc["columns"]]
+        arrays = [_attach_block(c["block"]) for c in desc["columns"]]
+    except FileNotFoundError:
+        raise BridgeError("{} was unpublished or republished meanwhile; attach it again.".format(alias))
+    if desc["kind"] == "Series":
+        return pd.Series(arrays[0], index=index, name=columns[0], copy=False)
+    frame = pd.DataFrame(dict(zip(range(len(arrays)), arrays)), index=index, copy=False)
+    frame.columns = columns
+    return frame
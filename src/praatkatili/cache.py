@@ -0,0 +1,189 @@
+"""
+Persistent cache of computed feature matrices.
+
+Entries are .npy files named after a hash of the source (the file's path, mtime and
+size when the samples are the file's own read-only mapping, otherwise the contents of
+the buffer), the analysis parameters and the extractor version. The directory is
+kept under a size cap by evicting the least recently used entries; a hit refreshes
+the entry's mtime.
+"""
+import hashlib
+import mmap
+import os
+
+import numpy as np
+
+from praatkatili.features import DEFAULT_CHUNK_SIZE, EXTRACTOR_VERSION, short_term_feature_matrix
+from praatkatili.perf import perf
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "praatkatili", "features")
+DEFAULT_MAX_BYTES = 2 * 2 ** 30
+
+# rows hashed at a time, so that hashing a memory mapped buffer stays bounded in memory
+_HASH_ROWS = 2 ** 20
+
+
+def file_key(path):
+    """
+    Identifies a file by path, modification time and size, without reading it.
+    :param path:
+    :return:
+    """
+    st = os.stat(path)
+    return "file:{}:{}:{}".format(os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+def is_file_mapping(signal, path):
+    """
+    Whether signal is the read-only memory mapping of path itself, so that its contents
+    are those of the file: not a view into it, and not a buffer modified since.
+    :param signal:
+    :param path:
+    :return:
+    """
+    return isinstance(signal, np.memmap) and isinstance(signal.base, mmap.mmap) and \
+        not signal.flags.writeable and signal.filename == os.path.abspath(path)
+
+
+def source_key(signal, path=None):
+    """
+    Identifies the samples of a signal for the cache: by file_key if they are the
+    untouched mapping of path, by content_key otherwise.
+    :param signal:
+    :param path: file the signal was read from, if any
+    :return:
+    """
+    if path is not None and is_file_mapping(signal, path):
+        return "{}:{}:{}:{}".format(file_key(path), signal.offset, signal.shape, signal.dtype.str)
+    return content_key(signal)
+
+
+def array_digest(data):
+    """
+    SHA-1 of an array's contents, dtype and shape.
+    :param data:
+    :return: hex digest
+    """
+    data = np.asanyarray(data)
+    h = hashlib.sha1("{}{}".format(data.dtype.str, data.shape).encode())
+    for start in range(0, len(data), _HASH_ROWS):
+        h.update(np.ascontiguousarray(data[start:start + _HASH_ROWS]))
+    return h.hexdigest()
+
+
+def content_key(data):
+    """
+    Identifies an array by a hash of its contents, dtype and shape.
+    :param data:
+    :return:
+    """
+    return "data:" + array_digest(data)
+
+
+class FeatureCache(object):
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, source, *params):
+        """
+        Cache key for a source (see file_key and content_key) and the parameters
+        that determine the result, such as sample rate, window, step and version.
+        :param source:
+        :param params:
+        :return:
+        """
+        return hashlib.sha1(repr((source,) + params).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".npy")
+
+    def get(self, key):
+        """
+        :param key:
+        :return: the cached array, or None
+        """
+        path = self._path(key)
+        try:
+            data = np.load(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return data
+
+    def put(self, key, data):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp, "wb") as f:
+            np.save(f, np.asarray(data))
+        # readers never see a partially written entry
+        os.replace(tmp, path)
+        self.evict()
+
+    def entries(self):
+        """
+        :return: (mtime, size, path) of every entry, least recently used first
+        """
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith(".npy"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
+
+
+def cached_short_term_feature_matrix(cache, signal, Fs, win, step, path=None,
+                                     chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    short_term_feature_matrix, looked up in and stored to the cache.
+    :param cache: a FeatureCache, or None to always compute
+    :param signal:
+    :param Fs:
+    :param win:
+    :param step:
+    :param path: file the signal was read from, if any; saves hashing the samples while
+        they are the file's own mapping, see source_key
+    :param chunk_size:
+    :param progress:
+    :return:
+    """
+    if cache is None:
+        return short_term_feature_matrix(signal, Fs, win, step, chunk_size, progress)
+    key = cache.key(source_key(signal, path), Fs, int(win), int(step), EXTRACTOR_VERSION)
+    result = cache.get(key)
+    if result is None:
+        perf.count("features.cache_miss")
+        result = short_term_feature_matrix(signal, Fs, win, step, chunk_size, progress)
+        cache.put(key, result)
+    else:
+        perf.count("features.cache_hit")
+    return result
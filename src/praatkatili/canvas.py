@@ -1 +1,594 @@
-import randomfrom PyQt5.QtWidgets import QSizePolicyfrom matplotlib import pyplot as pltfrom matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvasfrom matplotlib.figure import Figureplt.style.use("ggplot")class PlotCanvas(FigureCanvas):    """    Matplotlib canvas that holds exactly one figure.     """    def __init__(self, parent=None, width=5, height=4, dpi=100, blank=False,                 dock=None):        fig = Figure(figsize=(width, height), dpi=dpi)        self.axes = fig.add_subplot(111)        self.plot_type = None        self.data = None        self.plot_args = None        self.dock = dock        FigureCanvas.__init__(self, fig)        self.setParent(parent)        FigureCanvas.setSizePolicy(self,                                   QSizePolicy.Expanding,                                   QSizePolicy.Expanding)        self.centre_shift = [0, 0]        self.centre = [0, 0]        self.scale = [1, 1]        FigureCanvas.updateGeometry(self)        self.xlim, self.ylim = self.axes.get_xlim(), self.axes.get_ylim()        # self.called_func = []        # self.called_args = []        self.plot_dummy()        if blank:            self.clear()    def plot_dummy(self):        data = [random.random() * 60 for i in range(25)]        self.plot_line(data, 'Dummy')    def clear(self):        self.axes.clear()    def recenter(self):        self.xlim = self.axes.get_xlim()        self.ylim = self.axes.get_ylim()        self.centre[0] = sum(self.xlim) / 2        self.centre[1] = sum(self.ylim) / 2        self.xdelta = abs(self.xlim[1] - self.xlim[0]) / 20.        self.ydelta = abs(self.ylim[1] - self.ylim[0]) / 20.    def set_dock(self, dock):        self.dock = dock    def set_title(self, title, draw=True):        self.axes.set_title(title)        t = self.dock.windowTitle().split("(")[-1]        self.dock.setWindowTitle("{} ({}".format(title, t))        self.draw() if draw else 1    def get_title(self):        return self.axes.get_title()    def plot_line(self, data=None, title=None):        if data is not None:            self.data = data        self.plot_args = (self.data, title)        self.axes.plot(self.data)        if title is not None:            self.set_title(title, draw=False)        self.recenter()        self.plot_type = "line"        self.draw()    def plot_scatter(self, data, title=None):        if data is not None:            self.data = data        self.plot_args = (self.data, title)        self.axes.scatter(*zip(*enumerate(self.data)))        if title is not None:            self.set_title(title, draw=False)        self.recenter()        self.plot_type = "scatter"        self.draw()    def reset(self):        self.axes.autoscale()    def set_xshift(self, n):        self.centre_shift[0] = n        self.draw()    def set_yshift(self, n):        self.centre_shift[1] = n        self.draw()    def set_xzoom(self, n):        # scale between 0, 1000        self.scale[0] = 5 - (n + 250) / 500 * 5        # if n < 0:        #     self.scale[0] *= -1        self.draw()    def set_yzoom(self, n):        self.scale[1] = 5 - (n + 250) / 500 * 5        self.draw()    def draw(self):        radius_x = (self.xlim[1] - self.xlim[0]) / 2        radius_y = (self.ylim[1] - self.ylim[0]) / 2        new_xlim = self.xdelta * self.centre_shift[0] + self.centre[0]        new_xlim += (-radius_x * self.scale[0], radius_x * self.scale[0])        new_ylim = self.ydelta * self.centre_shift[1] + self.centre[1]        new_ylim += (-radius_y * self.scale[1], radius_y * self.scale[1])        self.axes.set_xlim(*new_xlim)        self.axes.set_ylim(*new_ylim)        super(PlotCanvas, self).draw()    def to_dict(self):        return {            "plot_args": self.plot_args,            "plot_type": self.plot_type,            "xlim": self.xlim,            "ylim": self.ylim,            "centre_shift": self.centre_shift,            "scale": self.scale,            "title": self.get_title()        }    def from_dict(self, d):        class DictAsObject(object):            def __init__(self, d):                self.__dict__.update(d)        d = DictAsObject(d)        self.clear()        plot_func = "plot_{}".format(d.plot_type)        plot_func = getattr(self, plot_func)        plot_func(*d.plot_args)        self.set_title(d.title, draw=False)        self.axes.set_xlim(d.xlim)        self.axes.set_ylim(d.ylim)        self.centre_shift = d.centre_shift        self.scale = d.scale        self.recenter()        self.draw()
\ No newline at end of file
+"""
+Matplotlib canvas shown in plot docks.
+"""
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from PyQt5 import QtCore, sip
+from matplotlib import style
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.colors import Normalize
+from matplotlib.figure import Figure
+
+from praatkatili.decimate import MinMaxPyramid
+from praatkatili.perf import perf
+from praatkatili.spectrogram import DYNAMIC_RANGE, SpectrogramTiles
+
+style.use("ggplot")
+
+
+def split_columns(data, labels=None):
+    """
+    Splits plottable data into (x, y, label) per column. x is None when the data
+    is indexed 0, 1, 2, ...
+    :param data: ndarray, memmap, Series or DataFrame
+    :param labels: column names of an ndarray
+    :return:
+    """
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    if isinstance(data, pd.DataFrame):
+        x = None if isinstance(data.index, pd.RangeIndex) and data.index.start == 0 \
+                    and data.index.step == 1 else np.asarray(data.index)
+        return [(x, data[c].values, str(c)) for c in data.columns]
+    data = np.asanyarray(data)
+    if data.ndim == 1:
+        return [(None, data, labels[0] if labels else None)]
+    if labels is None:
+        labels = range(data.shape[1])
+    return [(None, data[:, i], str(label)) for i, label in enumerate(labels)]
+
+
+def source_ref(resource):
+    """
+    :param resource: a plotted resource
+    :return: JSON serializable reference to it, see resolve_source
+    """
+    return {"alias": resource.alias, "path": getattr(resource, "path", None)}
+
+
+def resolve_source(ref, resources=None):
+    """
+    Finds the resource a series was plotted from again, after a restore.
+    :param ref: see source_ref
+    :param resources: the main window's ResourceRegistry
+    :return: the resource, or None if it is gone
+    """
+    path = ref.get("path")
+    resource = None
+    if resources is not None:
+        resource = resources.by_path(path) if path is not None else resources.by_alias(ref["alias"])
+    if resource is None and path is not None and os.path.exists(path):
+        # no longer a resource, but the file is still there
+        from praatkatili.resources import FileTypes
+        ftype = FileTypes.get("*" + os.path.splitext(path)[1].lower())
+        if ftype is not None:
+            resource = ftype(path, alias=ref["alias"])
+    return resource
+
+
+class RenderScheduler(QtCore.QObject):
+    """
+    Coalesces redraw requests of a PlotCanvas into at most one render per frame
+    interval. A burst of slider values thus costs a single redraw, made with the
+    values current when the frame is due.
+    """
+    FRAME_INTERVAL = 16
+
+    def __init__(self, canvas, interval=FRAME_INTERVAL):
+        super(RenderScheduler, self).__init__(canvas)
+        self.canvas = canvas
+        self.full = False
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+
+    def request(self, full=False):
+        """
+        :param full: whether data or style changed, as opposed to just the view limits
+        :return:
+        """
+        self.full = self.full or full
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        self.canvas.render()
+
+    def take(self):
+        """
+        Clears the pending request; called by the canvas once it renders.
+        :return: whether a full redraw was requested
+        """
+        self.timer.stop()
+        full, self.full = self.full, False
+        return full
+
+
+class PlotCanvas(FigureCanvas):
+    """
+    The plot of a PlotDock. Line plots are drawn from min/max pyramids, so that at any
+    zoom level only about two points per pixel column are handed to matplotlib.
+
+    Zoom and shift come from the dock's sliders (-250..250). A zoom of HOME_ZOOM shows
+    the whole data range; below it the view widens linearly, to five times the range
+    at the bottom of the slider, and every ZOOM_DECADE steps above it zoom in tenfold.
+    The shift moves the view center by up to half the data range either way.
+
+    Redraws go through a RenderScheduler. A full draw() happens only when data or
+    style changed; it renders the figure without the axes, caches that as the
+    background and blits the axes on top. Changes of the view limits only restore
+    the background and blit the axes again.
+    """
+    HOME_ZOOM = 150
+    ZOOM_DECADE = 25
+    # (series, tile key, tile) from the spectrogram worker
+    tile_ready = QtCore.pyqtSignal(object)
+
+    def __init__(self, parent=None, width=5, height=4, dpi=100, blank=False,
+                 dock=None):
+        self.figure = Figure(figsize=(width, height), dpi=dpi)
+        self.axes = self.figure.add_subplot(111)
+        super(PlotCanvas, self).__init__(self.figure)
+        self.setParent(parent)
+        self.dock = dock
+        self.series = []
+        # counts changes to the plotted data worth saving with the session; the view
+        # (zoom and shift) is compared on its own, see view_state and praatkatili.autosave
+        self.revision = 0
+        self.home = None
+        self.zoom = [self.HOME_ZOOM, self.HOME_ZOOM]
+        self.shift = [0, 0]
+        self._updating = False
+        self._view_changed = False
+        self._capturing = False
+        self.background = None
+        self.scheduler = RenderScheduler(self)
+        self._tile_pool = None
+        self.tile_ready.connect(self._add_tile)
+        self._connect_axes()
+        self.mpl_connect("resize_event", lambda event: self.update_lod())
+        self.mpl_connect("draw_event", self._on_draw)
+        if not blank:
+            self.plot_dummy()
+
+    def plot_dummy(self):
+        data = [random.random() * 60 for i in range(25)]
+        self.plot_line(data, 'Dummy')
+        self.recenter()
+
+    def _connect_axes(self):
+        # also catches limit changes made from the console or the matplotlib toolbar
+        self.axes.callbacks.connect("xlim_changed", lambda ax: self.update_lod())
+
+    def mark_changed(self):
+        self.revision += 1
+
+    def clear(self):
+        self.mark_changed()
+        self.stop_tiles()
+        self.axes.clear()
+        self._connect_axes()
+        self.series = []
+        self.home = None
+        self.scheduler.request(full=True)
+
+    def set_dock(self, dock):
+        self.dock = dock
+
+    def set_title(self, title, draw=True):
+        """
+        Sets the title of the plot and of its dock.
+        :param title:
+        :param draw: whether to redraw now, as opposed to with the next change
+        :return:
+        """
+        self.mark_changed()
+        self.axes.set_title(title)
+        if self.dock is not None:
+            t = self.dock.windowTitle().split("(")[-1]
+            self.dock.setWindowTitle("{} ({}".format(title, t))
+        if draw:
+            self.scheduler.request(full=True)
+
+    def get_title(self):
+        return self.axes.get_title()
+
+    def _on_draw(self, event):
+        # draws we did not start ourselves (resizes, the toolbar) include the axes
+        self.background = self.copy_from_bbox(self.figure.bbox) if self._capturing else None
+
+    def full_draw(self):
+        """
+        Draws the figure without the axes to cache the background, then blits the axes.
+        :return:
+        """
+        with perf.timer("plot.draw"):
+            self._capturing = True
+            self.axes.set_animated(True)
+            try:
+                self.draw()
+            finally:
+                self.axes.set_animated(False)
+                self._capturing = False
+            self.blit_draw()
+
+    def blit_draw(self):
+        with perf.timer("plot.blit"):
+            self.restore_region(self.background)
+            self.figure.draw_artist(self.axes)
+            self.blit(self.figure.bbox)
+
+    def render(self):
+        """
+        Applies pending view changes and redraws, blitting when only the limits changed.
+        Called by the scheduler.
+        :return:
+        """
+        if self._view_changed:
+            self._view_changed = False
+            self.apply_view()
+        full = self.scheduler.take()
+        if full or self.background is None:
+            self.full_draw()
+        else:
+            self.blit_draw()
+
+    def _pixel_width(self):
+        return max(1, int(self.axes.bbox.width))
+
+    def plot_line(self, data, label, labels=None, source=None, columns=None):
+        """
+        Plots every column of data as a decimated line.
+        :param data:
+        :param label: plot title
+        :param labels: column names, if data is an ndarray
+        :param source: the resource data belongs to, if any; sessions then refer to it
+            instead of storing the data
+        :param columns: indices of the columns to plot, all by default
+        :return:
+        """
+        self.mark_changed()
+        for column, (x, y, name) in enumerate(split_columns(data, labels)):
+            if columns is not None and column not in columns:
+                continue
+            pyramid = MinMaxPyramid(y, x)
+            xs, ys = pyramid.query(*pyramid.x_range(), n_bins=self._pixel_width())
+            artist, = self.axes.plot(xs, ys, label=name)
+            self.series.append({"kind": "line", "label": name, "x": x, "y": y,
+                                "artist": artist, "pyramid": pyramid, "source": source, "column": column})
+        if label is not None:
+            self.set_title(label, draw=False)
+        if len(self.series) > 1:
+            self.axes.legend()
+        self.scheduler.request(full=True)
+
+    def plot_scatter(self, data, label, labels=None, source=None):
+        """
+        Scatter plot of the first column against the second, or of a single
+        column against its index.
+        :param data:
+        :param label: plot title
+        :param labels: column names, if data is an ndarray
+        :param source: see plot_line
+        :return:
+        """
+        self.mark_changed()
+        columns = split_columns(data, labels)
+        if len(columns) > 1:
+            x, y = columns[0][1], columns[1][1]
+        else:
+            x, y, _ = columns[0]
+            if x is None:
+                x = np.arange(len(y))
+        artist = self.axes.scatter(x, y, label=label, s=4)
+        self.series.append({"kind": "scatter", "label": label, "x": x, "y": y,
+                            "artist": artist, "pyramid": None, "source": source, "column": None})
+        if label is not None:
+            self.set_title(label, draw=False)
+        self.scheduler.request(full=True)
+
+    def plot_spectrogram(self, data, Fs, label, source=None):
+        """
+        Spectrogram of a signal, drawn from STFT tiles at the resolution of the view.
+        Tiles that are not cached yet are computed on a worker thread and appear as
+        they are ready.
+        :param data: 1-D samples, or (samples x channels)
+        :param Fs: sample rate
+        :param label: plot title
+        :param source: see plot_line
+        :return:
+        """
+        self.mark_changed()
+        tiles = SpectrogramTiles(np.asanyarray(data), Fs)
+        # shared by the tiles, so that they follow the loudest bin seen so far together
+        norm = Normalize(-DYNAMIC_RANGE, 0.)
+        self.series.append({"kind": "spectrogram", "label": label,
+                            "x": np.array([0., tiles.duration()]), "y": np.array([0., Fs / 2.]),
+                            "artist": None, "pyramid": None, "tiles": tiles, "norm": norm, "peak": None,
+                            "images": {}, "wanted": set(), "pending": set(), "stopped": False,
+                            "source": source, "column": None})
+        self.set_title(label, draw=False)
+        self.axes.set_xlabel("Time (s)")
+        self.axes.set_ylabel("Frequency (Hz)")
+        self.axes.set_ylim(0., Fs / 2.)
+        # requests the first tiles
+        self.axes.set_xlim(0., tiles.duration())
+        self.scheduler.request(full=True)
+
+    def _update_spectrogram(self, s, x0, x1, width):
+        tiles = s["tiles"]
+        hop = tiles.hop_for(x0, x1, width)
+        s["wanted"] = set((hop, i) for i in tiles.tiles_in(x0, x1, hop))
+        for key in sorted(s["wanted"]):
+            if key in s["images"] or key in s["pending"]:
+                continue
+            tile = tiles.get(*key)
+            if tile is not None:
+                self._show_tile(s, key, tile)
+            else:
+                if self._tile_pool is None:
+                    self._tile_pool = ThreadPoolExecutor(max_workers=1)
+                s["pending"].add(key)
+                self._tile_pool.submit(self._compute_tile, s, key)
+        self._prune_tiles(s)
+
+    def _compute_tile(self, s, key):
+        # worker thread; tiles of cleared plots, and tiles panned out of view before
+        # their turn, are skipped
+        if s["stopped"]:
+            return
+        tile = None
+        if key in s["wanted"]:
+            with perf.timer("plot.spectrogram_tile"):
+                tile = s["tiles"].compute(*key)
+        # the canvas may have been cleared or deleted meanwhile
+        if not s["stopped"] and not sip.isdeleted(self):
+            self.tile_ready.emit((s, key, tile))
+
+    def _add_tile(self, payload):
+        s, key, tile = payload
+        if s["stopped"]:
+            return
+        s["pending"].discard(key)
+        if tile is None or key not in s["wanted"]:
+            return
+        self._show_tile(s, key, tile)
+        self._prune_tiles(s)
+        self.scheduler.request()
+
+    def _show_tile(self, s, key, tile):
+        peak = float(tile.max())
+        if s["peak"] is None or peak > s["peak"]:
+            s["peak"] = peak
+            s["norm"].vmin, s["norm"].vmax = peak - DYNAMIC_RANGE, peak
+        tiles = s["tiles"]
+        hop, index = key
+        t0, _ = tiles.tile_span(hop, index)
+        t1 = t0 + len(tile) * hop / float(tiles.Fs)
+        s["images"][key] = self.axes.imshow(tile.T, origin="lower", aspect="auto", interpolation="nearest",
+                                            extent=(t0, t1, 0., tiles.Fs / 2.), norm=s["norm"],
+                                            cmap="Greys", zorder=0)
+
+    def stop_tiles(self):
+        """
+        Drops the spectrogram tiles still to be computed and shuts their worker down;
+        tiles being computed are discarded. Called when the plot is cleared or deleted.
+        :return:
+        """
+        for s in self.series:
+            if s["kind"] == "spectrogram":
+                s["stopped"] = True
+        if self._tile_pool is not None:
+            self._tile_pool.shutdown(wait=False, cancel_futures=True)
+            self._tile_pool = None
+
+    def _prune_tiles(self, s):
+        # tiles of the previous resolution stay up until the new ones cover the view
+        if not s["wanted"] <= set(s["images"]):
+            return
+        for key in list(s["images"]):
+            if key not in s["wanted"]:
+                s["images"].pop(key).remove()
+
+    def update_lod(self):
+        """
+        Redecimates the line plots and requests the spectrogram tiles for the current
+        x range and canvas width.
+        :return:
+        """
+        if self._updating:
+            return
+        self._updating = True
+        try:
+            with perf.timer("plot.lod"):
+                x0, x1 = self.axes.get_xlim()
+                width = self._pixel_width()
+                for s in self.series:
+                    if s["pyramid"] is not None:
+                        s["artist"].set_data(*s["pyramid"].query(x0, x1, width))
+                    elif s["kind"] == "spectrogram":
+                        self._update_spectrogram(s, x0, x1, width)
+        finally:
+            self._updating = False
+        self.scheduler.request()
+
+    def reset(self):
+        self.axes.autoscale()
+        self.scheduler.request()
+
+    def _data_range(self):
+        xs, ys = [], []
+        for s in self.series:
+            if s["pyramid"] is not None:
+                xs.extend(s["pyramid"].x_range())
+                ys.extend(s["pyramid"].y_range())
+            elif len(s["y"]):
+                xs.extend((np.nanmin(s["x"]), np.nanmax(s["x"])))
+                ys.extend((np.nanmin(s["y"]), np.nanmax(s["y"])))
+        if not xs:
+            return None
+        return (min(xs), max(xs)), (min(ys), max(ys))
+
+    def recenter(self):
+        """
+        Makes the full data range the home view and applies zoom and shift to it.
+        :return:
+        """
+        self.home = self._data_range()
+        self.apply_view()
+
+    def zoom_scale(self, value):
+        """
+        :param value: zoom slider value
+        :return: span of the view relative to the data range
+        """
+        if value <= self.HOME_ZOOM:
+            # as the sliders have always zoomed out
+            return 1. + (self.HOME_ZOOM - value) / 100.
+        return 10 ** ((self.HOME_ZOOM - value) / float(self.ZOOM_DECADE))
+
+    def apply_view(self):
+        if self.home is None:
+            return
+        limits = []
+        for axis, (lo, hi) in enumerate(self.home):
+            if hi == lo:
+                lo, hi = lo - .5, hi + .5
+            span = (hi - lo) * self.zoom_scale(self.zoom[axis])
+            center = (lo + hi) / 2. + self.shift[axis] / 500. * (hi - lo)
+            limits.append((center - span / 2., center + span / 2.))
+        self.axes.set_ylim(*limits[1])
+        # triggers update_lod
+        self.axes.set_xlim(*limits[0])
+
+    def _request_view(self):
+        # limits are applied once per frame, with whatever values are current then
+        self._view_changed = True
+        self.scheduler.request()
+
+    def set_xzoom(self, value):
+        self.zoom[0] = value
+        self._request_view()
+
+    def set_yzoom(self, value):
+        self.zoom[1] = value
+        self._request_view()
+
+    def set_xshift(self, value):
+        self.shift[0] = value
+        self._request_view()
+
+    def set_yshift(self, value):
+        self.shift[1] = value
+        self._request_view()
+
+    def to_dict(self, resources=None):
+        """
+        Serializable description of the plot, see from_dict. Series plotted from a
+        resource refer to it by alias and path; only the data of the others, and of
+        resources removed from resources since, is included.
+        :param resources: the main window's ResourceRegistry
+        :return:
+        """
+        series = []
+        for s in self.series:
+            source = s.get("source")
+            if source is not None and (resources is None or source in resources
+                                       or getattr(source, "path", None) is not None):
+                entry = {"kind": s["kind"], "label": s["label"], "source": source_ref(source), "column": s["column"]}
+                if s["kind"] == "spectrogram":
+                    entry["Fs"] = s["tiles"].Fs
+                series.append(entry)
+            elif s["kind"] == "spectrogram":
+                # the signal itself, as y
+                series.append({"kind": s["kind"], "label": s["label"], "x": None,
+                               "y": s["tiles"].signal, "Fs": s["tiles"].Fs})
+            else:
+                series.append({"kind": s["kind"], "label": s["label"], "x": s["x"], "y": np.asarray(s["y"])})
+        d = {"title": self.axes.get_title(),
+             "series": series}
+        d.update(self.view_state())
+        return d
+
+    def view_state(self):
+        """
+        The part of to_dict that the sliders change, without bumping revision.
+        :return:
+        """
+        return {"zoom": list(self.zoom),
+                "shift": list(self.shift)}
+
+    def _from_legacy_dict(self, d):
+        """
+        Restores a plot saved before plots were described by their series, from the
+        arguments it was plotted with and the view it had.
+        :param d: dict with plot_type, plot_args, title, xlim, ylim, centre_shift and scale
+        :return:
+        """
+        if d.get("plot_type") is not None:
+            data, title = d["plot_args"]
+            getattr(self, "plot_{}".format(d["plot_type"]))(data, title)
+        if d.get("title") is not None:
+            self.set_title(d["title"], draw=False)
+        self.recenter()
+        # the limits saved are those of the data when plotted; the view was shifted by a
+        # 20th of their span per step and scaled about their centre
+        limits = []
+        for (lo, hi), shift, scale in zip((d["xlim"], d["ylim"]), d["centre_shift"], d["scale"]):
+            centre = (lo + hi) / 2. + abs(hi - lo) / 20. * shift
+            radius = (hi - lo) / 2. * scale
+            limits.append((centre - radius, centre + radius))
+        self.axes.set_ylim(*limits[1])
+        self.axes.set_xlim(*limits[0])
+        self.scheduler.request(full=True)
+
+    def _plot_source(self, s, resources):
+        resource = resolve_source(s["source"], resources)
+        if resource is None:
+            print("Could not restore the plot of {}: it is gone.".format(s["source"]["alias"]))
+            return
+        try:
+            data = resource.data
+            if s["kind"] == "spectrogram":
+                self.plot_spectrogram(data, s["Fs"], s["label"], source=resource)
+            elif s["kind"] == "scatter":
+                self.plot_scatter(data, s["label"], getattr(resource, "labels", None), source=resource)
+            else:
+                self.plot_line(data, s["label"], getattr(resource, "labels", None), source=resource,
+                               columns=[s["column"]])
+        except (OSError, ValueError, IndexError) as e:
+            print("Could not restore the plot of {}: {}".format(s["source"]["alias"], e))
+
+    def from_dict(self, d, resources=None):
+        """
+        :param d: see to_dict
+        :param resources: the main window's ResourceRegistry, to find the resources
+            series were plotted from
+        :return:
+        """
+        self.clear()
+        if "plot_args" in d:
+            self._from_legacy_dict(d)
+            return
+        for s in d.get("series", []):
+            if "source" in s:
+                self._plot_source(s, resources)
+                continue
+            if s["kind"] == "spectrogram":
+                self.plot_spectrogram(s["y"], s["Fs"], s["label"])
+                continue
+            data = pd.Series(s["y"], index=s["x"], name=s["label"]) if s["x"] is not None else s["y"]
+            if s["kind"] == "scatter":
+                self.plot_scatter(data, s["label"])
+            else:
+                self.plot_line(data, s["label"])
+        self.set_title(d.get("title", ""), draw=False)
+        self.zoom = list(d.get("zoom", self.zoom))
+        self.shift = list(d.get("shift", self.shift))
+        self.recenter()
+        self.scheduler.request(full=True)
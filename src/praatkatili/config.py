@@ -1,9 +1,41 @@
 """
 This is the global configuration module.
 """
+import os
 
 from PyQt5 import QtWidgets
 
+from praatkatili.cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+
 DOCK_FEATURES = QtWidgets.QDockWidget.AllDockWidgetFeatures
 DOCK_OPTIONS = (QtWidgets.QMainWindow.AllowNestedDocks | QtWidgets.QMainWindow.AllowTabbedDocks | \
                 QtWidgets.QMainWindow.AnimatedDocks) & ~QtWidgets.QMainWindow.ForceTabbedDocks
+
+# worker processes used by batch feature extraction
+FEATURE_WORKERS = os.cpu_count() or 1
+
+# on-disk cache of short term feature matrices
+FEATURE_CACHE_DIR = DEFAULT_CACHE_DIR
+FEATURE_CACHE_MAX_BYTES = DEFAULT_MAX_BYTES
+
+# load restored file resources in the background instead of on first use
+PREFETCH_RESOURCES = True
+
+# show the window with only the file browser, resource and job docks, and create the
+# IPython console and the notebook dock right after it is first painted
+DEFERRED_STARTUP = True
+
+# record timings of resource loading, analyses, plot draws and session save/restore,
+# see praatkatili.perf; the Record box of the Performance dock switches it at runtime
+PERF_ENABLED = False
+
+# seconds between incremental saves of the session in the background, 0 to save only
+# when the window closes; see praatkatili.autosave
+AUTOSAVE_INTERVAL = 60
+
+# offer resources to the kernels of the notebook dock, in shared memory once attached; see
+# praatkatili.bridge
+NOTEBOOK_BRIDGE = True
+
+# store parsed CSV columns in a binary sidecar next to the file, see praatkatili.tabular
+CSV_SIDECAR = True
@@ -0,0 +1,137 @@
+"""
+Min/max decimation for drawing long series.
+
+A MinMaxPyramid summarizes a series at bucket sizes LEAF_BUCKET, LEAF_BUCKET * FACTOR,
+... by the minimum and maximum of every bucket. Drawing the min and max of each bucket
+that falls on a pixel column gives the same picture as drawing every sample, with about
+two points per pixel regardless of how many samples are in view.
+"""
+import numpy as np
+
+LEAF_BUCKET = 64
+FACTOR = 4
+# samples per pass when building the first level of a memory mapped series
+_BUILD_BUCKETS = 2 ** 14
+
+
+def minmax(y, bucket):
+    """
+    Minimum and maximum of consecutive buckets of y; the last bucket may be partial.
+    :param y:
+    :param bucket:
+    :return: mins, maxs
+    """
+    n = len(y)
+    full = n // bucket * bucket
+    body = np.asarray(y[:full]).reshape(-1, bucket)
+    mins, maxs = body.min(axis=1), body.max(axis=1)
+    if full < n:
+        tail = np.asarray(y[full:])
+        mins = np.append(mins, tail.min())
+        maxs = np.append(maxs, tail.max())
+    return mins, maxs
+
+
+class MinMaxPyramid(object):
+    """
+    Multi-resolution min/max summary of a 1-D series, for line plots.
+    """
+
+    def __init__(self, y, x=None):
+        """
+        :param y: 1-D samples; memory mapped arrays are read one slice at a time
+        :param x: monotonically increasing x values, or None for 0, 1, 2, ...
+        """
+        self.y = y
+        self.x = None if x is None else np.asarray(x)
+        self.levels = []
+
+        n = len(y)
+        bucket = LEAF_BUCKET
+        if n <= bucket:
+            return
+        step = bucket * _BUILD_BUCKETS
+        parts = [minmax(y[start:start + step], bucket) for start in range(0, n, step)]
+        mins = np.concatenate([p[0] for p in parts])
+        maxs = np.concatenate([p[1] for p in parts])
+        self.levels.append((bucket, mins, maxs))
+        while len(mins) > FACTOR:
+            bucket *= FACTOR
+            mins = minmax(mins, FACTOR)[0]
+            maxs = minmax(maxs, FACTOR)[1]
+            self.levels.append((bucket, mins, maxs))
+
+    def __len__(self):
+        return len(self.y)
+
+    def x_range(self):
+        if len(self.y) == 0:
+            return 0., 0.
+        if self.x is None:
+            return 0., float(len(self.y) - 1)
+        return float(self.x[0]), float(self.x[-1])
+
+    def y_range(self):
+        """
+        Minimum and maximum over the whole series, from the coarsest level.
+        """
+        if len(self.y) == 0:
+            return 0., 0.
+        if self.levels:
+            _, mins, maxs = self.levels[-1]
+        else:
+            mins = maxs = np.asarray(self.y)
+        return float(np.nanmin(mins)), float(np.nanmax(maxs))
+
+    def _index_range(self, x0, x1):
+        n = len(self.y)
+        if self.x is None:
+            i0 = int(np.floor(x0)) - 1
+            i1 = int(np.ceil(x1)) + 2
+        else:
+            # one sample beyond either edge, so the line reaches the axes
+            i0 = int(np.searchsorted(self.x, x0, side="left")) - 1
+            i1 = int(np.searchsorted(self.x, x1, side="right")) + 1
+        return max(0, i0), min(n, max(0, i1))
+
+    def _xs(self, start, stop, step=1):
+        if self.x is None:
+            return np.arange(start, stop, step, dtype=np.float64)
+        return self.x[start:stop:step]
+
+    def query(self, x0, x1, n_bins):
+        """
+        Points to draw for the x interval [x0, x1] on a plot n_bins pixels wide.
+        :param x0:
+        :param x1:
+        :param n_bins:
+        :return: xs, ys
+        """
+        i0, i1 = self._index_range(x0, x1)
+        count = i1 - i0
+        n_bins = max(1, int(n_bins))
+        if count <= 2 * n_bins:
+            return self._xs(i0, i1), np.asarray(self.y[i0:i1])
+
+        wanted = count // n_bins
+        bucket, mins, maxs = 0, None, None
+        for level in self.levels:
+            if level[0] > wanted:
+                break
+            bucket, mins, maxs = level
+        if mins is None:
+            # fewer than LEAF_BUCKET samples per pixel: decimate the raw slice on the fly
+            bucket = wanted
+            start = i0 // bucket * bucket
+            mins, maxs = minmax(self.y[start:i1], bucket)
+            j0 = start // bucket
+        else:
+            j0 = i0 // bucket
+            j1 = -(-i1 // bucket)
+            mins, maxs = mins[j0:j1], maxs[j0:j1]
+
+        xs = self._xs(j0 * bucket, j0 * bucket + len(mins) * bucket, bucket)
+        ys = np.empty(2 * len(mins), dtype=np.result_type(mins.dtype, np.float64))
+        ys[0::2] = mins
+        ys[1::2] = maxs
+        return np.repeat(xs, 2), ys
@@ -1,21 +1,16 @@
-import locale
+"""
+Dock widgets of the main window. qtconsole and matplotlib are imported by the docks
+that need them, when they are first created; the notebook dock lives in
+praatkatili.notebook for the same reason.
+"""
 import os
-import shlex
-import subprocess
 
-import jupyter_client
-import jupyter_core
+from PyQt5 import QtCore
+from PyQt5.QtWidgets import QDockWidget, QAbstractItemView, QLabel, QMenu, QProgressBar
 
-encoding = locale.getdefaultlocale()[1]
-
-from PyQt5 import QtCore, QtWebEngineWidgets
-from PyQt5.QtGui import QStandardItemModel, QStandardItem
-from PyQt5.QtWidgets import QDockWidget, QAbstractItemView, QLabel, QTabWidget, QTabBar
-from qtconsole.inprocess import QtInProcessKernelManager
-from qtconsole.rich_jupyter_widget import RichJupyterWidget
-
-from praatkatili.canvas import PlotCanvas
 from praatkatili.config import *
+from praatkatili.models import ResourceModel
+from praatkatili.perf import log_histogram, summarize
 from praatkatili.util import sanitize_alias
 
 
@@ -71,6 +66,7 @@ class IPythonDock(Dock):
         self.setMinimumWidth(500)
         self.setWindowTitle("IPython Shell")
         self.setAllowedAreas(QtCore.Qt.AllDockWidgetAreas)
+        from qtconsole.rich_jupyter_widget import RichJupyterWidget
         self.console = RichJupyterWidget(name="console")
         self.console.font_size = 7
         self.setWidget(self.console)
@@ -80,6 +76,7 @@ class IPythonDock(Dock):
         Sets up the ipython shell for the relevant docks. 
         :return: 
         """
+        from qtconsole.inprocess import QtInProcessKernelManager
         self.console.kernel_manager = kernel_manager = \
             QtInProcessKernelManager()
         kernel_manager.start_kernel(show_banner=True)
@@ -112,6 +109,15 @@ class IPythonDock(Dock):
     def delete_var(self, varName):
         del self.console.kernel_manager.kernel.shell.user_ns[varName]
 
+    def user_namespace(self):
+        return self.console.kernel_manager.kernel.shell.user_ns
+
+    def transform_cell(self, code):
+        """
+        Translates IPython syntax (magics and such) in code into plain Python.
+        """
+        return self.console.kernel_manager.kernel.shell.transform_cell(code)
+
     def clear(self):
         """
         Clears the terminal
@@ -145,6 +151,7 @@ class IPythonDock(Dock):
         self.execute_command("from praatkatili import *")
 
     def inject_debugs(self):
+        from praatkatili.canvas import PlotCanvas
         self.push_vars({'canvas': self.findChildren(PlotCanvas)})
 
 
@@ -180,6 +187,7 @@ class PlotDock(Dock):
         f.setSizePolicy(expand, expand)
 
         # canvas on frame
+        from praatkatili.canvas import PlotCanvas
         self.canvas = canvas = PlotCanvas(blank=blank, dock=self)
         f.layout().addWidget(canvas, 2, 2, 1, 3)
         canvas.setSizePolicy(expand, expand)
@@ -199,8 +207,7 @@ class PlotDock(Dock):
         slider.setMinimum(-250)
         slider.setMaximum(250)
 
-        # optional: connect slider release to a separate signal to avoid
-        # redrawing plots for intermittent values
+        # intermittent values are cheap: the canvas coalesces them into one redraw per frame
         slider.valueChanged.connect(
             lambda: signal.emit(slider.value()))
 
@@ -249,174 +256,199 @@ class ResourceDock(Dock):
         self.setAllowedAreas(QtCore.Qt.AllDockWidgetAreas)
         self.setWindowTitle("Resources")
         self.main_window = main_window
-        print(self.contextMenuPolicy())
 
         self.resource_view = resource_view = QtWidgets.QTreeView()
-        self.resource_model = resource_model = QStandardItemModel()
-        resource_model.setColumnCount(4)
-        resource_model.setHorizontalHeaderLabels(["Alias",
-                                                  "Type",
-                                                  "Path",
-                                                  "Value"])
+        self.resource_model = resource_model = ResourceModel(main_window.resources, parent=self)
         resource_view.setModel(resource_model)
+        resource_view.setRootIsDecorated(False)
+        resource_view.setUniformRowHeights(True)
+        resource_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
         resource_view.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
         resource_view.customContextMenuRequested.connect(self.context_menu)
         resource_view.doubleClicked.connect(self.display_resource)
 
     def display_resource(self):
-        selected = self.resource_view.currentIndex()
-        item = self.resource_model.itemFromIndex(selected)
-        self.main_window.consoleDock.execute_command(sanitize_alias(item.data().alias) + ".data")
+        resource = self.resource_model.resource(self.resource_view.currentIndex())
+        self.main_window.consoleDock.execute_command(sanitize_alias(resource.alias) + ".data")
 
     def context_menu(self, point):
         # find the selected resource
-        selected = self.resource_view.currentIndex()
-        item = self.resource_model.itemFromIndex(selected)
-        if item is None:
+        resource = self.resource_model.resource(self.resource_view.currentIndex())
+        if resource is None:
             return
-        menu = item.data().create_context_menu(self, self.main_window)
+        menu = resource.create_context_menu(self, self.main_window)
         menu.exec_(self.mapToGlobal(point))
 
     def view_and_model(self):
         return self.resource_view, self.resource_model
 
-    def add_resource(self, resource):
-        cname = resource.__class__.__name__
-        r1, r2, r3, r4 = QStandardItem(), QStandardItem(), QStandardItem(), QStandardItem()
-        r1.setText(resource.alias)
-        r2.setText(cname)
-        r2.setEditable(False)
-        try:
-            r3.setText(resource.path)
-        except AttributeError:
-            r3.setText("N/A")
-        r3.setEditable(False)
-        r4.setText(str(resource).strip())
-        r4.setEditable(False)
-        for r in (r1, r2, r3, r4):
-            r.setData(resource)
-        self.resource_model.appendRow([r1, r2, r3, r4])
-
-        # choose the appropriate item delegate
-        from praatkatili.resources import Delegates
-        if cname in Delegates:
-            print("Custom delegate for row {}: {}".format(self.resource_model.rowCount(),
-                                                          Delegates[cname]))
-            self.resource_view.setItemDelegateForRow(self.resource_model.rowCount(),
-                                                     Delegates[cname])
-
-    def delete_resource(self, resource):
-        found = self.main_window.resource_model.findItems(resource.data().alias)[0]
-        self.main_window.resource_model.removeRow(found.row())
-        print()
-
+    def selected_resources(self):
+        """
+        Resources of all selected rows, in view order.
+        :return:
+        """
+        rows = self.resource_view.selectionModel().selectedRows()
+        return [self.resource_model.resource(index) for index in rows]
 
-class NotebookTab(QtWebEngineWidgets.QWebEngineView):
-    def __init__(self, dock, *args, **kwargs):
-        super(NotebookTab, self).__init__(*args, **kwargs)
-        self.dock = dock
-        self.titleChanged.connect(self.refresh_title)
+    def add_resources(self, resources):
+        """
+        Registers the resources and shows them in one go.
+        :param resources:
+        :return:
+        """
+        self.resource_model.add_resources(resources)
 
+    def add_resource(self, resource):
+        self.add_resources([resource])
 
-    def refresh_title(self, title=None):
-        if title is None:
-            title = self.title()
-        self.dock.tabWidget.setTabText(self.dock.tabWidget.indexOf(self),
-                                       title)
+    def delete_resources(self, resources):
+        self.resource_model.remove_resources(resources)
 
+    def delete_resource(self, resource):
+        self.delete_resources([resource])
 
-    def createWindow(self, QWebEnginePage_WebWindowType):
-        tab = self.dock.addTab()
-        self.dock.tabWidget.setCurrentWidget(tab)
-        return tab
 
+class JobsDock(Dock):
+    """
+    Lists the jobs of a JobScheduler with their state and progress.
+    """
 
-class NotebookDock(Dock):
-    def __init__(self, main_window, *args, **kwargs):
-        super(NotebookDock, self).__init__(*args, **kwargs)
-        self.jupyter_process = None
-        self.connection_json = None
+    def __init__(self, scheduler, *args, **kwargs):
+        super(JobsDock, self).__init__(*args, **kwargs)
+        self.setMinimumWidth(300)
+        self.setMinimumHeight(100)
+        self.setAllowedAreas(QtCore.Qt.AllDockWidgetAreas)
+        self.setWindowTitle("Jobs")
+        self.scheduler = scheduler
+
+        self.job_view = view = QtWidgets.QTreeWidget()
+        view.setColumnCount(4)
+        view.setHeaderLabels(["Job", "Status", "Progress", "Time"])
+        view.setRootIsDecorated(False)
+        view.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        view.customContextMenuRequested.connect(self.context_menu)
+        self.setWidget(view)
+
+        scheduler.job_added.connect(self.add_job)
+
+    def add_job(self, job):
+        item = QtWidgets.QTreeWidgetItem([job.name, job.state, "", ""])
+        item.setData(0, QtCore.Qt.UserRole, job)
+        self.job_view.addTopLevelItem(item)
+        bar = QProgressBar()
+        bar.setRange(0, 100)
+        self.job_view.setItemWidget(item, 2, bar)
+        job.progress.connect(lambda fraction, bar=bar: bar.setValue(int(fraction * 100)))
+        job.state_changed.connect(lambda state, item=item, job=job: self.update_job(item, job))
+
+    def update_job(self, item, job):
+        item.setText(1, job.state)
+        item.setText(3, "{:.1f} s".format(job.elapsed()))
 
-        self.tabWidget = QTabWidget()
-        self.tabWidget.setTabsClosable(True)
-        self.main_window = main_window
+    def context_menu(self, point):
+        menu = QMenu(self)
+        item = self.job_view.itemAt(point)
+        if item is not None:
+            job = item.data(0, QtCore.Qt.UserRole)
+            cancel = menu.addAction("Cancel")
+            cancel.setEnabled(not job.is_finished())
+            cancel.triggered.connect(lambda checked, job=job: job.cancel())
+        cancel_all = menu.addAction("Cancel all")
+        cancel_all.triggered.connect(self.scheduler.cancel_all)
+        clear = menu.addAction("Clear finished")
+        clear.triggered.connect(self.clear_finished)
+        menu.exec_(self.job_view.viewport().mapToGlobal(point))
+
+    def clear_finished(self):
+        self.scheduler.clear_finished()
+        for i in reversed(range(self.job_view.topLevelItemCount())):
+            job = self.job_view.topLevelItem(i).data(0, QtCore.Qt.UserRole)
+            if job.is_finished():
+                self.job_view.takeTopLevelItem(i)
+
+
+class PerfDock(Dock):
+    """
+    Shows the timings and counters of a perf.Perf, and the last cProfile capture.
+    """
+    REFRESH_INTERVAL = 1000
+    # one character per histogram bin, from empty to full
+    BARS = " ▁▂▃▄▅▆▇█"
+
+    def __init__(self, perf, *args, **kwargs):
+        super(PerfDock, self).__init__(*args, **kwargs)
+        self.setMinimumWidth(300)
+        self.setMinimumHeight(100)
+        self.setAllowedAreas(QtCore.Qt.AllDockWidgetAreas)
+        self.setWindowTitle("Performance")
+        self.perf = perf
 
-        expand = QtWidgets.QSizePolicy.Expanding
         f = QtWidgets.QFrame()
-        f.setLayout(QtWidgets.QHBoxLayout())
-        f.setSizePolicy(expand, expand)
+        l = QtWidgets.QVBoxLayout(f)
+        buttons = QtWidgets.QHBoxLayout()
+        self.enabled = QtWidgets.QCheckBox("Record")
+        self.enabled.toggled.connect(self.set_enabled)
+        # actions are only profiled while they are timed
+        self.profile_button = profile = QtWidgets.QPushButton("Profile next action")
+        profile.clicked.connect(perf.profile_next)
+        reset = QtWidgets.QPushButton("Reset")
+        reset.clicked.connect(self.reset)
+        buttons.addWidget(self.enabled)
+        buttons.addStretch()
+        buttons.addWidget(profile)
+        buttons.addWidget(reset)
+        l.addLayout(buttons)
+
+        self.view = view = QtWidgets.QTreeWidget()
+        view.setHeaderLabels(["Timer", "Count", "Last ms", "Mean ms", "p90 ms", "Max ms", "Histogram"])
+        view.setRootIsDecorated(False)
+        l.addWidget(view)
+        self.profile_view = QtWidgets.QPlainTextEdit()
+        self.profile_view.setReadOnly(True)
+        self.profile_view.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
+        self.profile_view.setPlaceholderText("Press \"Profile next action\" to capture a profile.")
+        l.addWidget(self.profile_view)
         self.setWidget(f)
-        f.layout().addWidget(self.tabWidget)
-        self.setWindowTitle("IPython Notebooks")
-        self.start_server()
-        self.addTab()
-
-    def addTab(self, url=None, request=None):
-        tab = NotebookTab(dock=self)
-        self.tabWidget.addTab(tab, "")
-        if request is not None:
-            request.openIn(tab)
-        elif url is None:
-            tab.load(self.url)
-            self.tabWidget.tabBar().tabButton(0, QTabBar.RightSide).hide()
-        self.tabWidget.tabCloseRequested.connect(self.close_tab)
-        return tab
-
-    def close_tab(self, index):
-        tab = self.tabWidget.widget(index)
-        self.tabWidget.removeTab(index)
-        del tab
-
-    def closeEvent(self, event):
-        self.stop_server()
-        super(NotebookDock, self).closeEvent(event)
-
-    def start_server(self):
-        from glob import glob
-        if self.jupyter_process is not None:
-            self.stop_server()
-        json_dir = jupyter_core.paths.jupyter_runtime_dir()
-        jsons_before = glob(os.path.join(json_dir, "*.json"))
-        args = shlex.split("jupyter notebook --no-browser")
-        self.jupyter_process = p = subprocess.Popen(args=args,
-                                                    stderr=subprocess.PIPE)
-
-        # figure out the url from the initial console messages
-        from re import search
-        line = p.stderr.readline().decode(encoding).strip()
-        matches = search("http://.*:(.*?)/", line)
-        # print(line)
-        while matches is None:
-            line = p.stderr.readline().decode(encoding).strip()
-            # print(line)
-            matches = search("http://.*:(.*?)/", line)
-        url = "http://{}:{}/".format("localhost", matches.groups(1)[0])
-        # print("URL: " + url)
-        self.url = QtCore.QUrl(url)
-        print("Notebook at: {}".format(self.url))
-        from time import sleep
-        sleep(.1)
-        jsons_after = glob(os.path.join(json_dir, "*.json"))
-        for json in jsons_after:
-            if json not in jsons_before:
-                self.connection_json = json
-                break
-        else:
-            raise FileNotFoundError("Could not find the connection JSON in {}.".format(json_dir))
-
-        self.notebook_client = jupyter_client.BlockingKernelClient(connection_file=self.connection_json)
-        self.notebook_client.load_connection_file()
-
-        self.notebook_client.start_channels()
-        self.notebook_client.execute("test=123")
-
-    def stop_server(self):
-        if self.jupyter_process:
-            print("Killing Jupyter process (PID {})...".format(self.jupyter_process.pid))
-            self.jupyter_process.kill()
-            outs, errs = self.jupyter_process.communicate()
-            self.jupyter_process = None
-            self.connection_json = None
-
-    def __del__(self):
-        self.stop_server()
+        self.enabled.setChecked(perf.enabled)
+        self.set_enabled(perf.enabled)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(self.REFRESH_INTERVAL)
+
+    def set_enabled(self, enabled):
+        self.perf.enabled = enabled
+        self.profile_button.setEnabled(enabled)
+        self.profile_button.setToolTip("" if enabled else "Check Record first; actions are only profiled "
+                                                          "while they are recorded.")
+
+    def reset(self):
+        self.perf.reset()
+        self.refresh()
+
+    def histogram_text(self, times):
+        counts, _ = log_histogram(times)
+        if not counts.max():
+            return ""
+        levels = len(self.BARS) - 1
+        return "".join(self.BARS[int(round(c * levels / float(counts.max())))] for c in counts)
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+        self.view.clear()
+        # jobs keep recording while the view is filled
+        timings, counters, profile = self.perf.snapshot()
+        for name in sorted(timings):
+            s = summarize(timings[name])
+            if s is None:
+                continue
+            self.view.addTopLevelItem(QtWidgets.QTreeWidgetItem(
+                [name, str(s["count"])] +
+                ["{:.2f}".format(s[k] * 1000) for k in ("last", "mean", "p90", "max")] +
+                [self.histogram_text(timings[name])]))
+        for name, n in sorted(counters.items()):
+            self.view.addTopLevelItem(QtWidgets.QTreeWidgetItem([name, str(n)]))
+        profile = profile or ""
+        if profile != self.profile_view.toPlainText():
+            self.profile_view.setPlainText(profile)
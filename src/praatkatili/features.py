@@ -0,0 +1,292 @@
+"""
+Short term feature extraction that walks the signal in chunks.
+
+The features are the ones of audioFeatureExtraction.stFeatureExtraction, frame for
+frame: frames start at multiples of the step and the last frame is the last one that
+fits completely in the signal. Only one chunk of the signal is converted to float at
+a time, so the signal may be a memory mapped recording of any length.
+
+Within a chunk, all frames are computed at once: the chunk is framed with as_strided,
+transformed with a single rfft, and the MFCC and chroma features are matrix products
+against filterbanks that are built once per sample rate and window size.
+"""
+from functools import lru_cache
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from praatkatili.wav import to_float
+
+# samples per chunk
+DEFAULT_CHUNK_SIZE = 2 ** 20
+
+# bump whenever a change alters the features computed, to invalidate cached results
+EXTRACTOR_VERSION = 2
+
+FEATURE_LABELS = ["Zero Crossing Rate", "Energy", "Entropy of Energy", "Spectral Centroid", "Spectral Spread",
+                  "Spectral Entropy", "Spectral Flux", "Spectral Rolloff"]
+FEATURE_LABELS += ["MFCC_{}".format(i) for i in range(13)]
+FEATURE_LABELS += ["ChromaVector_{}".format(i) for i in range(12)]
+FEATURE_LABELS.append("Chroma Deviation")
+
+N_FEATURES = len(FEATURE_LABELS)
+N_MFCC = 13
+
+eps = 0.00000001
+
+
+def count_frames(n_samples, win, step):
+    """
+    Number of complete windows of size win, step samples apart.
+    :param n_samples:
+    :param win:
+    :param step:
+    :return:
+    """
+    if n_samples < win:
+        return 0
+    return (n_samples - win) // step + 1
+
+
+def as_mono(signal):
+    """
+    Returns the signal as a 1-D array, without copying when possible.
+    :param signal:
+    :return:
+    """
+    signal = np.asanyarray(signal)
+    if signal.ndim == 2 and signal.shape[1] == 1:
+        signal = signal[:, 0]
+    if signal.ndim != 1:
+        raise ValueError("Short term features need a single channel, got shape {}".format(signal.shape))
+    return signal
+
+
+def signal_stats(signal, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    DC offset and peak of the signal scaled by 2 ** -15, which is what
+    stFeatureExtraction normalizes the signal with.
+    :param signal:
+    :param chunk_size:
+    :return: dc, peak
+    """
+    total = 0.
+    peak = 0.
+    for start in range(0, len(signal), chunk_size):
+        chunk = to_float(signal, start, start + chunk_size) / 2. ** 15
+        total += chunk.sum()
+        peak = max(peak, np.abs(chunk).max())
+    return total / len(signal), peak
+
+
+def frame_signal(signal, win, step):
+    """
+    Read-only (frames x win) view of a 1-D signal; no samples are copied.
+    :param signal:
+    :param win:
+    :param step:
+    :return:
+    """
+    stride = signal.strides[0]
+    return as_strided(signal, shape=(count_frames(len(signal), win, step), win),
+                      strides=(step * stride, stride), writeable=False)
+
+
+@lru_cache(maxsize=16)
+def mel_filterbank(Fs, nfft):
+    """
+    The triangular filterbank of audioFeatureExtraction.mfccInitFilterBanks,
+    transposed to (nfft x 40) so that it can be applied to a block of spectra.
+    :param Fs:
+    :param nfft:
+    :return:
+    """
+    lowfreq = 133.33
+    linsc = 200 / 3.
+    logsc = 1.0711703
+    n_lin_filt = 13
+    n_log_filt = 27
+    n_filt = n_lin_filt + n_log_filt
+
+    freqs = np.zeros(n_filt + 2)
+    freqs[:n_lin_filt] = lowfreq + np.arange(n_lin_filt) * linsc
+    freqs[n_lin_filt:] = freqs[n_lin_filt - 1] * logsc ** np.arange(1, n_log_filt + 3)
+    heights = 2. / (freqs[2:] - freqs[0:-2])
+
+    fbank = np.zeros((n_filt, nfft))
+    nfreqs = np.arange(nfft) / (1. * nfft) * Fs
+    for i in range(n_filt):
+        low, cen, high = freqs[i:i + 3]
+        lid = np.arange(np.floor(low * nfft / Fs) + 1, np.floor(cen * nfft / Fs) + 1, dtype=int)
+        rid = np.arange(np.floor(cen * nfft / Fs) + 1, np.floor(high * nfft / Fs) + 1, dtype=int)
+        fbank[i][lid] = heights[i] / (cen - low) * (nfreqs[lid] - low)
+        fbank[i][rid] = heights[i] / (high - cen) * (high - nfreqs[rid])
+    fbank.setflags(write=False)
+    return fbank.T
+
+
+@lru_cache(maxsize=16)
+def chroma_filterbank(Fs, nfft):
+    """
+    (nfft x 12) matrix that maps a power spectrum to the (unnormalized) chroma
+    vector of audioFeatureExtraction.stChromaFeatures. That function scatters the
+    spectrum into chroma bins, keeping only the last frequency of each bin, scales
+    by bin population and folds the result onto 12 pitch classes; all of which is
+    linear, so it collapses into a single matrix.
+    :param Fs:
+    :param nfft:
+    :return:
+    """
+    freqs = (np.arange(nfft) + 1) * Fs / (2. * nfft)
+    n_chroma = np.round(12.0 * np.log2(freqs / 27.5)).astype(int)
+    n_freqs_per_chroma = np.zeros(nfft)
+    for u in np.unique(n_chroma):
+        idx = np.nonzero(n_chroma == u)
+        n_freqs_per_chroma[idx] = idx[0].shape
+
+    # source bin of every chroma slot, resolving duplicate targets the way numpy does
+    valid = n_chroma < nfft
+    source = np.full(nfft, -1)
+    source[n_chroma[valid]] = np.arange(nfft)[valid]
+    scale = 1. / n_freqs_per_chroma[n_chroma]
+
+    fbank = np.zeros((nfft, 12))
+    slots = np.nonzero(source >= 0)[0]
+    np.add.at(fbank, (source[slots], slots % 12), scale[slots])
+    fbank.setflags(write=False)
+    return fbank
+
+
+@lru_cache(maxsize=16)
+def dct_matrix(n, n_out):
+    """
+    Orthonormal DCT-II as an (n x n_out) matrix, keeping the first n_out coefficients.
+    :param n:
+    :param n_out:
+    :return:
+    """
+    k = np.arange(n_out)
+    m = np.cos(np.pi * np.outer(2 * np.arange(n) + 1, k) / (2. * n)) * np.sqrt(2. / n)
+    m[:, 0] /= np.sqrt(2)
+    m.setflags(write=False)
+    return m
+
+
+def _sub_block_entropy(x, n_blocks=10):
+    """
+    Entropy of the normalized energies of n_blocks consecutive sub-blocks of each row.
+    """
+    total = np.sum(x ** 2, axis=1)
+    sub_len = x.shape[1] // n_blocks
+    blocks = x[:, :sub_len * n_blocks].reshape(len(x), n_blocks, sub_len)
+    s = np.sum(blocks ** 2, axis=2) / (total[:, None] + eps)
+    return -np.sum(s * np.log2(s + eps), axis=1)
+
+
+def frame_features(frames, Fs, X_prev=None):
+    """
+    Computes all features for a block of normalized frames at once.
+    :param frames: (frames x win) array, normalized as in stFeatureExtraction
+    :param Fs: sample rate
+    :param X_prev: magnitude spectrum of the frame preceding the block, if any
+    :return: (frames x N_FEATURES) array, magnitude spectrum of the last frame
+    """
+    n, win = frames.shape
+    nfft = win // 2
+    features = np.empty((n, N_FEATURES))
+
+    # time domain
+    features[:, 0] = np.sum(np.abs(np.diff(np.sign(frames), axis=1)), axis=1) / 2 / (win - 1.)
+    features[:, 1] = np.sum(frames ** 2, axis=1) / win
+    features[:, 2] = _sub_block_entropy(frames)
+
+    X = np.abs(np.fft.rfft(frames, axis=1))[:, :nfft]
+    X /= nfft
+
+    # spectral centroid and spread
+    ind = np.arange(1, nfft + 1) * (Fs / (2. * nfft))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        Xt = X / X.max(axis=1)[:, None]
+    den = np.sum(Xt, axis=1) + eps
+    centroid = np.dot(Xt, ind) / den
+    spread = np.sqrt(np.sum((ind[None, :] - centroid[:, None]) ** 2 * Xt, axis=1) / den)
+    features[:, 3] = centroid / (Fs / 2.)
+    features[:, 4] = spread / (Fs / 2.)
+
+    features[:, 5] = _sub_block_entropy(X)
+
+    # spectral flux against the previous frame; the very first frame is compared to itself
+    if X_prev is None:
+        X_prev = X[0]
+    prev = np.vstack((X_prev[None, :], X[:-1]))
+    features[:, 6] = np.sum((X / np.sum(X + eps, axis=1)[:, None] -
+                             prev / np.sum(prev + eps, axis=1)[:, None]) ** 2, axis=1)
+
+    # spectral rolloff at 90% of the energy
+    power = X ** 2
+    above = np.cumsum(power, axis=1) + eps > 0.90 * np.sum(power, axis=1)[:, None]
+    features[:, 7] = np.where(above.any(axis=1), above.argmax(axis=1) / float(nfft), 0.)
+
+    mel = np.log10(np.dot(X, mel_filterbank(Fs, nfft)) + eps)
+    features[:, 8:8 + N_MFCC] = np.dot(mel, dct_matrix(mel.shape[1], N_MFCC))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        chroma = np.dot(power, chroma_filterbank(Fs, nfft)) / np.sum(power, axis=1)[:, None]
+    features[:, 21:33] = chroma
+    features[:, 33] = chroma.std(axis=1)
+    return features, X[-1]
+
+
+def iter_short_term_features(signal, Fs, win, step, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields blocks of short term features, each a (frames x N_FEATURES) array.
+    Chunks overlap by win - step samples so that every frame sees exactly the
+    samples it would in a one-shot extraction.
+    :param signal: 1-D samples, e.g. a memory mapped WAV
+    :param Fs: sample rate
+    :param win: window size in samples
+    :param step: step size in samples
+    :param chunk_size: approximate number of samples to hold in memory at once, or
+        None to frame the whole signal in one go
+    :return:
+    """
+    signal = as_mono(signal)
+    win = int(win)
+    step = int(step)
+    total = count_frames(len(signal), win, step)
+    if total == 0:
+        return
+    dc, peak = signal_stats(signal, chunk_size or len(signal))
+
+    frames_per_chunk = total if chunk_size is None else max(1, count_frames(chunk_size, win, step))
+    X_prev = None
+    for first in range(0, total, frames_per_chunk):
+        last = min(first + frames_per_chunk, total)
+        chunk = to_float(signal, first * step, (last - 1) * step + win) / 2. ** 15
+        # the epsilon keeps silence at zero instead of NaN
+        chunk = (chunk - dc) / (peak + 0.0000000001)
+        block, X_prev = frame_features(frame_signal(chunk, win, step), Fs, X_prev)
+        yield block
+
+
+def short_term_feature_matrix(signal, Fs, win, step, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Collects iter_short_term_features into a single preallocated
+    (frames x N_FEATURES) array.
+    :param signal:
+    :param Fs:
+    :param win:
+    :param step:
+    :param chunk_size:
+    :param progress: optional callable, given the fraction of frames done after every chunk
+    :return:
+    """
+    signal = as_mono(signal)
+    result = np.empty((count_frames(len(signal), int(win), int(step)), N_FEATURES))
+    pos = 0
+    for block in iter_short_term_features(signal, Fs, win, step, chunk_size):
+        result[pos:pos + len(block)] = block
+        pos += len(block)
+        if progress is not None:
+            progress(pos / float(len(result)))
+    return result
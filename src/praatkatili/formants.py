@@ -0,0 +1,181 @@
+"""
+Formant tracking by linear prediction, for all frames of a chunk at once.
+
+Every frame is resampled to twice the maximum formant by truncating its spectrum,
+pre-emphasized, windowed, and its autocorrelation taken with a batched rfft. The
+Levinson-Durbin recursion then runs over the prediction order, each step for all
+frames together, and the roots of the prediction polynomials are the eigenvalues of
+a stack of companion matrices. Formants are the frequencies of the roots in the
+upper half plane, lowest first, with bandwidths from their distance to the unit
+circle; roots with very wide bandwidths are left out.
+
+Like features and pitch, the signal is walked in overlapping chunks, of which only
+one is converted to float at a time. This module does not import Qt.
+"""
+import numpy as np
+import pandas as pd
+
+from praatkatili.features import DEFAULT_CHUNK_SIZE, as_mono, count_frames, frame_signal
+from praatkatili.wav import to_float
+
+# roots closer than this to 0 Hz or to the Nyquist frequency are not formants
+EDGE_HZ = 50.
+# pre-emphasis above this frequency
+PRE_EMPHASIS_HZ = 50.
+# wider resonances are taken for artifacts of the spectral slope
+MAX_BANDWIDTH_HZ = 700.
+
+
+def formant_labels(n_formants):
+    return ["F{}".format(i + 1) for i in range(n_formants)] + ["B{}".format(i + 1) for i in range(n_formants)]
+
+
+def resample_frames(frames, length):
+    """
+    Resamples every row to length samples by truncating its spectrum; the rows are
+    windowed afterwards, which hides the wrap around at their ends.
+    :param frames: (frames x samples) array
+    :param length: samples per row after resampling, at most the current number
+    :return:
+    """
+    n = frames.shape[1]
+    if length >= n:
+        return frames
+    spectrum = np.fft.rfft(frames, axis=1)[:, :length // 2 + 1]
+    return np.fft.irfft(spectrum, length, axis=1) * (length / float(n))
+
+
+def levinson(r, order):
+    """
+    Levinson-Durbin recursion for a stack of autocorrelations.
+    :param r: (frames x order + 1) autocorrelations
+    :param order:
+    :return: (frames x order + 1) prediction polynomials, leading 1 included
+    """
+    n = len(r)
+    a = np.zeros((n, order + 1))
+    a[:, 0] = 1.
+    err = r[:, 0].copy()
+    for i in range(1, order + 1):
+        acc = r[:, i] + np.sum(a[:, 1:i] * r[:, i - 1:0:-1], axis=1)
+        k = -acc / err
+        a[:, 1:i] += k[:, None] * a[:, i - 1:0:-1]
+        a[:, i] = k
+        err *= 1. - k * k
+    return a
+
+
+def polynomial_roots(a):
+    """
+    :param a: (frames x order + 1) polynomials, leading coefficient 1
+    :return: (frames x order) complex roots, from the eigenvalues of the companion matrices
+    """
+    n, order = a.shape[0], a.shape[1] - 1
+    companion = np.zeros((n, order, order))
+    companion[:, 0, :] = -a[:, 1:]
+    companion[:, np.arange(1, order), np.arange(order - 1)] = 1.
+    return np.linalg.eigvals(companion)
+
+
+def lpc_formants(frames, Fs, n_formants, order):
+    """
+    :param frames: (frames x samples) pre-emphasized, windowed frames
+    :param Fs: their sample rate
+    :param n_formants: formants returned
+    :param order: prediction order
+    :return: (frames x n_formants) frequencies and bandwidths in Hz; NaN where fewer
+        formants were found
+    """
+    nfft = 1 << int(np.ceil(np.log2(2 * frames.shape[1])))
+    r = np.fft.irfft(np.abs(np.fft.rfft(frames, nfft, axis=1)) ** 2, nfft, axis=1)[:, :order + 1]
+    silent = r[:, 0] <= 0
+    r[silent, 0] = 1.
+    # white noise correction keeps the recursion stable on near-singular frames
+    r[:, 0] *= 1. + 1e-9
+    with np.errstate(invalid="ignore", divide="ignore"):
+        roots = polynomial_roots(np.nan_to_num(levinson(r, order)))
+
+    freqs = np.angle(roots) * Fs / (2 * np.pi)
+    with np.errstate(divide="ignore"):
+        bandwidths = -np.log(np.abs(roots)) * Fs / np.pi
+    valid = (roots.imag > 0) & (freqs > EDGE_HZ) & (freqs < Fs / 2. - EDGE_HZ) & \
+            (bandwidths < MAX_BANDWIDTH_HZ)
+    freqs = np.where(valid, freqs, np.inf)
+    order_by = np.argsort(freqs, axis=1)[:, :n_formants]
+    freqs = np.take_along_axis(freqs, order_by, axis=1)
+    bandwidths = np.take_along_axis(bandwidths, order_by, axis=1)
+    missing = ~np.isfinite(freqs) | silent[:, None]
+    freqs[missing] = np.nan
+    bandwidths[missing] = np.nan
+    if freqs.shape[1] < n_formants:
+        pad = np.full((len(freqs), n_formants - freqs.shape[1]), np.nan)
+        freqs, bandwidths = np.hstack((freqs, pad)), np.hstack((bandwidths, pad))
+    return freqs, bandwidths
+
+
+def iter_formants(signal, Fs, win, step, n_formants=3, max_formants=5, max_formant=5500.,
+                  chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields blocks of formant frequencies and bandwidths per frame.
+    :param signal: 1-D samples, e.g. a memory mapped WAV
+    :param Fs: sample rate
+    :param win: window size in samples
+    :param step: step size in samples
+    :param n_formants: formants returned
+    :param max_formants: formants searched for; the prediction order is twice this
+    :param max_formant: ceiling of the formant search in Hz; frames are resampled to twice this
+    :param chunk_size: approximate number of samples to hold in memory at once
+    :return: (frames x 2 * n_formants) arrays, frequencies then bandwidths
+    """
+    signal = as_mono(signal)
+    win = int(win)
+    step = max(1, int(step))
+    total = count_frames(len(signal), win, step)
+    if total == 0:
+        return
+    target = min(float(Fs), 2. * max_formant)
+    length = max(2 * max_formants + 2, int(round(win * target / Fs)))
+    # the rate the frames actually have after resampling
+    rate = Fs * length / float(win) if length < win else float(Fs)
+    emphasis = np.exp(-2 * np.pi * PRE_EMPHASIS_HZ / rate)
+    window = np.hamming(length)
+
+    frames_per_chunk = max(1, count_frames(max(chunk_size, win), win, step))
+    for first in range(0, total, frames_per_chunk):
+        last = min(first + frames_per_chunk, total)
+        chunk = to_float(signal, first * step, (last - 1) * step + win)
+        frames = resample_frames(frame_signal(chunk, win, step), length)
+        emphasized = np.empty_like(frames)
+        emphasized[:, 0] = frames[:, 0]
+        emphasized[:, 1:] = frames[:, 1:] - emphasis * frames[:, :-1]
+        freqs, bandwidths = lpc_formants(emphasized * window, rate, n_formants, 2 * max_formants)
+        yield np.hstack((freqs, bandwidths))
+
+
+def formant_track(signal, Fs, win, step, n_formants=3, max_formants=5, max_formant=5500.,
+                  chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Collects iter_formants into a DataFrame indexed by the time of the frame centres.
+    :param signal:
+    :param Fs:
+    :param win: in samples
+    :param step: in samples
+    :param n_formants:
+    :param max_formants:
+    :param max_formant:
+    :param chunk_size:
+    :param progress: optional callable, given the fraction of frames done after every chunk
+    :return: DataFrame with F1.. and B1.. columns, see formant_labels
+    """
+    signal = as_mono(signal)
+    win = int(win)
+    step = max(1, int(step))
+    result = np.empty((count_frames(len(signal), win, step), 2 * n_formants))
+    pos = 0
+    for block in iter_formants(signal, Fs, win, step, n_formants, max_formants, max_formant, chunk_size):
+        result[pos:pos + len(block)] = block
+        pos += len(block)
+        if progress is not None:
+            progress(pos / float(len(result)))
+    times = (np.arange(len(result)) * step + win / 2.) / Fs
+    return pd.DataFrame(result, index=pd.Index(times, name="Time (s)"), columns=formant_labels(n_formants))
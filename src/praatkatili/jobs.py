@@ -0,0 +1,145 @@
+"""
+Background jobs. Long running analyses are queued on a thread pool instead of
+running inside the QAction that triggered them, so that the window (and the IPython
+console) stay responsive. Jobs report progress and results through Qt signals, which
+are delivered on the GUI thread.
+"""
+import time
+import traceback
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job(QObject):
+    """
+    A unit of work for the JobScheduler. The function is called as fn(job, *args, **kwargs)
+    and should call job.report() every now and then; that is also where a cancellation
+    request takes effect.
+    """
+    QUEUED, RUNNING, DONE, FAILED, CANCELLED = "Queued", "Running", "Done", "Failed", "Cancelled"
+
+    progress = pyqtSignal(float)
+    state_changed = pyqtSignal(str)
+    result_ready = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, name, fn, *args, **kwargs):
+        super(Job, self).__init__()
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.state = Job.QUEUED
+        self.fraction = 0.
+        self.started = self.ended = None
+        self._cancel_requested = False
+
+    def __str__(self):
+        return "Job({}, {})".format(self.name, self.state)
+
+    def report(self, fraction):
+        """
+        Called from the job function with the fraction of work done.
+        :param fraction: between 0 and 1
+        :return:
+        """
+        if self._cancel_requested:
+            raise JobCancelled()
+        self.fraction = fraction
+        self.progress.emit(fraction)
+
+    def cancel(self):
+        """
+        Requests cancellation; queued jobs never start, running ones stop at their next report().
+        :return:
+        """
+        self._cancel_requested = True
+
+    def is_finished(self):
+        return self.state in (Job.DONE, Job.FAILED, Job.CANCELLED)
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.
+        return (self.ended or time.time()) - self.started
+
+    def _set_state(self, state):
+        self.state = state
+        self.state_changed.emit(state)
+
+    def run(self):
+        if self._cancel_requested:
+            self._set_state(Job.CANCELLED)
+            return
+        self.started = time.time()
+        self._set_state(Job.RUNNING)
+        try:
+            result = self.fn(self, *self.args, **self.kwargs)
+        except JobCancelled:
+            self.ended = time.time()
+            self._set_state(Job.CANCELLED)
+        except Exception as e:
+            self.ended = time.time()
+            traceback.print_exc()
+            self._set_state(Job.FAILED)
+            self.failed.emit(str(e))
+        else:
+            self.ended = time.time()
+            self.fraction = 1.
+            self.progress.emit(1.)
+            self._set_state(Job.DONE)
+            self.result_ready.emit(result)
+
+
+class _JobRunnable(QRunnable):
+    def __init__(self, job):
+        super(_JobRunnable, self).__init__()
+        self.job = job
+
+    def run(self):
+        self.job.run()
+
+
+class JobScheduler(QObject):
+    """
+    Queue of jobs executed on a pool of worker threads.
+    """
+    job_added = pyqtSignal(object)
+
+    def __init__(self, max_threads=None, *args, **kwargs):
+        super(JobScheduler, self).__init__(*args, **kwargs)
+        self.pool = QThreadPool(self)
+        if max_threads is not None:
+            self.pool.setMaxThreadCount(max_threads)
+        self.jobs = []
+
+    def submit(self, name, fn, *args, on_result=None, **kwargs):
+        """
+        Queues fn(job, *args, **kwargs).
+        :param name: shown in the jobs dock
+        :param fn:
+        :param on_result: called on the GUI thread with the return value of fn
+        :return: the Job
+        """
+        # created here, the job lives on the GUI thread, so its signals are queued there
+        job = Job(name, fn, *args, **kwargs)
+        if on_result is not None:
+            job.result_ready.connect(on_result)
+        self.jobs.append(job)
+        self.job_added.emit(job)
+        self.pool.start(_JobRunnable(job))
+        return job
+
+    def running(self):
+        return [j for j in self.jobs if not j.is_finished()]
+
+    def clear_finished(self):
+        self.jobs = self.running()
+
+    def cancel_all(self):
+        for job in self.jobs:
+            job.cancel()
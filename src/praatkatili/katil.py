@@ -1,26 +1,49 @@
 import sys
 
+from praatkatili.util import StartupProfile, sanitize_alias
+
+# created before the other imports, so that they count towards the profile
+startup = StartupProfile(enabled="--profile-startup" in sys.argv)
+
 from PyQt5 import QtCore
 from PyQt5.QtCore import QSettings
 from PyQt5.QtWidgets import QDockWidget, QMessageBox, QProgressDialog
 
+from praatkatili.autosave import SessionAutosave
+from praatkatili.bridge import Bridge
 from praatkatili.config import *
-from praatkatili.dock import PlotDock, ResourceDock, FileBrowserDock, IPythonDock, NotebookDock
+from praatkatili.dock import PlotDock, ResourceDock, FileBrowserDock, IPythonDock, JobsDock, PerfDock
+from praatkatili.jobs import JobScheduler
+from praatkatili.perf import perf
+from praatkatili.registry import ResourceRegistry, DuplicateFileResourceError
 from praatkatili.resources import *
-from praatkatili.util import sanitize_alias
-import pandas as pd
+from praatkatili.session import SessionStore
+
+startup.mark("imports")
 
 
 class Katil(QtWidgets.QMainWindow):
-    def __init__(self):
+    def __init__(self, profile=None):
+        """
+        :param profile: StartupProfile to record the startup phases in
+        """
         super(Katil, self).__init__()
+        self.profile = profile or StartupProfile(enabled=False)
         self.plots = []
         self.plot_counter = 1
         self.tab_groups = []
-        self.resources = []
+        self.resources = ResourceRegistry()
         #
         self.file_model = QtWidgets.QFileSystemModel()
-        self.resourceDock = self.browserDock = self.consoleDock = None
+        self.resourceDock = self.browserDock = self.consoleDock = self.notebookDock = None
+        # shares resources with the notebook kernels, once the notebook dock exists
+        self.bridge = None
+        # saves the session once it is restored
+        self.autosave = SessionAutosave(self, AUTOSAVE_INTERVAL)
+        self.jobs = JobScheduler(parent=self)
+        # timings and counters, also reachable as KatilInstance.perf from the console
+        self.perf = perf
+        perf.enabled = PERF_ENABLED
 
         self.setup_main_window()
         self.setup_widgets()
@@ -29,9 +52,11 @@ class Katil(QtWidgets.QMainWindow):
         # plot actions
         line = QAction("Line plot", self)
         scatter = QAction("Scatter plot", self)
+        spectrogram = QAction("Spectrogram", self)
         line.triggered.connect(self.add_line_plot)
         scatter.triggered.connect(self.add_scatter_plot)
-        self.plot_actions = [line, scatter]
+        spectrogram.triggered.connect(self.add_spectrogram_plot)
+        self.plot_actions = [line, scatter, spectrogram]
 
         # resource actions
         add_file = QAction("Add file as resource", self)
@@ -39,7 +64,26 @@ class Katil(QtWidgets.QMainWindow):
         self.resource_actions = [add_file, remove_resource]
         self.addActions(self.plot_actions + self.resource_actions)
 
-        self.restoreSettings()
+        if DEFERRED_STARTUP:
+            # runs once the event loop is up and the window has been painted
+            QtCore.QTimer.singleShot(0, self.setup_deferred_widgets)
+        else:
+            self.setup_deferred_widgets()
+
+    def setup_deferred_widgets(self):
+        """
+        Creates the docks whose imports and setup take long, then restores the session.
+        :return:
+        """
+        self.profile.mark("window shown")
+        self.setup_console()
+        self.profile.mark("IPython console")
+        self.setup_jupyter_notebook()
+        self.profile.mark("notebook dock")
+        with perf.action("session.restore"):
+            self.restoreSettings()
+        self.profile.mark("session restore")
+        self.profile.report()
 
     def restoreSettings(self):
         progress = QProgressDialog("Restoring resources...", "Cancel", 0, 100)
@@ -48,25 +92,52 @@ class Katil(QtWidgets.QMainWindow):
 
         self.settings = settings = QSettings(QSettings.IniFormat, QSettings.UserScope,
                                              "KeremEryilmaz", "PraatKatili")
-        ress = settings.value("Katil/resources")
+        self.session = SessionStore(os.path.join(os.path.dirname(settings.fileName()),
+                                                 "PraatKatili.session"))
+        self.autosave.store = self.session
+        manifest = self.session.load()
+        if manifest is not None:
+            ress = []
+            for entry in manifest["resources"]:
+                try:
+                    ress.append(resource_from_session(entry, self.session))
+                except (FileNotFoundError, UnknownResourceTypeError) as e:
+                    print("Could not restore {}: {}".format(entry.get("alias"), e))
+            plots = [(p["tab_group"], p["plot"]) for p in manifest["plots"]]
+        else:
+            # sessions saved before the session store existed
+            ress = settings.value("Katil/resources")
+            plots = settings.value("Katil/plots")
+
         if ress:
-            counter = 0
+            unique, paths = [], set()
             for res in ress:
-                res.open()
-                self._add_resource(res)
-                counter += 1
-                progress.setValue(counter * 30 / len(ress))
-            print("Restored {} file resources.".format(counter))
+                path = getattr(res, "path", None)
+                if path is not None and (path in paths or self.resources.by_path(path) is not None):
+                    print("Skipping duplicate resource {}".format(path))
+                    continue
+                paths.add(path)
+                unique.append(res)
+            # file resources load their data on first access
+            self._add_resources(unique)
+            progress.setValue(30)
+            print("Restored {} file resources.".format(len(unique)))
+            if PREFETCH_RESOURCES:
+                files = [r for r in unique if isinstance(r, FileResource)]
+
+                def prefetched(_):
+                    self.resource_model.refresh()
+
+                self.jobs.submit("Prefetch resources", prefetch_resources, files, on_result=prefetched)
         progress.setLabelText("Restoring plots")
-        plots = settings.value("Katil/plots")
         if plots:
             counter = 0
             for tab_group, p in plots:
                 self.add_plot(tab_group=tab_group,
                               blank=True)
-                self.plots[-1].canvas.from_dict(p)
+                self.plots[-1].canvas.from_dict(p, self.resources)
                 counter += 1
-                progress.setValue(30 + counter * 50 / len(plots))
+                progress.setValue(int(30 + counter * 50 / len(plots)))
             print("Restored {} plots.".format(counter))
         progress.setLabelText("Restoring window geometry and state")
         try:
@@ -79,35 +150,26 @@ class Katil(QtWidgets.QMainWindow):
             self.restoreState(state)
             print("Restored window state.")
         progress.setValue(100)
+        self.autosave.start()
 
     def closeEvent(self, event):
-        self.save_settings()
-        self.notebookDock.stop_server()
+        self.jobs.cancel_all()
+        for dock in self.plots:
+            dock.canvas.stop_tiles()
+        with perf.action("session.save"):
+            self.save_settings()
+        if self.notebookDock is not None:
+            self.notebookDock.stop_server()
+        if self.bridge is not None:
+            self.bridge.close()
         super(Katil, self).closeEvent(event);
 
     def save_settings(self):
-        progress = QProgressDialog("Saving geometry...", "Cancel", 0, 100)
-        progress.setMinimumDuration(500)
-        progress.setModal(True)
-        # progress.show()
-
-        settings = QSettings(QSettings.IniFormat, QSettings.UserScope,
-                             "KeremEryilmaz", "PraatKatili");
-        settings.setValue("Katil/geometry", self.saveGeometry());
-        progress.setValue(10)
-        progress.setLabelText("Saving window state...")
-        settings.setValue("Katil/windowState", self.saveState());
-        progress.setValue(20)
-        progress.setLabelText("Saving resources...")
-        settings.setValue("Katil/resources", self.resources)
-        progress.setValue(50)
-        plots = []
-        progress.setLabelText("Saving plots...")
-        for i, p in enumerate(self.plots):
-            plots.append((p.tab_group, p.canvas.to_dict()))
-            progress.setValue(50 + (i + 1) * (45 / len(self.plots)))
-        settings.setValue("Katil/plots", plots)
-        progress.setValue(100)
+        """
+        Saves what changed since the last autosave and waits for it to be written.
+        :return:
+        """
+        self.autosave.flush()
 
     def delete_plot(self, dock):
         """
@@ -116,6 +178,7 @@ class Katil(QtWidgets.QMainWindow):
         """
         i = self.plots.index(dock)
         self.plots = self.plots[:i] + self.plots[i + 1:]
+        dock.canvas.stop_tiles()
         dock.close()
 
     def add_line_plot(self):
@@ -123,8 +186,8 @@ class Katil(QtWidgets.QMainWindow):
         self.add_plot(True)
         dock = self.plots[-1]
         dock.canvas.clear()
-        res = self.resource_model.itemFromIndex(selected).data()
-        dock.canvas.plot_line(res.data, res.alias)
+        res = self.resource_model.resource(selected)
+        dock.canvas.plot_line(res.data, res.alias, getattr(res, "labels", None), source=res)
         dock.canvas.axes.autoscale()
         dock.canvas.recenter()
 
@@ -133,23 +196,42 @@ class Katil(QtWidgets.QMainWindow):
         self.add_plot(True)
         dock = self.plots[-1]
         dock.canvas.clear()
-        res = self.resource_model.itemFromIndex(selected).data()
-        dock.canvas.plot_scatter(res.data, res.alias)
+        res = self.resource_model.resource(selected)
+        dock.canvas.plot_scatter(res.data, res.alias, getattr(res, "labels", None), source=res)
         dock.canvas.axes.autoscale()
         dock.canvas.recenter()
 
+    def add_spectrogram_plot(self):
+        selected = self.resource_view.currentIndex()
+        res = self.resource_model.resource(selected)
+        # loads the resource, and with it its sample rate
+        data = res.data
+        Fs = getattr(res, "sample_rate", None)
+        if Fs is None or Fs <= 0:
+            QMessageBox.critical(self,
+                                 "No sample rate",
+                                 "A spectrogram needs a signal with a sample rate; {} has none.".format(res.alias))
+            return
+        self.add_plot(True)
+        dock = self.plots[-1]
+        dock.canvas.clear()
+        dock.canvas.plot_spectrogram(data, Fs, res.alias, source=res)
+        dock.canvas.recenter()
+
     def setup_main_window(self):
         self.setDockOptions(DOCK_OPTIONS)
 
     def setup_widgets(self):
         """
-        Initializes the UI.
+        Initializes the docks the window is shown with; the rest are created
+        by setup_deferred_widgets.
         :return: 
         """
-        self.setup_jupyter_notebook()
-        self.setup_console()
         self.setup_file_browser()
         self.setup_resources()
+        self.setup_jobs()
+        self.setup_perf()
+        self.profile.mark("main window")
 
     def setup_console(self):
         """
@@ -161,11 +243,22 @@ class Katil(QtWidgets.QMainWindow):
         self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, dock)
         self.console = dock.console
         dock.inject_globals(globals())
+        # commands may change any resource; plots count their own changes
+        self.console.executed.connect(lambda msg: self.autosave.mark())
+        # resources opened before the console existed
+        dock.push_vars(self.resources.namespace())
 
     def find_docks(self, name=None):
         return self.findChildren(QDockWidget, name)
 
     def setup_jupyter_notebook(self):
+        from praatkatili.notebook import NotebookDock
+        if NOTEBOOK_BRIDGE:
+            self.bridge = Bridge()
+            # kernels ask for the resources they attach
+            self.bridge_watcher = QtCore.QFileSystemWatcher([self.bridge.request_dir], self)
+            self.bridge_watcher.directoryChanged.connect(lambda path: self.bridge.serve_requests())
+            self._publish(self.resources)
         self.notebookDock = dock = NotebookDock(objectName="notebookDock",
                                                 main_window=self)
         self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, dock)
@@ -200,18 +293,11 @@ class Katil(QtWidgets.QMainWindow):
         """
         try:
             ftype = FileTypes["*" + os.path.splitext(path)[1]]
+            if self.resources.by_path(path) is not None:
+                raise DuplicateFileResourceError(path)
             resource = ftype(path, alias=os.path.split(path)[-1])
-
-            def check_dup(item):
-                try:
-                    return item.path == path
-                except AttributeError:
-                    return False
-
-            if any(map(check_dup, self.resources)):
-                raise DuplicateFileResourceError()
-
-            resource.open()
+            with perf.action("resource.open_file"):
+                resource.open()
             self._add_resource(resource)
         except KeyError:
             ext = os.path.splitext(path)[1]
@@ -230,12 +316,40 @@ class Katil(QtWidgets.QMainWindow):
         :param resource: 
         :return: 
         """
-        found = self.resource_model.findItems(resource.alias)
-        if len(found) > 0:
-            resource.alias += "_{}".format(len(found))
-        self.resources.append(resource)
-        self.resourceDock.add_resource(resource)
-        self.consoleDock.push_vars({sanitize_alias(resource.alias): resource})
+        self._add_resources([resource])
+
+    def _add_resources(self, resources):
+        """
+        Adds several resources at once.
+        :param resources:
+        :return:
+        """
+        # registers the resources, making their aliases unique
+        self.resourceDock.add_resources(resources)
+        if self.consoleDock is not None:
+            self.consoleDock.push_vars({sanitize_alias(r.alias): r for r in resources})
+        self._publish(resources)
+        self.autosave.mark(resources)
+
+    def _resources_changed(self, resources):
+        """
+        Called when the data of resources changed, e.g. by an in-place transform.
+        :param resources:
+        :return:
+        """
+        # what notebook kernels attached before is a copy made before the change
+        self._publish(resources)
+        self.autosave.mark(resources)
+
+    def _publish(self, resources):
+        """
+        Offers resources to the notebook kernels, see praatkatili.bridge. Their data
+        is only copied, or for files loaded, once a kernel attaches them.
+        :param resources:
+        :return:
+        """
+        if self.bridge is not None:
+            self.bridge.offer([r for r in resources if isinstance(r, (Array, WAVFile, CSVFile))])
 
     def _delete_resource(self, resource):
         """
@@ -244,11 +358,17 @@ class Katil(QtWidgets.QMainWindow):
         :param resource: 
         :return: 
         """
-        i = self.resources.index(resource.data())
-        self.resources = self.resources[:i] + self.resources[i + 1:]
-        var_name = sanitize_alias(resource.data().alias)
+        var_name = sanitize_alias(resource.alias)
+        # also unregisters the resource
         self.resourceDock.delete_resource(resource)
-        self.consoleDock.delete_var(var_name)
+        if self.consoleDock is not None:
+            self.consoleDock.delete_var(var_name)
+        if self.bridge is not None:
+            self.bridge.unpublish(resource.alias)
+        # plots of it now have to be saved with their data
+        for dock in self.plots:
+            if any(s.get("source") is resource for s in dock.canvas.series):
+                dock.canvas.mark_changed()
 
     def setup_resources(self):
         """
@@ -260,6 +380,23 @@ class Katil(QtWidgets.QMainWindow):
         self.resource_view, self.resource_model = self.resourceDock.view_and_model()
         self.resourceDock.setWidget(self.resource_view)
 
+    def setup_jobs(self):
+        """
+        Sets up the dock listing background jobs.
+        :return:
+        """
+        self.jobsDock = JobsDock(objectName="jobsDock", scheduler=self.jobs)
+        self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, self.jobsDock)
+
+    def setup_perf(self):
+        """
+        Sets up the dock showing timings of the instrumented code.
+        :return:
+        """
+        self.perfDock = PerfDock(objectName="perfDock", perf=self.perf)
+        self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, self.perfDock)
+        self.tabifyDockWidget(self.jobsDock, self.perfDock)
+
     def add_plot(self, tab_group=None, blank=False):
         """
         Creates and adds a new plot dock, optionally belonging to a tab group.
@@ -305,11 +442,13 @@ class Katil(QtWidgets.QMainWindow):
 
 
 if __name__ == "__main__":
-    qapp = QtWidgets.QApplication(sys.argv)
+    # lets QtWebEngine be imported after the application exists, see setup_jupyter_notebook
+    QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_ShareOpenGLContexts)
+    qapp = QtWidgets.QApplication([arg for arg in sys.argv if arg != "--profile-startup"])
     qapp.setOrganizationName("KeremEryilmaz")
     qapp.setApplicationName("PraatKatili")
     qapp.setApplicationDisplayName("Praat Katili")
     qapp.setWheelScrollLines(20)
     global main_widget
-    main_widget = Katil()
+    main_widget = Katil(profile=startup)
     sys.exit(qapp.exec_())
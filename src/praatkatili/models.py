@@ -0,0 +1,132 @@
+"""
+Qt item models over praatkatili data structures.
+"""
+from PyQt5.QtCore import QAbstractItemModel, QModelIndex, Qt
+
+
+class ResourceModel(QAbstractItemModel):
+    """
+    Flat model of the resources in a ResourceRegistry, one row per resource. Display
+    text is computed when a row is first shown and cached until refresh(), so that
+    resources scrolled out of view cost nothing.
+    """
+    HEADERS = ["Alias", "Type", "Path", "Value"]
+    ResourceRole = Qt.UserRole
+
+    def __init__(self, registry, *args, **kwargs):
+        super(ResourceModel, self).__init__(*args, **kwargs)
+        self.registry = registry
+        # id(resource) -> display text of each column
+        self._text = {}
+
+    def resource(self, index):
+        """
+        :param index:
+        :return: the resource shown at index, or None
+        """
+        if not index.isValid() or index.row() >= len(self.registry):
+            return None
+        return self.registry[index.row()]
+
+    def index_of(self, resource, column=0):
+        return self.index(self.registry.row(resource), column)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.registry)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not 0 <= row < len(self.registry) or not 0 <= column < len(self.HEADERS):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        return QModelIndex()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled
+
+    def _display_text(self, resource):
+        text = self._text.get(id(resource))
+        if text is None:
+            path = getattr(resource, "path", None)
+            text = [resource.alias,
+                    resource.__class__.__name__,
+                    "N/A" if path is None else path,
+                    str(resource).strip()]
+            self._text[id(resource)] = text
+        return text
+
+    def data(self, index, role=Qt.DisplayRole):
+        resource = self.resource(index)
+        if resource is None:
+            return None
+        if role == self.ResourceRole:
+            return resource
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return self._display_text(resource)[index.column()]
+        return None
+
+    def add_resources(self, resources):
+        """
+        Registers resources and inserts their rows with a single rowsInserted signal.
+        :param resources:
+        :return: the resources
+        """
+        resources = list(resources)
+        if not resources:
+            return resources
+        # raises before the view is told about any rows
+        self.registry.check(resources)
+        first = len(self.registry)
+        self.beginInsertRows(QModelIndex(), first, first + len(resources) - 1)
+        try:
+            self.registry.add_many(resources)
+        finally:
+            self.endInsertRows()
+        return resources
+
+    def remove_resources(self, resources):
+        """
+        Unregisters resources, removing each run of adjacent rows at once.
+        :param resources:
+        :return:
+        """
+        rows = sorted(self.registry.row(r) for r in resources)
+        # contiguous runs, removed last to first so that the rows stay valid
+        runs = []
+        for row in rows:
+            if runs and runs[-1][1] == row - 1:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+        for first, last in reversed(runs):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for resource in self.registry.remove_rows(first, last):
+                self._text.pop(id(resource), None)
+            self.endRemoveRows()
+
+    def refresh(self, resource=None):
+        """
+        Drops cached display text, e.g. after a file resource has been loaded.
+        :param resource: the resource whose row changed, or None for all rows
+        :return:
+        """
+        if resource is None:
+            self._text = {}
+            if len(self.registry):
+                self.dataChanged.emit(self.index(0, 0),
+                                      self.index(len(self.registry) - 1, len(self.HEADERS) - 1))
+        elif resource in self.registry:
+            self._text.pop(id(resource), None)
+            self.dataChanged.emit(self.index_of(resource, 0),
+                                  self.index_of(resource, len(self.HEADERS) - 1))
@@ -0,0 +1,185 @@
+"""
+Jupyter notebook dock. Kept apart from praatkatili.dock because QtWebEngine and
+jupyter_client are slow to import; the main window imports this module only when the
+notebook dock is created.
+"""
+import locale
+import os
+import shlex
+import subprocess
+import threading
+
+import jupyter_client
+import jupyter_core
+from PyQt5 import QtCore, QtWidgets, QtWebEngineWidgets
+from PyQt5.QtWidgets import QTabWidget, QTabBar
+
+from praatkatili.dock import Dock
+
+encoding = locale.getdefaultlocale()[1]
+
+
+class NotebookTab(QtWebEngineWidgets.QWebEngineView):
+    def __init__(self, dock, *args, **kwargs):
+        super(NotebookTab, self).__init__(*args, **kwargs)
+        self.dock = dock
+        self.titleChanged.connect(self.refresh_title)
+
+
+    def refresh_title(self, title=None):
+        if title is None:
+            title = self.title()
+        self.dock.tabWidget.setTabText(self.dock.tabWidget.indexOf(self),
+                                       title)
+
+
+    def createWindow(self, QWebEnginePage_WebWindowType):
+        tab = self.dock.addTab()
+        self.dock.tabWidget.setCurrentWidget(tab)
+        return tab
+
+
+class NotebookDock(Dock):
+    """
+    Jupyter notebooks in web views. The server is started asynchronously: a reader
+    thread watches its output for the URL, and the main tab is loaded once the
+    server is up.
+    """
+    server_ready = QtCore.pyqtSignal(str, name="ServerReady")
+    # tries, 100 ms apart, to find the connection file once the server is up
+    CONNECTION_JSON_TRIES = 50
+    # seconds the server gets to shut down before it is killed
+    STOP_TIMEOUT = 5
+
+    def __init__(self, main_window, *args, **kwargs):
+        super(NotebookDock, self).__init__(*args, **kwargs)
+        self.jupyter_process = None
+        self.reader = None
+        self.connection_json = None
+        self.notebook_client = None
+        self.url = None
+
+        self.tabWidget = QTabWidget()
+        self.tabWidget.setTabsClosable(True)
+        self.main_window = main_window
+
+        expand = QtWidgets.QSizePolicy.Expanding
+        f = QtWidgets.QFrame()
+        f.setLayout(QtWidgets.QHBoxLayout())
+        f.setSizePolicy(expand, expand)
+        self.setWidget(f)
+        f.layout().addWidget(self.tabWidget)
+        self.setWindowTitle("IPython Notebooks")
+        self.server_ready.connect(self.on_server_ready)
+        self.main_tab = self.addTab()
+        self.start_server()
+
+    def addTab(self, url=None, request=None):
+        tab = NotebookTab(dock=self)
+        self.tabWidget.addTab(tab, "")
+        if request is not None:
+            request.openIn(tab)
+        elif url is None:
+            if self.url is not None:
+                tab.load(self.url)
+            else:
+                tab.setHtml("<p>Starting Jupyter notebook server...</p>")
+            self.tabWidget.tabBar().tabButton(0, QTabBar.RightSide).hide()
+        self.tabWidget.tabCloseRequested.connect(self.close_tab)
+        return tab
+
+    def close_tab(self, index):
+        tab = self.tabWidget.widget(index)
+        self.tabWidget.removeTab(index)
+        del tab
+
+    def closeEvent(self, event):
+        self.stop_server()
+        super(NotebookDock, self).closeEvent(event)
+
+    def start_server(self):
+        """
+        Launches the notebook server and returns right away; on_server_ready
+        takes over once the server reports its URL.
+        :return:
+        """
+        from glob import glob
+        if self.jupyter_process is not None:
+            self.stop_server()
+        self.json_dir = jupyter_core.paths.jupyter_runtime_dir()
+        self.jsons_before = set(glob(os.path.join(self.json_dir, "*.json")))
+        args = shlex.split("jupyter notebook --no-browser")
+        # kernels find the resources published by the main window through the environment
+        bridge = getattr(self.main_window, "bridge", None)
+        env = bridge.environment() if bridge is not None else None
+        self.jupyter_process = p = subprocess.Popen(args=args,
+                                                    stderr=subprocess.PIPE,
+                                                    env=env)
+        self.reader = threading.Thread(target=self._read_server_output, args=(p,),
+                                       name="jupyter-output", daemon=True)
+        self.reader.start()
+
+    def _read_server_output(self, process):
+        """
+        Runs on the reader thread. Keeps draining the server's output after the URL
+        shows up, so that the server never blocks on a full pipe.
+        """
+        from re import search
+        found = False
+        for line in iter(process.stderr.readline, b""):
+            if found:
+                continue
+            matches = search("http://.*:(.*?)/", line.decode(encoding, errors="replace").strip())
+            if matches is not None:
+                found = True
+                # queued to the GUI thread
+                self.server_ready.emit("http://{}:{}/".format("localhost", matches.groups(1)[0]))
+
+    def on_server_ready(self, url):
+        self.url = QtCore.QUrl(url)
+        print("Notebook at: {}".format(self.url))
+        self.main_tab.load(self.url)
+        self.find_connection_json(self.CONNECTION_JSON_TRIES)
+
+    def find_connection_json(self, tries):
+        from glob import glob
+        if self.jupyter_process is None:
+            return
+        for json in glob(os.path.join(self.json_dir, "*.json")):
+            if json not in self.jsons_before:
+                self.connection_json = json
+                break
+        else:
+            if tries > 1:
+                QtCore.QTimer.singleShot(100, lambda: self.find_connection_json(tries - 1))
+            else:
+                print("Could not find the connection JSON in {}.".format(self.json_dir))
+            return
+
+        self.notebook_client = jupyter_client.BlockingKernelClient(connection_file=self.connection_json)
+        self.notebook_client.load_connection_file()
+
+        self.notebook_client.start_channels()
+        self.notebook_client.execute("from praatkatili import attach")
+
+    def stop_server(self):
+        if self.jupyter_process:
+            print("Stopping Jupyter process (PID {})...".format(self.jupyter_process.pid))
+            self.jupyter_process.terminate()
+            try:
+                self.jupyter_process.wait(self.STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                self.jupyter_process.kill()
+                self.jupyter_process.wait()
+            # the reader owns the pipe and stops at the end of the output, which kernels
+            # still running may hold open; the daemon thread is left to them then
+            if self.reader is not None:
+                self.reader.join(self.STOP_TIMEOUT)
+                if not self.reader.is_alive():
+                    self.jupyter_process.stderr.close()
+                self.reader = None
+            self.jupyter_process = None
+            self.connection_json = None
+
+    def __del__(self):
+        self.stop_server()
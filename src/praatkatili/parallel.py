@@ -0,0 +1,110 @@
+"""
+Feature extraction on a pool of worker processes.
+
+Sample buffers are not pickled to the workers. Memory mapped files are re-mapped by
+path in each worker, which shares the OS page cache; anything else is copied once
+into a named shared memory block that the workers attach to.
+"""
+import mmap
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from praatkatili.cache import cached_short_term_feature_matrix
+from praatkatili.features import DEFAULT_CHUNK_SIZE, as_mono
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+class SharedArray(object):
+    """
+    Copy of an array in a shared memory block. spec is all a worker needs to attach.
+    """
+
+    def __init__(self, array):
+        array = np.asarray(array)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=self.shm.buf)
+        view[...] = array
+        del view
+        self.spec = ("shm", self.shm.name, array.shape, array.dtype.str)
+
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def share(array):
+    """
+    Makes an array reachable from worker processes.
+    :param array:
+    :return: spec to pass to attach(), and the SharedArray to release afterwards (None for mapped files)
+    """
+    if isinstance(array, np.memmap) and isinstance(array.base, mmap.mmap):
+        # the mapping itself, not a view into it, so offset and shape describe it fully
+        return ("file", array.filename, array.offset, array.shape, array.dtype.str), None
+    shared = SharedArray(array)
+    return shared.spec, shared
+
+
+def attach(spec):
+    """
+    Worker side of share().
+    :param spec:
+    :return: handle to close when done (or None), array
+    """
+    if spec[0] == "file":
+        _, filename, offset, shape, dtype = spec
+        return None, np.memmap(filename, dtype=np.dtype(dtype), mode="r", offset=offset, shape=shape)
+    _, name, shape, dtype = spec
+    # pool workers share the parent's resource tracker, so the block stays registered once
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _extract_features(spec, Fs, win, step, chunk_size, cache, path):
+    handle, signal = attach(spec)
+    try:
+        return cached_short_term_feature_matrix(cache, signal, Fs, win, step, path, chunk_size)
+    finally:
+        del signal
+        if handle is not None:
+            handle.close()
+
+
+class FeaturePool(object):
+    """
+    Runs short term feature extraction for many signals on a process pool.
+    """
+
+    def __init__(self, workers=None):
+        # spawn rather than fork: forking a process that runs a Qt event loop is not safe
+        self.executor = ProcessPoolExecutor(max_workers=workers or default_workers(),
+                                            mp_context=multiprocessing.get_context("spawn"))
+
+    def submit(self, signal, Fs, win, step, chunk_size=DEFAULT_CHUNK_SIZE, cache=None, path=None):
+        """
+        Queues one extraction.
+        :param signal: 1-D samples
+        :param Fs: sample rate
+        :param win: window size in samples
+        :param step: step size in samples
+        :param chunk_size:
+        :param cache: optional FeatureCache, consulted and filled by the worker
+        :param path: file the signal comes from, see cached_short_term_feature_matrix
+        :return: a Future resolving to the (frames x N_FEATURES) matrix
+        """
+        spec, shared = share(as_mono(signal))
+        future = self.executor.submit(_extract_features, spec, Fs, int(win), int(step), chunk_size,
+                                      cache, path)
+        if shared is not None:
+            future.add_done_callback(lambda f: shared.release())
+        return future
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,230 @@
+"""
+Instrumentation of the slow paths: resource loading, feature extraction, transforms,
+plot drawing and session save/restore.
+
+Code under measurement is wrapped in perf.timer("name") (or perf.action("name") for
+whole user actions) and perf.count("name") records events. Disabled, a timer is a
+shared do-nothing context manager, so instrumented code pays one attribute lookup.
+The module level perf object is the one shown in the Performance dock and exposed as
+KatilInstance.perf in the IPython console. Like features and cache, this module
+does not import Qt.
+"""
+import cProfile
+import io
+import pstats
+import threading
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+# timings kept per name
+HISTORY = 200
+
+
+def summarize(times):
+    """
+    :param times: timings in seconds
+    :return: dict with count, last, mean, p50, p90 and max, or None if there are none
+    """
+    times = np.asarray(times)
+    if not len(times):
+        return None
+    return {"count": len(times),
+            "last": float(times[-1]),
+            "mean": float(times.mean()),
+            "p50": float(np.percentile(times, 50)),
+            "p90": float(np.percentile(times, 90)),
+            "max": float(times.max())}
+
+
+def log_histogram(times, bins=8):
+    """
+    Histogram of timings on logarithmic bins.
+    :param times: timings in seconds
+    :param bins:
+    :return: counts, bin edges in seconds
+    """
+    times = np.asarray(times)
+    if not len(times):
+        return np.zeros(bins, dtype=int), np.zeros(bins + 1)
+    lo, hi = max(times.min(), 1e-7), max(times.max(), 1e-7)
+    if hi <= lo:
+        hi = lo * 1.01
+    return np.histogram(times, bins=np.geomspace(lo, hi, bins + 1))
+
+
+class _NoTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+class _Timer(object):
+    def __init__(self, perf, name):
+        self.perf = perf
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.perf.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _Action(_Timer):
+    """
+    A timer that also runs the cProfile capture requested by Perf.profile_next().
+    """
+
+    def __enter__(self):
+        self.profiler = self.perf._take_capture()
+        if self.profiler is not None:
+            self.profiler.enable()
+        return super(_Action, self).__enter__()
+
+    def __exit__(self, *exc):
+        super(_Action, self).__exit__(*exc)
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.perf._store_profile(self.name, self.profiler)
+        return False
+
+
+class Perf(object):
+    """
+    Recent timings per name, event counters and the last cProfile capture.
+    Safe to use from job threads.
+    """
+
+    def __init__(self, enabled=True, history=HISTORY):
+        self.enabled = enabled
+        self.history = history
+        self._lock = threading.Lock()
+        self.timings = {}
+        self.counters = Counter()
+        self._capture_requested = False
+        self._capturing = False
+        self.last_profile = None
+
+    def timer(self, name):
+        """
+        Context manager timing its body under name.
+        """
+        if not self.enabled:
+            return _NO_TIMER
+        return _Timer(self, name)
+
+    def action(self, name):
+        """
+        Like timer, for a complete user action such as running a job or saving the
+        session; the next action after profile_next() is run under cProfile.
+        """
+        if not self.enabled:
+            return _NO_TIMER
+        return _Action(self, name)
+
+    def record(self, name, seconds):
+        with self._lock:
+            if name not in self.timings:
+                self.timings[name] = deque(maxlen=self.history)
+            self.timings[name].append(seconds)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += n
+
+    def stats(self, name):
+        """
+        :param name:
+        :return: see summarize
+        """
+        with self._lock:
+            times = list(self.timings.get(name, ()))
+        return summarize(times)
+
+    def histogram(self, name, bins=8):
+        """
+        Histogram of the recent timings on logarithmic bins.
+        :param name:
+        :param bins:
+        :return: counts, bin edges in seconds
+        """
+        with self._lock:
+            times = list(self.timings.get(name, ()))
+        return log_histogram(times, bins)
+
+    def names(self):
+        with self._lock:
+            return sorted(self.timings)
+
+    def snapshot(self):
+        """
+        Copies of everything recorded, taken at once; job threads may record meanwhile.
+        :return: timings as lists by name, counters as a dict, and last_profile
+        """
+        with self._lock:
+            return ({name: list(times) for name, times in self.timings.items()},
+                    dict(self.counters), self.last_profile)
+
+    def profile_next(self):
+        """
+        Runs the next action under cProfile; see last_profile.
+        :return:
+        """
+        self._capture_requested = True
+
+    def _take_capture(self):
+        with self._lock:
+            # one profiler at a time, whichever thread the next action runs on
+            if not self._capture_requested or self._capturing:
+                return None
+            self._capture_requested = False
+            self._capturing = True
+        return cProfile.Profile()
+
+    def _store_profile(self, name, profiler, limit=30):
+        out = io.StringIO()
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats("cumulative").print_stats(limit)
+        with self._lock:
+            self.last_profile = "{}\n{}".format(name, out.getvalue())
+            self._capturing = False
+
+    def reset(self):
+        with self._lock:
+            self.timings = {}
+            self.counters = Counter()
+            self.last_profile = None
+
+    def report(self):
+        """
+        :return: the timings and counters as text, for the console
+        """
+        lines = ["{:<32}{:>7}{:>11}{:>11}{:>11}{:>11}".format("timer", "count", "last ms", "mean ms",
+                                                              "p90 ms", "max ms")]
+        timings, counters, _ = self.snapshot()
+        for name in sorted(timings):
+            s = summarize(timings[name])
+            if s is None:
+                continue
+            lines.append("{:<32}{:>7}{:>11.2f}{:>11.2f}{:>11.2f}{:>11.2f}".format(
+                name, s["count"], s["last"] * 1000, s["mean"] * 1000, s["p90"] * 1000, s["max"] * 1000))
+        for name, n in sorted(counters.items()):
+            lines.append("{:<32}{:>7}".format(name, n))
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return self.report()
+
+
+# the main window applies config.PERF_ENABLED
+perf = Perf()
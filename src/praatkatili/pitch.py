@@ -0,0 +1,161 @@
+"""
+Pitch (F0) tracking with YIN (de Cheveigne and Kawahara, 2002), for all frames of a
+chunk at once.
+
+For every frame the difference function d(tau) = sum_j (x_j - x_j+tau) ** 2 over an
+integration window of one longest period is expanded into energies and a cross
+correlation. The energies come from a running sum of squares and the correlations
+of all frames from one batched rfft, so no lag is computed in a Python loop. The
+cumulative mean normalized difference then gives the period: the bottom of the first
+dip below the threshold, refined by parabolic interpolation.
+
+Like features, the signal is walked in overlapping chunks, of which only one is
+converted to float at a time, so it may be a memory mapped recording of any length.
+This module does not import Qt.
+"""
+import numpy as np
+import pandas as pd
+
+from praatkatili.features import DEFAULT_CHUNK_SIZE, as_mono, count_frames, frame_signal, signal_stats
+from praatkatili.wav import to_float
+
+PITCH_LABELS = ["F0", "Voicing"]
+
+
+def fft_size(n):
+    """
+    :param n:
+    :return: the smallest product of powers of 2, 3 and 5 that is at least n; such
+        sizes transform about as fast as powers of two and waste less padding
+    """
+    best = 1 << int(np.ceil(np.log2(n)))
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            size = p35
+            while size < n:
+                size *= 2
+            best = min(best, size)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+def yin_frames(frames, tau_min, tau_max, threshold):
+    """
+    :param frames: (frames x 2 * tau_max + 2) array; the integration window is the
+        first tau_max + 1 samples
+    :param tau_min: shortest period searched, in samples
+    :param tau_max: longest period searched, in samples
+    :param threshold: YIN threshold on the normalized difference
+    :return: periods in samples (NaN where no dip falls below the threshold) and the
+        periodicity, 1 - normalized difference at the period, of every frame
+    """
+    n, length = frames.shape
+    win = length - tau_max - 1
+    nfft = fft_size(length)
+    # sum_j window_j * frame_j+tau for all lags at once; single precision halves the
+    # cost of the transforms and is plenty for locating a dip
+    single = frames.astype(np.float32)
+    corr = np.fft.irfft(np.conj(np.fft.rfft(single[:, :win], nfft, axis=1)) * np.fft.rfft(single, nfft, axis=1),
+                        nfft, axis=1)[:, :tau_max + 2]
+    squares = np.zeros((n, length + 1))
+    np.cumsum(frames ** 2, axis=1, out=squares[:, 1:])
+    energy = squares[:, win:win + tau_max + 2] - squares[:, :tau_max + 2]
+    diff = squares[:, win:win + 1] + energy - 2 * corr
+    np.maximum(diff, 0, out=diff)
+
+    # cumulative mean normalized difference
+    tau = np.arange(tau_max + 2)
+    running = np.cumsum(diff[:, 1:], axis=1)
+    cmnd = np.ones_like(diff)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cmnd[:, 1:] = np.where(running > 0, diff[:, 1:] * tau[1:] / running, 1.)
+
+    # the bottom of the first dip under the threshold is its first non-decreasing point
+    search = cmnd[:, tau_min:tau_max + 1]
+    candidate = (search < threshold) & (search <= cmnd[:, tau_min + 1:tau_max + 2])
+    voiced = candidate.any(axis=1)
+    best = np.where(voiced, candidate.argmax(axis=1), search.argmin(axis=1)) + tau_min
+
+    rows = np.arange(n)
+    left = cmnd[rows, np.maximum(best - 1, 1)]
+    centre = cmnd[rows, best]
+    right = cmnd[rows, best + 1]
+    curvature = left - 2 * centre + right
+    with np.errstate(invalid="ignore", divide="ignore"):
+        shift = np.where(curvature > 0, .5 * (left - right) / curvature, 0.)
+    period = np.where(voiced, best + np.clip(shift, -.5, .5), np.nan)
+    return period, np.clip(1. - centre, 0., 1.)
+
+
+def iter_pitch(signal, Fs, step, floor=75., ceiling=600., threshold=.15, silence=.03,
+               chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields blocks of (F0, voicing) per frame.
+    :param signal: 1-D samples, e.g. a memory mapped WAV
+    :param Fs: sample rate
+    :param step: step between frames, in samples
+    :param floor: lowest F0 searched, in Hz; also sets the window
+    :param ceiling: highest F0 searched, in Hz
+    :param threshold: YIN threshold; lower is stricter about voicing
+    :param silence: frames whose peak is below this fraction of the signal's peak are unvoiced
+    :param chunk_size: approximate number of samples to hold in memory at once
+    :return: (frames x 2) arrays; F0 in Hz, NaN where unvoiced, and the periodicity
+    """
+    signal = as_mono(signal)
+    step = max(1, int(step))
+    tau_max = int(np.ceil(Fs / float(floor)))
+    tau_min = max(2, int(np.floor(Fs / float(ceiling))))
+    if tau_min >= tau_max:
+        raise ValueError("Pitch ceiling {} must be above the floor {}".format(ceiling, floor))
+    length = 2 * tau_max + 2
+    total = count_frames(len(signal), length, step)
+    if total == 0:
+        return
+    _, peak = signal_stats(signal, chunk_size)
+    peak *= 2. ** 15
+
+    frames_per_chunk = max(1, count_frames(max(chunk_size, length), length, step))
+    for first in range(0, total, frames_per_chunk):
+        last = min(first + frames_per_chunk, total)
+        chunk = to_float(signal, first * step, (last - 1) * step + length)
+        frames = frame_signal(chunk, length, step)
+        frames = frames - frames.mean(axis=1, keepdims=True)
+        period, voicing = yin_frames(frames, tau_min, tau_max, threshold)
+        quiet = np.abs(frames[:, :length - tau_max - 1]).max(axis=1) < silence * peak
+        period[quiet] = np.nan
+        voicing[quiet] = 0.
+        yield np.column_stack((Fs / period, voicing))
+
+
+def pitch_track(signal, Fs, step, floor=75., ceiling=600., threshold=.15, silence=.03,
+                chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Collects iter_pitch into a DataFrame indexed by the time of the frame centres.
+    :param signal:
+    :param Fs:
+    :param step: in samples
+    :param floor:
+    :param ceiling:
+    :param threshold:
+    :param silence:
+    :param chunk_size:
+    :param progress: optional callable, given the fraction of frames done after every chunk
+    :return: DataFrame with the PITCH_LABELS columns
+    """
+    signal = as_mono(signal)
+    step = max(1, int(step))
+    tau_max = int(np.ceil(Fs / float(floor)))
+    length = 2 * tau_max + 2
+    result = np.empty((count_frames(len(signal), length, step), len(PITCH_LABELS)))
+    pos = 0
+    for block in iter_pitch(signal, Fs, step, floor, ceiling, threshold, silence, chunk_size):
+        result[pos:pos + len(block)] = block
+        pos += len(block)
+        if progress is not None:
+            progress(pos / float(len(result)))
+    # the centre of the integration window
+    times = (np.arange(len(result)) * step + (tau_max + 1) / 2.) / Fs
+    return pd.DataFrame(result, index=pd.Index(times, name="Time (s)"), columns=PITCH_LABELS)
@@ -0,0 +1,169 @@
+"""
+The resources open in a session, indexed by identity, path, alias and console
+variable name, so that adding, finding and deleting a resource does not scan the
+others.
+"""
+from praatkatili.util import sanitize_alias
+
+
+class DuplicateFileResourceError(Exception):
+    pass
+
+
+class ResourceRegistry(object):
+    """
+    Ordered collection of resources. Aliases are kept unique, and so are the variable
+    names (see util.sanitize_alias) the resources get in the IPython console.
+    """
+
+    def __init__(self, resources=()):
+        # in insertion order, which is also the order of the rows in the resource dock
+        self._resources = []
+        # id(resource) -> (path, alias, name) it is indexed under; aliases may be
+        # changed from the console after the resource was added
+        self._keys = {}
+        self._by_path = {}
+        self._by_alias = {}
+        self._by_name = {}
+        # next suffix to try for an alias, so that many copies of one alias stay cheap
+        self._suffixes = {}
+        # id(resource) -> row, rebuilt on demand after deletions
+        self._rows = None
+        self.add_many(resources)
+
+    def __len__(self):
+        return len(self._resources)
+
+    def __iter__(self):
+        return iter(list(self._resources))
+
+    def __contains__(self, resource):
+        return id(resource) in self._keys
+
+    def __getitem__(self, row):
+        return self._resources[row]
+
+    def resources(self):
+        return list(self._resources)
+
+    def _taken(self, alias):
+        return alias in self._by_alias or sanitize_alias(alias) in self._by_name
+
+    def unique_alias(self, alias):
+        """
+        :param alias:
+        :return: alias, or alias_1, alias_2... if that is already taken
+        """
+        if not self._taken(alias):
+            return alias
+        n = self._suffixes.get(alias, 1)
+        while self._taken("{}_{}".format(alias, n)):
+            n += 1
+        self._suffixes[alias] = n + 1
+        return "{}_{}".format(alias, n)
+
+    def check(self, resources):
+        """
+        Raises DuplicateFileResourceError unless all of resources can be added.
+        :param resources:
+        :return:
+        """
+        ids, paths = set(), set()
+        for resource in resources:
+            if id(resource) in self._keys or id(resource) in ids:
+                raise DuplicateFileResourceError(resource.alias)
+            ids.add(id(resource))
+            path = getattr(resource, "path", None)
+            if path is not None:
+                if path in self._by_path or path in paths:
+                    raise DuplicateFileResourceError(path)
+                paths.add(path)
+
+    def add(self, resource):
+        """
+        Registers a resource, renaming it if its alias is already taken.
+        :param resource:
+        :return: the resource
+        """
+        return self.add_many([resource])[0]
+
+    def add_many(self, resources):
+        """
+        Registers several resources; none of them is added if any is a duplicate.
+        :param resources:
+        :return: the resources
+        """
+        resources = list(resources)
+        self.check(resources)
+        for resource in resources:
+            resource.alias = self.unique_alias(resource.alias)
+            if self._rows is not None:
+                self._rows[id(resource)] = len(self._resources)
+            self._resources.append(resource)
+            path, name = getattr(resource, "path", None), sanitize_alias(resource.alias)
+            self._keys[id(resource)] = path, resource.alias, name
+            if path is not None:
+                self._by_path[path] = resource
+            self._by_alias[resource.alias] = resource
+            self._by_name[name] = resource
+        return resources
+
+    def remove(self, resource):
+        self.remove_many([resource])
+
+    def _unindex(self, resource):
+        path, alias, name = self._keys.pop(id(resource))
+        if self._by_path.get(path) is resource:
+            del self._by_path[path]
+        del self._by_alias[alias]
+        del self._by_name[name]
+
+    def remove_many(self, resources):
+        doomed = set()
+        for resource in resources:
+            self._unindex(resource)
+            doomed.add(id(resource))
+        self._resources = [r for r in self._resources if id(r) not in doomed]
+        self._rows = None
+
+    def remove_rows(self, first, last):
+        """
+        Removes the resources in rows first to last, inclusive.
+        :param first:
+        :param last:
+        :return: the removed resources
+        """
+        doomed = self._resources[first:last + 1]
+        for resource in doomed:
+            self._unindex(resource)
+        del self._resources[first:last + 1]
+        self._rows = None
+        return doomed
+
+    def row(self, resource):
+        """
+        :param resource:
+        :return: position of the resource in insertion order
+        """
+        if self._rows is None:
+            self._rows = {id(r): i for i, r in enumerate(self._resources)}
+        return self._rows[id(resource)]
+
+    def namespace(self):
+        """
+        :return: dict of console variable name to resource
+        """
+        return dict(self._by_name)
+
+    def by_path(self, path):
+        return self._by_path.get(path)
+
+    def by_alias(self, alias):
+        return self._by_alias.get(alias)
+
+    def by_name(self, name):
+        """
+        :param name: variable name in the IPython console
+        :return:
+        """
+        return self._by_name.get(name)
@@ -1,37 +1,176 @@
+import hashlib
 import os
+import threading
 import pandas as pd
 import numpy as np
 
-from PyQt5.QtWidgets import QMenu, QStyledItemDelegate
-from formlayout import QAction, fedit
-
-from pyAudioAnalysis import audioBasicIO, audioFeatureExtraction
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtWidgets import QAction, QMenu, QStyledItemDelegate
+
+from praatkatili.cache import FeatureCache, cached_short_term_feature_matrix
+from praatkatili.config import FEATURE_WORKERS, FEATURE_CACHE_DIR, FEATURE_CACHE_MAX_BYTES, CSV_SIDECAR
+from praatkatili.features import FEATURE_LABELS, as_mono
+from praatkatili.formants import formant_track
+from praatkatili.parallel import FeaturePool
+from praatkatili.perf import perf
+from praatkatili.pitch import pitch_track
+from praatkatili.registry import DuplicateFileResourceError
+from praatkatili.tabular import load_table
+from praatkatili.transform import Transform, TransformError, apply_transform, can_write
+from praatkatili.wav import load_wav, to_float
 
 """
-These are actions on resources, as represented in the context menus
+These are actions on resources, as represented in the context menus. formlayout and
+pyAudioAnalysis are imported where they are used, so that they do not slow down startup.
 """
 
+feature_cache = FeatureCache(FEATURE_CACHE_DIR, FEATURE_CACHE_MAX_BYTES)
+# rows sampled by the fingerprint of data that may be changed in place
+FINGERPRINT_ROWS = 1024
+
+
+def freeze(data):
+    """
+    Makes a new analysis result read-only, so that autosave can hand its buffer to
+    another thread without copying it, see Array.snapshot. Views are left writable,
+    since what they view may still change; so are pandas objects, which copy on write.
+    :param data:
+    :return: data
+    """
+    if isinstance(data, np.ndarray) and data.base is None:
+        data.flags.writeable = False
+    return data
+
+
+def fingerprint(data, rows=FINGERPRINT_ROWS):
+    """
+    Hash of evenly spaced rows of an array or pandas object: cheap, and it changes
+    with most edits of the whole data, though not necessarily with one of a few rows.
+    :param data:
+    :param rows:
+    :return: hex digest
+    """
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        sample = data.iloc[::max(1, len(data) // rows)]
+    else:
+        sample = np.ascontiguousarray(data[::max(1, len(data) // rows)] if data.ndim else data)
+        if not sample.dtype.hasobject:
+            return hashlib.sha1(sample).hexdigest()
+        sample = pd.DataFrame(sample.reshape(len(sample) if sample.ndim else 1, -1))
+    try:
+        return hashlib.sha1(pd.util.hash_pandas_object(sample, index=False).to_numpy()).hexdigest()
+    except TypeError:
+        # unhashable objects; such data is still saved when the session closes
+        return None
+
+
+def _run_transform(job, transform, resources, in_place, chunk_size):
+    """
+    Job applying one compiled transform to several resources.
+    :return: list of (resource, result), result being None if it was written into the resource's buffer
+    """
+    results = []
+    for i, resource in enumerate(resources):
+        data = resource.data
+        # Arrays whose buffer cannot be written to, such as pandas objects, analysis
+        # results (see freeze) and restored sessions, get a new one instead
+        write = in_place and can_write(data)
+        if in_place and not write and not isinstance(resource, Array):
+            raise TransformError("{} is read-only and cannot be transformed in place.".format(resource.alias))
+        progress = lambda f, i=i: job.report((i + f) / len(resources))
+        with perf.action("transform"):
+            result = apply_transform(transform, data, write, chunk_size, progress)
+        results.append((resource, None if write else result))
+    return results
+
+
+def _result_labels(resource, result):
+    """
+    :return: the column labels of resource, if an array result has as many columns
+    """
+    labels = getattr(resource, "labels", None)
+    if labels is None or isinstance(result, (pd.DataFrame, pd.Series)):
+        return None
+    result = np.asanyarray(result)
+    columns = result.shape[1] if result.ndim == 2 else 1 if result.ndim == 1 else 0
+    return labels if columns == len(labels) else None
+
+
+def _submit_transform(resources, main_win, code, in_place, chunk_rows, result_alias):
+    """
+    Compiles code against a snapshot of the console namespace and queues it for resources.
+    :param result_alias: function of a resource giving the alias of its result
+    """
+    code = main_win.consoleDock.transform_cell(code)
+    try:
+        transform = Transform(code, main_win.consoleDock.user_namespace())
+    except SyntaxError as e:
+        print("Invalid transform: {}".format(e))
+        return None
+
+    def add_results(results):
+        if in_place:
+            for resource, result in results:
+                if result is not None:
+                    resource.labels = _result_labels(resource, result)
+                    resource.data = freeze(result)
+                main_win.resource_model.refresh(resource)
+            main_win._resources_changed([resource for resource, _ in results])
+            return
+        arrays = []
+        for resource, result in results:
+            if result is not resource.data:
+                freeze(result)
+            arr = Array(alias=result_alias(resource), data=result, labels=_result_labels(resource, result))
+            # copy sample rate if it applies
+            if hasattr(resource, "sample_rate"):
+                arr.sample_rate = resource.sample_rate
+            arrays.append(arr)
+        main_win._add_resources(arrays)
+
+    name = resources[0].alias if len(resources) == 1 else "{} resources".format(len(resources))
+    return main_win.jobs.submit("Transform {}".format(name), _run_transform, transform, list(resources),
+                                in_place, chunk_rows or None, on_result=add_results)
+
+
+TRANSFORM_COMMENT = "Applies Python code to the data, available as _data. An expression gives the result " \
+                    "directly; statements must assign it to _data. Chunks of rows are transformed one at " \
+                    "a time when a chunk size is given."
+
+
 def transform_array(resource, main_win):
     datalist = [("Alias for result", "{}_transformed".format(resource.alias)),
-                ("Code to run", "_data + 1\n")]
-    res = fedit(datalist, title="Transform array",
-                comment="Applies arbitrary ipython statements to data. Use _data to access the data structure.")
+                ("Code to run", "_data + 1\n"),
+                ("In place", False),
+                ("Rows per chunk (0 for all)", 0)]
+    from formlayout import fedit
+    res = fedit(datalist, title="Transform array", comment=TRANSFORM_COMMENT)
+    if res is not None:
+        alias, code, in_place, chunk_rows = res
+        return _submit_transform([resource], main_win, code, in_place, chunk_rows,
+                                 lambda r: alias)
+
+
+def batch_transform(resources, main_win):
+    datalist = [("Result alias suffix", "_transformed"),
+                ("Code to run", "_data + 1\n"),
+                ("In place", False),
+                ("Rows per chunk (0 for all)", 0)]
+    from formlayout import fedit
+    res = fedit(datalist, title="Transform arrays", comment=TRANSFORM_COMMENT)
     if res is not None:
-        alias, code = res
-        main_win.consoleDock.push_vars({"_data": resource.data})
-        main_win.consoleDock.execute_command(code + ";")
-        data = main_win.consoleDock.pull_var("_data", delete=True)
-        arr = Array(alias=alias, data=data)
+        suffix, code, in_place, chunk_rows = res
+        return _submit_transform(resources, main_win, code, in_place, chunk_rows,
+                                 lambda r: r.alias + suffix)
 
-        # copy sample rate if it applies
-        if hasattr(resource, "sample_rate"):
-            arr.sample_rate = resource.sample_rate
-        main_win._add_resource(arr)
 
-        return arr
+def _run_short_term_features(job, data, Fs, win, step, path):
+    with perf.action("features.short_term"):
+        return cached_short_term_feature_matrix(feature_cache, data, Fs, win, step, path,
+                                                progress=job.report)
 
 
-def short_term_features(data, Fs, main_win):
+def short_term_features(data, Fs, main_win, path=None):
     """
     Short term features:
     1 	Zero Crossing Rate 	The rate of sign-changes of the signal during the duration of a particular frame.
@@ -46,30 +185,174 @@ def short_term_features(data, Fs, main_win):
     22-33 	Chroma Vector 	A 12-element representation of the spectral energy where the bins represent the 12 equal-tempered pitch classes of western-type music (semitone spacing).
     34 	Chroma Deviation 	The standard deviation of the 12 chroma coefficients.
     """
-    feat_labels = ["Zero Crossing Rate", "Energy", "Entropy of Energy", "Spectral Centroid", "Spectral Spread", "Spectral Entropy",
-                   "Spectral Flux", "Spectral Rolloff"]
-    for i in range(13):
-        feat_labels.append("MFCC_{}".format(i))
-    for i in range(2):
-        feat_labels.append("ChromaVector_{}".format(i))
-    feat_labels.append("Chroma Deviation")
-
     datalist = [("Window size", .05),
                 ("Step size", .05),
                 ("Result alias", "STF")]
+    from formlayout import fedit
     res = fedit(datalist, title="Short term features",
                 comment="Returns a matrix that consists of 34 feature time series.")
     if res is not None:
         win_size, step_size, alias = res
-        data = audioFeatureExtraction.stFeatureExtraction(data, Fs, win_size * Fs, step_size * Fs)
-        series = []
-        for row, label in zip(data, feat_labels):
-            series.append(pd.Series(data=row, name=label))
-        print("{} series produced, of length {}".format(len(series), len(series[0])))
-        data = pd.concat(series, axis=1)
-        arr = Array(alias=alias, data=data)
-        main_win._add_resource(arr)
-        return arr
+
+        def add_result(data):
+            print("{} series produced, of length {}".format(data.shape[1], data.shape[0]))
+            main_win._add_resource(Array(alias=alias, data=freeze(data), labels=FEATURE_LABELS))
+
+        return main_win.jobs.submit("Short term features ({})".format(alias), _run_short_term_features,
+                                    data, Fs, win_size * Fs, step_size * Fs, path, on_result=add_result)
+
+
+def _run_pitch_track(job, data, Fs, step, floor, ceiling, threshold, silence):
+    with perf.action("pitch"):
+        return pitch_track(as_mono(data), Fs, step, floor, ceiling, threshold, silence, progress=job.report)
+
+
+def track_pitch(data, Fs, main_win):
+    """
+    Pitch track with YIN. The result has an F0 column in Hz, NaN in unvoiced frames, and
+    a Voicing column with the periodicity of every frame between 0 and 1, indexed by
+    time in seconds.
+    """
+    datalist = [("Time step", .01),
+                ("Pitch floor (Hz)", 75.),
+                ("Pitch ceiling (Hz)", 600.),
+                ("Voicing threshold", .15),
+                ("Silence threshold", .03),
+                ("Result alias", "Pitch")]
+    from formlayout import fedit
+    res = fedit(datalist, title="Pitch track",
+                comment="Returns F0 and voicing per frame; F0 is NaN in unvoiced frames.")
+    if res is not None:
+        step, floor, ceiling, threshold, silence, alias = res
+
+        def add_result(data):
+            print("{} frames, {} voiced".format(len(data), data["F0"].notna().sum()))
+            main_win._add_resource(Array(alias=alias, data=data))
+
+        return main_win.jobs.submit("Pitch track ({})".format(alias), _run_pitch_track,
+                                    data, Fs, step * Fs, floor, ceiling, threshold, silence,
+                                    on_result=add_result)
+
+
+def _run_formant_track(job, data, Fs, win, step, n_formants, max_formants, max_formant):
+    with perf.action("formants"):
+        return formant_track(as_mono(data), Fs, win, step, n_formants, max_formants, max_formant,
+                             progress=job.report)
+
+
+def track_formants(data, Fs, main_win):
+    """
+    Formant track by linear prediction. The result has F1.. columns with the formant
+    frequencies and B1.. columns with their bandwidths, in Hz and NaN where a frame has
+    fewer formants, indexed by time in seconds.
+    """
+    datalist = [("Window size", .025),
+                ("Time step", .01),
+                ("Formants returned", 3),
+                ("Formants searched", 5),
+                ("Maximum formant (Hz)", 5500.),
+                ("Result alias", "Formants")]
+    from formlayout import fedit
+    res = fedit(datalist, title="Formants",
+                comment="Returns the frequencies and bandwidths of the lowest formants per frame.")
+    if res is not None:
+        win_size, step_size, n_formants, max_formants, max_formant, alias = res
+
+        def add_result(data):
+            print("{} frames, {} formants".format(len(data), n_formants))
+            main_win._add_resource(Array(alias=alias, data=data))
+
+        return main_win.jobs.submit("Formants ({})".format(alias), _run_formant_track,
+                                    data, Fs, win_size * Fs, step_size * Fs, n_formants, max_formants,
+                                    max_formant, on_result=add_result)
+
+
+def prefetch_resources(job, resources):
+    """
+    Job that loads the data of lazily restored resources ahead of first use.
+    """
+    for i, resource in enumerate(resources):
+        resource.data
+        job.report((i + 1) / float(len(resources)))
+
+
+class FutureRelay(QObject):
+    """
+    Hands results of concurrent futures over to the GUI thread. Future callbacks
+    run on executor threads; emitting a signal from there queues the slot on the
+    thread this object lives in.
+    """
+    finished = pyqtSignal(object, object)
+
+    def watch(self, future, context):
+        future.add_done_callback(lambda f: self.finished.emit(f, context))
+
+
+def batch_short_term_features(resources, main_win):
+    """
+    Runs short term feature extraction over several resources on a process pool,
+    adding each result as soon as it is ready.
+    """
+    datalist = [("Window size", .05),
+                ("Step size", .05),
+                ("Worker processes", FEATURE_WORKERS),
+                ("Result alias suffix", "_STF")]
+    from formlayout import fedit
+    res = fedit(datalist, title="Short term features (batch)",
+                comment="Extracts the 34 short term features of every selected resource in parallel.")
+    if res is None:
+        return
+    win_size, step_size, workers, suffix = res
+
+    pool = FeaturePool(workers)
+    relay = FutureRelay(main_win)
+    pending = []
+
+    def collect(future, resource):
+        pending.remove(future)
+        try:
+            main_win._add_resource(Array(alias=resource.alias + suffix, data=freeze(future.result()),
+                                         labels=FEATURE_LABELS))
+        except Exception as e:
+            print("Short term features failed for {}: {}".format(resource.alias, e))
+        if not pending:
+            pool.shutdown(wait=False)
+            relay.deleteLater()
+
+    relay.finished.connect(collect)
+    for resource in resources:
+        try:
+            signal = as_mono(resource.data)
+        except ValueError as e:
+            print("Skipping {}: {}".format(resource.alias, e))
+            continue
+        # read after the data, which sets it for files opened just now
+        Fs = resource.sample_rate
+        if Fs is None or Fs <= 0:
+            print("Skipping {}: no sample rate.".format(resource.alias))
+            continue
+        future = pool.submit(signal, Fs, win_size * Fs, step_size * Fs,
+                             cache=feature_cache, path=getattr(resource, "path", None))
+        pending.append(future)
+        relay.watch(future, resource)
+    if not pending:
+        pool.shutdown(wait=False)
+        relay.deleteLater()
+
+
+def generate_batch_actions(parent, resources, main_window):
+    numeric = [r for r in resources if isinstance(r, (Array, WAVFile))]
+    to_return = []
+    if numeric:
+        stFeatures = QAction("Short term features for selection...", parent)
+        stFeatures.triggered.connect(lambda checked, res=numeric:
+                                     batch_short_term_features(res, main_window))
+        to_return.append(stFeatures)
+        transform = QAction("Arbitrary transform of selection...", parent)
+        transform.triggered.connect(lambda checked, res=numeric:
+                                    batch_transform(res, main_window))
+        to_return.append(transform)
+    return to_return
 
 
 def generate_actions(parent, resource, main_window):
@@ -85,9 +368,21 @@ def generate_actions(parent, resource, main_window):
         stFeatures = QAction("Short term features...", parent)
         stFeatures.triggered.connect(lambda checked, res=resource:
                                      short_term_features(res.data, res.sample_rate,
-                                                         main_window))
+                                                         main_window, getattr(res, "path", None)))
         to_return.append(stFeatures)
 
+        # pitch
+        pitch = QAction("Pitch track...", parent)
+        pitch.triggered.connect(lambda checked, res=resource:
+                                track_pitch(res.data, res.sample_rate, main_window))
+        to_return.append(pitch)
+
+        # formants
+        formants = QAction("Formants...", parent)
+        formants.triggered.connect(lambda checked, res=resource:
+                                   track_formants(res.data, res.sample_rate, main_window))
+        to_return.append(formants)
+
         # arbitrary transform
         transform = QAction("Arbitrary transform...", parent)
         transform.triggered.connect(lambda checked, res=resource:
@@ -124,6 +419,38 @@ class Resource(object):
     def plot(self):
         raise NotImplementedError()
 
+    def to_session(self, store):
+        """
+        Describes the resource for a session manifest, writing any payload to the store.
+        :param store: a session.SessionStore
+        :return: JSON serializable dict, see resource_from_session
+        """
+        raise NotImplementedError()
+
+    def snapshot(self):
+        """
+        Called on the GUI thread before to_session runs on another one.
+        :return: a resource that describes like this one and that later changes to
+        this one do not affect
+        """
+        return self
+
+    def session_identity(self):
+        """
+        Cheap stand-in for the result of to_session, to tell whether the resource may
+        have changed, e.g. after a console command. It need not see every change made
+        to the data in place; see may_change_in_place.
+        :return:
+        """
+        raise NotImplementedError()
+
+    def may_change_in_place(self):
+        """
+        :return: whether the data may change without session_identity changing, so
+            that the resource must be saved anyway when the session is closed
+        """
+        return False
+
     def __str__(self):
         return str(self.data)
 
@@ -133,10 +460,12 @@ class Resource(object):
         plot_menu.addActions(parent.parent().plot_actions)
         process_menu = menu.addMenu("Analysis")
         process_menu.addActions(generate_actions(parent, self, main_window))
+        selection = parent.selected_resources()
+        if len(selection) > 1:
+            process_menu.addSeparator()
+            process_menu.addActions(generate_batch_actions(parent, selection, main_window))
         delete = QAction("Delete", parent)
-        selected = main_window.resource_view.currentIndex()
-        item = main_window.resource_model.itemFromIndex(selected)
-        delete.triggered.connect(lambda checked, res=item:
+        delete.triggered.connect(lambda checked, res=self:
                                  main_window._delete_resource(res))
         menu.addAction(delete)
         return menu
@@ -145,8 +474,12 @@ class Resource(object):
 class FileResource(Resource):
     """
     Generic text file, parent class to all other file resources. 
+    The contents are loaded on first access to data, and are not pickled along 
+    with the resource; the file is simply read again.
     """
     file_masks = []
+    # serializes lazy loads between the GUI thread and prefetching jobs
+    _open_lock = threading.RLock()
 
     def __init__(self, path, *args, alias=None, writable=True, **kwargs):
         super(FileResource, self).__init__(alias, *args, **kwargs)
@@ -156,60 +489,245 @@ class FileResource(Resource):
         self.writable = writable
         self.data = None
 
+    @property
+    def data(self):
+        if self._data is None:
+            with self._open_lock:
+                if self._data is None:
+                    with perf.timer("resource.open"):
+                        self.open()
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    def is_loaded(self):
+        return self._data is not None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_data"] = None
+        return state
+
+    def __setstate__(self, state):
+        # sessions saved before loading was lazy pickled the data itself
+        if "data" in state:
+            state["_data"] = state.pop("data")
+        self.__dict__.update(state)
+
+    def to_session(self, store):
+        return {"type": self.__class__.__name__,
+                "alias": self.alias,
+                "path": self.path,
+                "writable": self.writable}
+
+    def session_identity(self):
+        # file resources store nothing but these settings, and not through the store
+        return self.to_session(None)
+
+    @classmethod
+    def from_session(cls, entry, store):
+        resource = cls(entry["path"], alias=entry["alias"])
+        resource.writable = entry["writable"]
+        return resource
+
     def __str__(self):
+        if not self.is_loaded():
+            return "Not loaded ({})".format(self.path)
         return "{} ({})".format(super(FileResource, self).__str__(), self.path)
 
     def open(self):
-        self.data = open(self.path, mode="rw" if self.writable else "r")
+        self.data = open(self.path, mode="r+" if self.writable else "r")
 
 
 class CSVFile(FileResource):
-    file_masks = ("*.csv",)
+    """
+    Delimited text table, read into one NumPy array per column (see praatkatili.tabular)
+    and shown as a DataFrame. With sidecar set, the parsed columns are also stored next
+    to the file, and later opens map them from there instead of parsing again.
+    """
+    file_masks = ("*.csv", "*.tsv")
+    # class level default, so that resources pickled before this option existed still load
+    sidecar = CSV_SIDECAR
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, sidecar=CSV_SIDECAR, **kwargs):
         super(CSVFile, self).__init__(*args, **kwargs)
+        self.sidecar = sidecar
+        self.columns = None
+
+    def __getstate__(self):
+        state = super(CSVFile, self).__getstate__()
+        state["columns"] = None
+        return state
+
+    def open(self):
+        self.columns = load_table(self.path, self.sidecar)
+        self.data = pd.DataFrame(self.columns, copy=False)
+        return self.data
+
+    def to_session(self, store):
+        entry = super(CSVFile, self).to_session(store)
+        entry["sidecar"] = self.sidecar
+        return entry
+
+    @classmethod
+    def from_session(cls, entry, store):
+        resource = super(CSVFile, cls).from_session(entry, store)
+        resource.sidecar = entry.get("sidecar", CSV_SIDECAR)
+        return resource
 
 
 class WAVFile(FileResource):
     """
-    Audio file in wave format.  
+    Audio file in wave format. By default the samples are memory mapped in their
+    native dtype rather than decoded into a float64 Series; use samples() to get
+    float copies of just the stretch you need.
     """
     file_masks = ("*.wav", "*.wave")
+    # class level default, so that resources pickled before this option existed still load
+    memmap = True
 
-    def __init__(self, path, alias, *args, **kwargs):
+    def __init__(self, path, alias, *args, memmap=True, **kwargs):
         super(WAVFile, self).__init__(path, *args, alias=alias, **kwargs)
         self.sample_rate = -1
+        self.memmap = memmap
 
     def open(self):
-        self.sample_rate, self.data = audioBasicIO.readAudioFile(self.path)
-        self.data = pd.Series(self.data,
-                              name="WAV:{}".format(self.alias),
-                              dtype=np.float64)
+        self.sample_rate, data = load_wav(self.path, self.memmap)
+        if not isinstance(data, np.memmap):
+            data = pd.Series(data,
+                             name="WAV:{}".format(self.alias),
+                             dtype=np.float64)
+        self.data = data
         return self.data
 
+    def to_session(self, store):
+        entry = super(WAVFile, self).to_session(store)
+        entry["memmap"] = self.memmap
+        entry["sample_rate"] = self.sample_rate
+        return entry
+
+    @classmethod
+    def from_session(cls, entry, store):
+        resource = super(WAVFile, cls).from_session(entry, store)
+        resource.memmap = entry["memmap"]
+        resource.sample_rate = entry["sample_rate"]
+        return resource
+
+    def samples(self, start=None, stop=None):
+        """
+        Float64 copy of the samples in [start, stop).
+        :param start:
+        :param stop:
+        :return:
+        """
+        return to_float(self.data, start, stop)
+
     def __str__(self):
         return "WAVFile({})".format(self.path)
 
 
 class Array(Resource):
     """
-    Resource wrapper for Numpy arrays.
+    Resource wrapper for Numpy arrays. The array is kept as it is given, in its own
+    dtype; columns may be named by labels. A pandas view is only built when frame is
+    accessed. pandas objects are kept as they are.
     """
     count = 0
 
-    def __init__(self, alias, data, *args, **kwargs):
+    def __init__(self, alias, data, *args, labels=None, **kwargs):
         super(Array, self).__init__(alias, *args, **kwargs)
-        if not (isinstance(data, pd.DataFrame) or isinstance(data, pd.Series)):
-            data = pd.DataFrame(data, dtype=np.float64)
+        if not isinstance(data, (pd.DataFrame, pd.Series)):
+            data = np.asanyarray(data)
+            if labels is not None and len(labels) != (data.shape[1] if data.ndim == 2 else 1):
+                raise ValueError("{} labels for an array of shape {}".format(len(labels), data.shape))
+        self.labels = None if labels is None else list(labels)
         self.data = data
         self.sample_rate = None
 
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._frame = None
+
+    @property
+    def frame(self):
+        """
+        The data as a pandas DataFrame (or Series), built on first access.
+        """
+        if isinstance(self._data, (pd.DataFrame, pd.Series)):
+            return self._data
+        if self._frame is None:
+            if self._data.ndim == 1:
+                name = self.labels[0] if self.labels else None
+                self._frame = pd.Series(self._data, name=name, copy=False)
+            else:
+                self._frame = pd.DataFrame(self._data, columns=self.labels, copy=False)
+        return self._frame
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_frame"] = None
+        return state
+
+    def __setstate__(self, state):
+        # pickled before data became a property
+        if "data" in state:
+            state["_data"] = state.pop("data")
+        state.setdefault("labels", None)
+        state.setdefault("_frame", None)
+        self.__dict__.update(state)
+
     def open(self):
         pass
 
+    def to_session(self, store):
+        return {"type": self.__class__.__name__,
+                "alias": self.alias,
+                "sample_rate": self.sample_rate,
+                "labels": self.labels,
+                "data": store.write_data(self.data)}
+
+    def snapshot(self):
+        data = self.data
+        if isinstance(data, (pd.DataFrame, pd.Series)):
+            # later changes copy on write, leaving this copy's columns as they are
+            data = data.copy(deep=False)
+        elif self.may_change_in_place():
+            # made in the console; analysis results and restored arrays are read-only
+            data = data.copy()
+        copy = Array(self.alias, data, labels=self.labels)
+        copy.sample_rate = self.sample_rate
+        return copy
+
+    def session_identity(self):
+        data = self.data
+        if isinstance(data, pd.DataFrame):
+            layout = (list(data.columns), [str(t) for t in data.dtypes])
+        else:
+            layout = str(data.dtype)
+        return (self.alias, self.sample_rate, self.labels, id(data), data.shape, layout,
+                fingerprint(data) if self.may_change_in_place() else None)
+
+    def may_change_in_place(self):
+        data = self.data
+        return not (isinstance(data, np.ndarray) and not data.flags.writeable)
+
+    @classmethod
+    def from_session(cls, entry, store):
+        resource = cls(entry["alias"], store.read_data(entry["data"]), labels=entry.get("labels"))
+        resource.sample_rate = entry["sample_rate"]
+        return resource
+
     def __str__(self):
-        s = "{}({})".format(self.data.__class__.__name__, self.data.shape)
-        return s
+        if isinstance(self.data, np.ndarray):
+            return "{}({}, {})".format(self.data.__class__.__name__, self.data.shape, self.data.dtype)
+        return "{}({})".format(self.data.__class__.__name__, self.data.shape)
 
 
 class ArrayDelegate(QStyledItemDelegate):
@@ -221,12 +739,25 @@ class UnknownResourceTypeError(Exception):
     pass
 
 
-class DuplicateFileResourceError(Exception):
-    pass
 
 FileTypes = {}
 for type in (WAVFile, CSVFile):
     for ext in type.file_masks:
         FileTypes[ext] = type
 
+SessionTypes = {t.__name__: t for t in (Array, FileResource, WAVFile, CSVFile)}
+
+
+def resource_from_session(entry, store):
+    """
+    Recreates a resource from its session manifest entry.
+    :param entry:
+    :param store:
+    :return:
+    """
+    try:
+        return SessionTypes[entry["type"]].from_session(entry, store)
+    except KeyError:
+        raise UnknownResourceTypeError(entry["type"])
+
 Delegates = {Array: ArrayDelegate}
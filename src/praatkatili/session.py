@@ -0,0 +1,187 @@
+"""
+On-disk session store.
+
+A session is a directory holding a small JSON manifest (resource metadata, plot
+descriptions) and the array payloads as .npy files, one per column. Payload files are
+named after a hash of their contents, so unchanged arrays are never rewritten, and
+are memory mapped when the session is restored. File resources are stored by path only.
+Payloads the manifest no longer references are removed after it is written; the
+manifest may thus reuse descriptors from an earlier save, see praatkatili.autosave.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from praatkatili.cache import array_digest
+
+MANIFEST = "manifest.json"
+ARRAYS = "arrays"
+VERSION = 1
+
+
+def _json_name(name):
+    if name is None or isinstance(name, (str, int, float, bool)):
+        return name
+    return str(name)
+
+
+def _payloads(obj, found=None):
+    """
+    :param obj: manifest, or part of it
+    :return: names of the payload files it references
+    """
+    if found is None:
+        found = set()
+    if isinstance(obj, dict):
+        for value in obj.values():
+            _payloads(value, found)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            _payloads(value, found)
+    elif isinstance(obj, str) and obj.startswith(ARRAYS + os.sep) and obj.endswith(".npy"):
+        found.add(os.path.basename(obj))
+    return found
+
+
+class SessionStore(object):
+    def __init__(self, directory):
+        self.directory = directory
+        self.array_dir = os.path.join(directory, ARRAYS)
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.directory, MANIFEST))
+
+    def write_array(self, array):
+        """
+        Stores a 1-D or 2-D array unless an identical one is already stored.
+        :param array:
+        :return: file name relative to the session directory
+        """
+        array = np.asanyarray(array)
+        if isinstance(array, np.memmap) and array.filename is not None \
+                and os.path.dirname(os.path.abspath(array.filename)) == os.path.abspath(self.array_dir) \
+                and not array.flags.writeable:
+            # mapped read-only from this very store: cannot have changed
+            name = os.path.join(ARRAYS, os.path.basename(array.filename))
+        else:
+            if array.dtype.hasobject:
+                # object columns cannot be mapped; store them as strings
+                array = array.astype(str)
+            name = os.path.join(ARRAYS, array_digest(array) + ".npy")
+            path = os.path.join(self.directory, name)
+            if not os.path.exists(path):
+                os.makedirs(self.array_dir, exist_ok=True)
+                tmp = path + ".tmp"
+                with open(tmp, "wb") as f:
+                    np.save(f, np.ascontiguousarray(array))
+                os.replace(tmp, path)
+        return name
+
+    def read_array(self, name):
+        return np.load(os.path.join(self.directory, name), mmap_mode="r")
+
+    def write_data(self, data):
+        """
+        Stores a DataFrame, Series or array column by column.
+        :param data:
+        :return: JSON serializable descriptor for read_data
+        """
+        if isinstance(data, pd.DataFrame):
+            desc = {"kind": "DataFrame",
+                    "columns": [{"name": _json_name(c), "file": self.write_array(data[c].values)}
+                                for c in data.columns]}
+        elif isinstance(data, pd.Series):
+            desc = {"kind": "Series", "name": _json_name(data.name), "file": self.write_array(data.values)}
+        else:
+            return {"kind": "ndarray", "file": self.write_array(data)}
+        index = data.index
+        if isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1:
+            desc["index"] = None
+        else:
+            desc["index"] = self.write_array(np.asarray(index))
+        return desc
+
+    def read_data(self, desc):
+        if desc["kind"] == "ndarray":
+            return self.read_array(desc["file"])
+        index = None if desc["index"] is None else self.read_array(desc["index"])
+        if desc["kind"] == "Series":
+            return pd.Series(self.read_array(desc["file"]), index=index, name=desc["name"], copy=False)
+        columns = [c["name"] for c in desc["columns"]]
+        arrays = [self.read_array(c["file"]) for c in desc["columns"]]
+        frame = pd.DataFrame(dict(zip(range(len(arrays)), arrays)), index=index, copy=False)
+        frame.columns = columns
+        return frame
+
+    def externalize(self, obj):
+        """
+        Replaces the arrays nested in dicts and lists by references to stored files.
+        :param obj:
+        :return:
+        """
+        if isinstance(obj, dict):
+            return {k: self.externalize(v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return [self.externalize(v) for v in obj]
+        if isinstance(obj, np.ndarray):
+            return {"__npy__": self.write_array(obj)}
+        if isinstance(obj, np.generic):
+            return obj.item()
+        return obj
+
+    def internalize(self, obj):
+        if isinstance(obj, dict):
+            if "__npy__" in obj:
+                return self.read_array(obj["__npy__"])
+            return {k: self.internalize(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self.internalize(v) for v in obj]
+        return obj
+
+    def save(self, resources, plots):
+        """
+        Writes the manifest and removes payloads it no longer references. Payloads
+        must have been written through this store beforehand, by this or an earlier save.
+        :param resources: list of resource descriptors
+        :param plots: list of (tab group, externalized plot dict)
+        :return:
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = {"version": VERSION,
+                    "resources": resources,
+                    "plots": [{"tab_group": g, "plot": p} for g, p in plots]}
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(path + ".tmp", path)
+        self.collect_garbage(_payloads(manifest))
+
+    def collect_garbage(self, referenced):
+        """
+        :param referenced: names of the payload files to keep
+        :return:
+        """
+        if not os.path.isdir(self.array_dir):
+            return
+        for name in os.listdir(self.array_dir):
+            if name not in referenced:
+                try:
+                    os.remove(os.path.join(self.array_dir, name))
+                except OSError:
+                    # still mapped somewhere (Windows); try again next time
+                    pass
+
+    def load(self):
+        """
+        :return: the manifest, or None if there is no stored session
+        """
+        try:
+            with open(os.path.join(self.directory, MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        for p in manifest["plots"]:
+            p["plot"] = self.internalize(p["plot"])
+        return manifest
@@ -0,0 +1,132 @@
+"""
+Tiled short time Fourier transform for drawing spectrograms of long recordings.
+
+The time axis is cut into tiles of TILE_FRAMES analysis frames. The hop between
+frames is picked per view, as the power of two closest to the number of samples per
+pixel column, so a tile always holds about as many frames as it covers pixels. Only
+the samples under the frames of a tile are read, which keeps zoomed out tiles of
+memory mapped recordings cheap. Computed tiles are kept in a least recently used
+cache keyed by (hop, tile index), so panning back and forth or returning to a zoom
+level costs nothing.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+TILE_FRAMES = 256
+# seconds of signal per analysis window
+WINDOW_SECONDS = .01
+# tiles kept in the cache of each spectrogram
+MAX_TILES = 256
+# decibels shown below the loudest bin seen so far
+DYNAMIC_RANGE = 70.
+
+
+def window_size(Fs):
+    """
+    :param Fs:
+    :return: the power of two closest to WINDOW_SECONDS worth of samples
+    """
+    return 2 ** max(4, int(round(np.log2(WINDOW_SECONDS * Fs))))
+
+
+class SpectrogramTiles(object):
+    """
+    STFT tiles of one signal. get() and compute() may be called from any thread.
+    """
+
+    def __init__(self, signal, Fs, n_fft=None, max_tiles=MAX_TILES):
+        """
+        :param signal: 1-D samples, or (samples x channels), which are averaged
+        :param Fs: sample rate
+        :param n_fft: window size in samples, see window_size
+        :param max_tiles:
+        """
+        self.signal = signal
+        self.Fs = Fs
+        self.n_fft = n_fft or window_size(Fs)
+        self.max_tiles = max_tiles
+        self.window = np.hanning(self.n_fft)
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.signal)
+
+    def duration(self):
+        return len(self.signal) / float(self.Fs)
+
+    def hop_for(self, x0, x1, width):
+        """
+        :param x0: start of the view in seconds
+        :param x1: end of the view in seconds
+        :param width: pixels
+        :return: hop in samples; never below a quarter window
+        """
+        per_pixel = max(1., (x1 - x0) * self.Fs / max(1, width))
+        return max(self.n_fft // 4, 2 ** int(round(np.log2(per_pixel))))
+
+    def tile_span(self, hop, index):
+        """
+        :return: start and end of a tile in seconds
+        """
+        samples = TILE_FRAMES * hop
+        start = index * samples
+        return start / float(self.Fs), min(start + samples, len(self.signal)) / float(self.Fs)
+
+    def tiles_in(self, x0, x1, hop):
+        """
+        :return: indices of the tiles at hop that overlap [x0, x1] seconds
+        """
+        samples = TILE_FRAMES * hop
+        last = (len(self.signal) - 1) // samples
+        first = max(0, int(np.floor(x0 * self.Fs / samples)))
+        stop = min(last, int(np.floor(x1 * self.Fs / samples)))
+        return list(range(first, stop + 1))
+
+    def get(self, hop, index):
+        """
+        :return: the cached tile, or None
+        """
+        key = (hop, index)
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+            return tile
+
+    def compute(self, hop, index):
+        """
+        Computes a tile, or takes it from the cache.
+        :param hop:
+        :param index:
+        :return: (frames x n_fft // 2 + 1) float32 array of levels in dB, or None past the end
+        """
+        tile = self.get(hop, index)
+        if tile is not None:
+            return tile
+        n = len(self.signal)
+        starts = index * TILE_FRAMES * hop + np.arange(TILE_FRAMES) * hop
+        starts = starts[starts < n]
+        if not len(starts):
+            return None
+        idx = starts[:, None] + np.arange(self.n_fft)
+        valid = idx < n
+        # only the samples under the frames are read
+        frames = np.asarray(self.signal[np.minimum(idx, n - 1)], dtype=np.float64)
+        if frames.ndim == 3:
+            frames = frames.mean(axis=2)
+        frames[~valid] = 0.
+        frames -= frames.mean(axis=1, keepdims=True)
+        spectrum = np.abs(np.fft.rfft(frames * self.window, axis=1))
+        tile = (20 * np.log10(spectrum + 1e-10)).astype(np.float32)
+        with self._lock:
+            self._tiles[(hop, index)] = tile
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+        return tile
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
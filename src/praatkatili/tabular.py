@@ -0,0 +1,241 @@
+"""
+Reading delimited text tables (CSV and the like) into columnar NumPy arrays.
+
+The delimiter, header and column types are inferred from a sample at the start of
+the file; the rest is parsed in chunks by pandas' C parser and each column is
+collected into a single array. Text columns become categoricals: an integer code per
+row and each distinct value once. A parsed table can be stored next to the file as a
+binary sidecar (one .npy per column, the distinct values of text columns as UTF-8
+bytes with their offsets, and a small JSON index), which later opens memory mapped
+instead of being parsed again, as long as the file is unchanged.
+"""
+import csv
+import json
+import os
+import shutil
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+SAMPLE_BYTES = 2 ** 16
+SAMPLE_ROWS = 1000
+CHUNK_ROWS = 2 ** 18
+SIDECAR_VERSION = 2
+
+
+class TableFormatError(Exception):
+    pass
+
+
+def sniff(path, sample_bytes=SAMPLE_BYTES):
+    """
+    :param path:
+    :param sample_bytes:
+    :return: delimiter, whether the first row is a header
+    """
+    with open(path, newline="") as f:
+        sample = f.read(sample_bytes)
+    if not sample.strip():
+        raise TableFormatError("Empty table: {}".format(path))
+    # the last line of the sample may be cut short
+    if len(sample) == sample_bytes and "\n" in sample:
+        sample = sample[:sample.rindex("\n")]
+    sniffer = csv.Sniffer()
+    try:
+        delimiter = sniffer.sniff(sample, delimiters=",;\t| ").delimiter
+    except csv.Error:
+        delimiter = ","
+    try:
+        has_header = sniffer.has_header(sample)
+    except csv.Error:
+        has_header = True
+    return delimiter, has_header
+
+
+def infer_dtypes(path, delimiter, has_header, sample_rows=SAMPLE_ROWS):
+    """
+    Column types of the first sample_rows rows. Integer columns are read as floats,
+    so that a missing value further down does not invalidate the guess.
+    :return: ordered dict of column name to dtype, or to None for text columns
+    """
+    sample = pd.read_csv(path, sep=delimiter, header=0 if has_header else None, nrows=sample_rows)
+    dtypes = OrderedDict()
+    for name, dtype in sample.dtypes.items():
+        if dtype.kind in "iuf":
+            dtypes[name] = np.dtype(np.float64)
+        elif dtype.kind == "b":
+            dtypes[name] = np.dtype(bool)
+        else:
+            dtypes[name] = None
+    return dtypes
+
+
+def _encode_text(values):
+    """
+    :param values: 1-D array of a chunk of a text column
+    :return: codes, -1 for missing values, and the distinct values as strings
+    """
+    values = pd.Series(values, dtype=object, copy=False)
+    if pd.api.types.infer_dtype(values, skipna=True) != "string":
+        # numbers among the text, or numbers the sample did not predict
+        values = values.map(str, na_action="ignore")
+    codes, uniques = pd.factorize(values)
+    return codes, np.asarray(uniques, dtype=object)
+
+
+def _code_dtype(n):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _column_array(parts):
+    """
+    :param parts: arrays, or (codes, distinct values) of text chunks, see _encode_text
+    :return: the whole column; a pandas Categorical if any part is text
+    """
+    if not any(isinstance(p, tuple) for p in parts):
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+    parts = [p if isinstance(p, tuple) else _encode_text(p) for p in parts]
+    # codes of the distinct values of every chunk in those of the whole column
+    merged, categories = pd.factorize(np.concatenate([uniques for _, uniques in parts]))
+    dtype = _code_dtype(len(categories))
+    columns, start = [], 0
+    for codes, uniques in parts:
+        # -1 stays -1, through the last entry
+        remap = np.append(merged[start:start + len(uniques)], -1).astype(dtype)
+        columns.append(remap[codes])
+        start += len(uniques)
+    codes = np.concatenate(columns) if len(columns) > 1 else columns[0]
+    return pd.Categorical.from_codes(codes, categories=pd.Index(categories, dtype=object))
+
+
+def _read_chunks(path, delimiter, has_header, dtypes, chunk_rows, progress):
+    parts = OrderedDict()
+    size = max(1, os.path.getsize(path))
+    with open(path, "rb") as f:
+        reader = pd.read_csv(f, sep=delimiter, header=0 if has_header else None,
+                             dtype=dtypes, chunksize=chunk_rows)
+        for chunk in reader:
+            for name in chunk.columns:
+                values = chunk[name].to_numpy()
+                # text is encoded chunk by chunk, so its strings are never all held at once
+                parts.setdefault(name, []).append(_encode_text(values) if values.dtype.hasobject else values)
+            if progress is not None:
+                progress(min(1., f.tell() / float(size)))
+    return OrderedDict((str(name), _column_array(p)) for name, p in parts.items())
+
+
+def read_table(path, chunk_rows=CHUNK_ROWS, progress=None):
+    """
+    Parses a delimited text file into columns.
+    :param path:
+    :param chunk_rows: rows parsed at a time
+    :param progress: optional callable taking the fraction of the file read
+    :return: ordered dict of column name to 1-D array, or to pandas Categorical for text
+    """
+    delimiter, has_header = sniff(path)
+    dtypes = infer_dtypes(path, delimiter, has_header)
+    numeric = {name: dtype for name, dtype in dtypes.items() if dtype is not None}
+    try:
+        return _read_chunks(path, delimiter, has_header, numeric, chunk_rows, progress)
+    except (ValueError, TypeError):
+        # rows beyond the sample do not fit its types; let every chunk find its own
+        return _read_chunks(path, delimiter, has_header, None, chunk_rows, progress)
+
+
+def sidecar_path(path):
+    """
+    :param path: the table
+    :return: directory of its binary sidecar, hidden next to it
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, ".{}.columns".format(name))
+
+
+def _source_stamp(path):
+    st = os.stat(path)
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "version": SIDECAR_VERSION}
+
+
+def read_sidecar(path):
+    """
+    :param path: the table
+    :return: ordered dict of column name to read-only memory mapped array, or None
+             if there is no sidecar or the table changed since it was written
+    """
+    directory = sidecar_path(path)
+    try:
+        with open(os.path.join(directory, "index.json")) as f:
+            index = json.load(f)
+        if index["source"] != _source_stamp(path):
+            return None
+        columns = OrderedDict()
+        for c in index["columns"]:
+            column = np.load(os.path.join(directory, c["file"]), mmap_mode="r")
+            if "text" in c:
+                text = np.load(os.path.join(directory, c["text"]), mmap_mode="r")
+                offsets = np.load(os.path.join(directory, c["offsets"]))
+                categories = [bytes(text[offsets[i]:offsets[i + 1]]).decode("utf-8")
+                              for i in range(len(offsets) - 1)]
+                column = pd.Categorical.from_codes(column, categories=pd.Index(categories, dtype=object))
+            columns[c["name"]] = column
+        return columns
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_sidecar(path, columns):
+    """
+    Stores parsed columns next to the table. The sidecar is assembled in a temporary
+    directory and moved into place, so readers never see half of one.
+    :param path: the table
+    :param columns: as returned by read_table
+    :return:
+    """
+    directory = sidecar_path(path)
+    tmp = "{}.{}.tmp".format(directory, os.getpid())
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    index = {"source": _source_stamp(path), "columns": []}
+    for i, (name, column) in enumerate(columns.items()):
+        entry = {"name": name, "file": "{}.npy".format(i)}
+        if isinstance(column, pd.Categorical):
+            encoded = [str(value).encode("utf-8") for value in column.categories]
+            entry["text"], entry["offsets"] = "{}.text.npy".format(i), "{}.offsets.npy".format(i)
+            np.save(os.path.join(tmp, entry["text"]), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+            np.save(os.path.join(tmp, entry["offsets"]), np.cumsum([0] + [len(b) for b in encoded]))
+            column = column.codes
+        np.save(os.path.join(tmp, entry["file"]), column)
+        index["columns"].append(entry)
+    with open(os.path.join(tmp, "index.json"), "w") as f:
+        json.dump(index, f)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+
+
+def load_table(path, sidecar=True, chunk_rows=CHUNK_ROWS, progress=None):
+    """
+    Columns of a table, from its sidecar if that is current, parsed otherwise.
+    :param path:
+    :param sidecar: whether to use and write the sidecar
+    :param chunk_rows:
+    :param progress:
+    :return: see read_table
+    """
+    if sidecar:
+        columns = read_sidecar(path)
+        if columns is not None:
+            return columns
+    columns = read_table(path, chunk_rows, progress)
+    if sidecar:
+        try:
+            write_sidecar(path, columns)
+        except OSError as e:
+            print("Could not write the sidecar of {}: {}".format(path, e))
+        else:
+            # the mapped copy is what later opens see, and it costs no memory
+            return read_sidecar(path) or columns
+    return columns
@@ -0,0 +1,129 @@
+"""
+Transforms of resource data by user code.
+
+The code is compiled once and evaluated directly against the NumPy buffer of each
+resource, with the buffer bound to _data. A single expression is evaluated for its
+value; a block of statements has to assign its result to _data. Transforms can write
+their result back into the buffer they read, and can run over consecutive blocks of
+rows, which bounds the memory used for memory mapped inputs as long as every row of
+the result depends only on the same row of the input.
+
+pandas objects are transformed through their values, and results with the same rows
+get their index, and columns if their number matches, back. They are never written
+in place: their values may be a copy, and are shared copy-on-write otherwise.
+"""
+import numpy as np
+import pandas as pd
+
+DATA_NAME = "_data"
+
+
+class TransformError(Exception):
+    pass
+
+
+class Transform(object):
+    """
+    User code compiled once, applicable to any number of arrays.
+    """
+
+    def __init__(self, source, namespace=None):
+        """
+        :param source: plain Python; translate IPython syntax beforehand
+        :param namespace: globals the code sees besides _data, e.g. the console namespace
+        """
+        self.source = source
+        self.namespace = dict(namespace or {})
+        self.namespace.setdefault("np", np)
+        try:
+            self.code = compile(source, "<transform>", "eval")
+            self.is_expression = True
+        except SyntaxError:
+            self.code = compile(source, "<transform>", "exec")
+            self.is_expression = False
+
+    def __call__(self, data):
+        # a fresh copy per call, so that names assigned by the code do not leak between calls
+        scope = dict(self.namespace)
+        scope[DATA_NAME] = data
+        if self.is_expression:
+            return eval(self.code, scope)
+        exec(self.code, scope)
+        return scope[DATA_NAME]
+
+
+def can_write(data):
+    """
+    :param data:
+    :return: whether a transform can write its result into the buffer of data
+    """
+    return isinstance(data, np.ndarray) and data.flags.writeable
+
+
+def relabel(original, result):
+    """
+    Gives a result computed from the values of a pandas object the index of the
+    object, and its columns if there are as many.
+    :param original: Series or DataFrame
+    :param result: array
+    :return: Series or DataFrame, or result itself if its rows do not match
+    """
+    if result.ndim == 0 or result.ndim > 2 or len(result) != len(original):
+        return result
+    if result.ndim == 1:
+        name = original.name if isinstance(original, pd.Series) else None
+        return pd.Series(result, index=original.index, name=name)
+    columns = original.columns if isinstance(original, pd.DataFrame) else [original.name]
+    if len(columns) != result.shape[1]:
+        columns = None
+    return pd.DataFrame(result, index=original.index, columns=columns).infer_objects()
+
+
+def apply_transform(transform, data, in_place=False, chunk_size=None, progress=None):
+    """
+    Applies a transform to an array.
+    :param transform: a Transform
+    :param data: array-like; the code sees the values of pandas objects, see relabel
+    :param in_place: write the result into the buffer of data, which must be a
+        writable ndarray (see can_write)
+    :param chunk_size: rows per evaluation, or None to transform everything at once
+    :param progress: optional callable taking the fraction done
+    :return: the result, which is the buffer of data itself when in_place
+    """
+    if isinstance(data, (pd.Series, pd.DataFrame)):
+        if in_place:
+            raise TransformError("Cannot transform pandas data in place.")
+        return relabel(data, apply_transform(transform, data.to_numpy(), False, chunk_size, progress))
+    buffer = np.asanyarray(data)
+    if in_place and not buffer.flags.writeable:
+        raise TransformError("Cannot transform read-only data in place.")
+    if chunk_size is None or buffer.ndim == 0 or len(buffer) <= chunk_size:
+        result = np.asanyarray(transform(buffer))
+        if in_place:
+            _write_back(buffer, result)
+            result = buffer
+        if progress is not None:
+            progress(1.)
+        return result
+
+    n = len(buffer)
+    out = buffer if in_place else None
+    for start in range(0, n, chunk_size):
+        stop = min(n, start + chunk_size)
+        part = np.asanyarray(transform(buffer[start:stop]))
+        if part.ndim == 0 or len(part) != stop - start:
+            raise TransformError("A chunked transform must return one row per input row.")
+        if out is None:
+            out = np.empty((n,) + part.shape[1:], dtype=part.dtype)
+        _write_back(out[start:stop], part)
+        if progress is not None:
+            progress(stop / float(n))
+    return out
+
+
+def _write_back(target, result):
+    try:
+        np.copyto(target, result, casting="same_kind")
+    except (TypeError, ValueError) as e:
+        raise TransformError("Cannot store the result in the {} {} buffer: {}".format(
+            target.shape, target.dtype, e))
@@ -1,4 +1,35 @@
+import time
+
+
 def sanitize_alias(alias):
     return alias.replace(" ", "_") \
         .replace("-", "_") \
         .replace(".", "_")
+
+
+class StartupProfile(object):
+    """
+    Wall clock time spent in the phases of application startup. Each mark() closes
+    the phase that began with the previous mark (or with the creation of the profile).
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.started = self.last = time.perf_counter()
+        self.phases = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def total(self):
+        return self.last - self.started
+
+    def report(self):
+        if not self.enabled:
+            return
+        print("Startup profile:")
+        for name, seconds in self.phases:
+            print("  {:<28}{:>9.1f} ms".format(name, seconds * 1000))
+        print("  {:<28}{:>9.1f} ms".format("total", self.total() * 1000))
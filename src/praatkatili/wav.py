@@ -0,0 +1,142 @@
+"""
+Minimal RIFF/WAVE reader that maps the sample data straight from disk.
+
+Only the header is parsed in Python; the samples are exposed as a read-only
+numpy.memmap in the file's native dtype, so opening a multi-gigabyte recording
+costs next to nothing until a slice of it is actually touched.
+"""
+import logging
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+WAVHeader = namedtuple("WAVHeader", ["sample_rate", "channels", "bits_per_sample",
+                                     "dtype", "data_offset", "n_frames"])
+
+
+class WAVFormatError(Exception):
+    """
+    Raised for files that are not WAVE files, or whose sample format cannot be
+    mapped to a numpy dtype (compressed formats, 24 bit PCM and such).
+    """
+    pass
+
+
+def _sample_dtype(format_tag, bits):
+    if format_tag == WAVE_FORMAT_PCM:
+        if bits == 8:
+            return np.dtype(np.uint8)
+        if bits in (16, 32):
+            return np.dtype("<i{}".format(bits // 8))
+    elif format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        if bits in (32, 64):
+            return np.dtype("<f{}".format(bits // 8))
+    raise WAVFormatError("Cannot memory map {} bit samples of format 0x{:04x}".format(bits, format_tag))
+
+
+def read_wav_header(path):
+    """
+    Walks the RIFF chunks of a WAVE (or RF64) file up to the data chunk.
+    :param path:
+    :return: a WAVHeader
+    """
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        file_size = f.tell()
+        f.seek(0)
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff not in (b"RIFF", b"RF64") or wave != b"WAVE":
+            raise WAVFormatError("Not a RIFF/WAVE file: {}".format(path))
+
+        fmt = None
+        ds64_data_size = None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise WAVFormatError("No data chunk in {}".format(path))
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+            chunk_start = f.tell()
+            if chunk_id == b"ds64":
+                _, ds64_data_size = struct.unpack("<QQ", f.read(16))
+            elif chunk_id == b"fmt ":
+                body = f.read(chunk_size)
+                format_tag, channels, sample_rate, _, block_align, bits = struct.unpack("<HHIIHH", body[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    # the first two bytes of the sub format GUID hold the actual format tag
+                    format_tag = struct.unpack("<H", body[24:26])[0]
+                fmt = format_tag, channels, sample_rate, block_align, bits
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise WAVFormatError("Data chunk precedes fmt chunk in {}".format(path))
+                format_tag, channels, sample_rate, block_align, bits = fmt
+                dtype = _sample_dtype(format_tag, bits)
+                if block_align != channels * dtype.itemsize:
+                    raise WAVFormatError("Unsupported block alignment {} in {}".format(block_align, path))
+                if chunk_size == 0xFFFFFFFF and ds64_data_size is not None:
+                    chunk_size = ds64_data_size
+                # recordings cut short by a crash often claim more data than they hold
+                chunk_size = min(chunk_size, file_size - chunk_start)
+                return WAVHeader(sample_rate=sample_rate,
+                                 channels=channels,
+                                 bits_per_sample=bits,
+                                 dtype=dtype,
+                                 data_offset=chunk_start,
+                                 n_frames=chunk_size // block_align)
+            # chunks are word aligned
+            f.seek(chunk_start + chunk_size + (chunk_size & 1))
+
+
+def memmap_wav(path):
+    """
+    Maps the samples of a WAV file without reading them. Mono files give a 1-D
+    array, everything else is (frames x channels), as in audioBasicIO.readAudioFile.
+    :param path:
+    :return: sample rate, read-only numpy.memmap in the native sample dtype
+    """
+    header = read_wav_header(path)
+    if header.channels == 1:
+        shape = (header.n_frames,)
+    else:
+        shape = (header.n_frames, header.channels)
+    if header.n_frames == 0:
+        # mmap refuses empty mappings
+        return header.sample_rate, np.zeros(shape, dtype=header.dtype)
+    data = np.memmap(path, dtype=header.dtype, mode="r",
+                     offset=header.data_offset, shape=shape)
+    return header.sample_rate, data
+
+
+def load_wav(path, memmap=True):
+    """
+    Opens a WAV file the way WAVFile does: memory mapped if the format allows,
+    otherwise decoded by pyAudioAnalysis.
+    :param path:
+    :param memmap: False to always decode
+    :return: sample rate, samples; a numpy.memmap unless the file had to be decoded
+    """
+    if memmap:
+        try:
+            return memmap_wav(path)
+        except WAVFormatError as e:
+            logger.info("Falling back to decoding %s: %s", path, e)
+    from pyAudioAnalysis import audioBasicIO
+    return audioBasicIO.readAudioFile(path)
+
+
+def to_float(data, start=None, stop=None):
+    """
+    Converts a slice of (possibly memory mapped) samples to float64. Only the
+    slice is read and copied.
+    :param data:
+    :param start:
+    :param stop:
+    :return:
+    """
+    return np.asarray(data[start:stop], dtype=np.float64)
@@ -0,0 +1,160 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+QtCore = pytest.importorskip("PyQt5.QtCore")
+
+from praatkatili.autosave import SessionAutosave
+from praatkatili.resources import Array, freeze
+from praatkatili.session import MANIFEST, SessionStore
+
+
+class Settings(object):
+    def setValue(self, key, value):
+        pass
+
+    def remove(self, key):
+        pass
+
+
+class Canvas(object):
+    def __init__(self):
+        self.revision = 0
+        self.zoom = [100, 100]
+        self.described = 0
+
+    def view_state(self):
+        return {"zoom": list(self.zoom), "shift": [0, 0]}
+
+    def to_dict(self, resources=None):
+        self.described += 1
+        d = {"title": "Plot", "series": [{"kind": "line", "x": None, "y": np.arange(10.)}]}
+        d.update(self.view_state())
+        return d
+
+
+class Dock(object):
+    tab_group = 0
+
+    def __init__(self):
+        self.canvas = Canvas()
+
+
+class MainWindow(QtCore.QObject):
+    def __init__(self, resources, plots):
+        super(MainWindow, self).__init__()
+        self.resources = resources
+        self.plots = plots
+        self.settings = Settings()
+
+    def saveGeometry(self):
+        return QtCore.QByteArray()
+
+    def saveState(self):
+        return QtCore.QByteArray()
+
+
+class CountingArray(Array):
+    def snapshot(self):
+        self.saved = getattr(self, "saved", 0) + 1
+        return super(CountingArray, self).snapshot()
+
+
+@pytest.fixture
+def session(tmpdir):
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    # analysis results are read-only
+    resources = [CountingArray("a", freeze(np.arange(100.))), CountingArray("b", freeze(np.ones((50, 2))))]
+    window = MainWindow(resources, [Dock()])
+    autosave = SessionAutosave(window, 0, SessionStore(str(tmpdir)))
+    yield autosave, resources, window.plots[0].canvas, str(tmpdir)
+    autosave._executor.shutdown()
+    window.deleteLater()
+    del app
+
+
+def manifest(directory):
+    with open(os.path.join(directory, MANIFEST)) as f:
+        return json.load(f)
+
+
+def test_only_changed_entries_are_saved(session):
+    autosave, (a, b), canvas, directory = session
+    autosave.flush()
+    assert (a.saved, b.saved, canvas.described) == (1, 1, 1)
+
+    # nothing changed, so nothing is written
+    mtime = os.path.getmtime(os.path.join(directory, MANIFEST))
+    autosave.flush()
+    assert (a.saved, b.saved, canvas.described) == (1, 1, 1)
+    assert os.path.getmtime(os.path.join(directory, MANIFEST)) == mtime
+
+    # a console command replaced the data of a, and left b alone
+    a.data = freeze(a.data * 2)
+    autosave.mark()
+    autosave.flush()
+    assert (a.saved, b.saved, canvas.described) == (2, 1, 1)
+    stored = SessionStore(directory)
+    entry = manifest(directory)["resources"][0]
+    np.testing.assert_array_equal(stored.read_data(entry["data"]), np.arange(100.) * 2)
+
+    # a transform marks its resource
+    autosave.mark([b])
+    autosave.flush()
+    assert (a.saved, b.saved) == (2, 2)
+
+
+def test_view_changes_keep_the_plot_data(session):
+    autosave, (a, b), canvas, directory = session
+    autosave.flush()
+    series = manifest(directory)["plots"][0]["plot"]["series"]
+
+    canvas.zoom = [150, 100]
+    autosave.flush()
+    assert canvas.described == 1
+    plot = manifest(directory)["plots"][0]["plot"]
+    assert plot["zoom"] == [150, 100]
+    assert plot["series"] == series
+
+    canvas.revision += 1
+    autosave.flush()
+    assert canvas.described == 2
+
+
+def test_snapshot_is_not_affected_by_later_changes():
+    data = np.arange(10.)
+    copy = Array("a", data).snapshot()
+    data[0] = 100.
+    assert copy.data[0] == 0.
+    frame = pd.DataFrame({"x": np.arange(10.)})
+    copy = Array("f", frame).snapshot()
+    frame.iloc[0, 0] = 100.
+    assert copy.data.iloc[0, 0] == 0.
+    # analysis results, and payloads mapped from the session store, are taken as they are
+    freeze(data)
+    assert Array("a", data).snapshot().data is data
+
+
+def test_in_place_edits_are_saved(session):
+    autosave, (a, b), canvas, directory = session
+    a.data = np.arange(10000.)
+    autosave.flush()
+    saved = a.saved
+
+    # edits of the whole buffer show in its fingerprint
+    a.data *= 2
+    autosave.mark()
+    assert autosave._snapshot()[1][0][1] is not None
+    # one element between the sampled rows does not, until the session closes
+    a.data[1] = -1.
+    autosave.mark()
+    assert autosave._snapshot() is None
+    autosave.flush()
+    assert a.saved == saved + 2
+    entry = manifest(directory)["resources"][0]
+    assert SessionStore(directory).read_data(entry["data"])[1] == -1.
+    # read-only b is not saved again
+    assert b.saved == 1
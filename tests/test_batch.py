@@ -0,0 +1,47 @@
+import os
+import wave
+
+import numpy as np
+
+from praatkatili import batch
+
+
+def write_wav(path, seconds=.5, Fs=16000):
+    t = np.arange(int(seconds * Fs)) / float(Fs)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(Fs)
+        f.writeframes((8000 * np.sin(2 * np.pi * 150 * t)).astype("<i2").tobytes())
+
+
+def test_rerun_with_other_parameters_redoes_files(tmp_path, capsys):
+    inputs, outputs = tmp_path / "in", tmp_path / "out"
+    inputs.mkdir()
+    paths = [str(inputs / "a.wav"), str(inputs / "b.wav")]
+    for path in paths:
+        write_wav(path)
+    out = batch.output_path(paths[0], str(inputs), str(outputs), "npy")
+
+    assert batch.run(paths, str(outputs), .05, .05, workers=1) == []
+    assert np.load(out).shape[0] == 10
+    assert "2 files, 0 already done." in capsys.readouterr().out
+
+    assert batch.run(paths, str(outputs), .05, .05, workers=1) == []
+    assert "2 files, 2 already done." in capsys.readouterr().out
+
+    assert batch.run(paths, str(outputs), .05, .025, workers=1) == []
+    assert "2 files, 0 already done." in capsys.readouterr().out
+    assert np.load(out).shape[0] == 19
+
+
+def test_output_without_parameters_is_redone(tmp_path):
+    path = str(tmp_path / "a.wav")
+    write_wav(path)
+    out = str(tmp_path / "a.stf.npy")
+    batch.process_file(path, out, .05, .05, "npy")
+    params = batch.analysis_params("features", .05, .05)
+    assert batch.is_done(path, out, params)
+    assert not batch.is_done(path, out, batch.analysis_params("pitch", None, .05))
+    os.remove(batch.params_path(out))
+    assert not batch.is_done(path, out, params)
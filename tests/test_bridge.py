@@ -0,0 +1,105 @@
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from praatkatili.bridge import Bridge, BridgeError, attach
+
+ATTACH = """
+import sys
+import numpy as np
+from praatkatili.bridge import attach
+data = attach(sys.argv[1], sys.argv[2], timeout=20)
+if isinstance(data, np.ndarray):
+    print(repr(float(data.sum())), data.flags.writeable)
+else:
+    print(repr(float(data.values.sum())))
+"""
+
+
+class Resource(object):
+    def __init__(self, alias, data, sample_rate=None):
+        self.alias = alias
+        self.data = data
+        self.sample_rate = sample_rate
+        self.labels = None
+
+
+class Unloadable(Resource):
+    @property
+    def data(self):
+        raise OSError("gone")
+
+    @data.setter
+    def data(self, value):
+        pass
+
+
+@pytest.fixture
+def bridge():
+    bridge = Bridge()
+    yield bridge
+    bridge.close()
+
+
+def run_attach(bridge, alias):
+    """
+    Attaches alias in another process, serving its request meanwhile.
+    :return: what the process printed
+    """
+    package_root = os.path.join(os.path.dirname(__file__), "..", "src")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package_root, os.environ.get("PYTHONPATH")])))
+    process = subprocess.Popen([sys.executable, "-c", ATTACH, alias, bridge.directory],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    while process.poll() is None:
+        bridge.serve_requests()
+        time.sleep(.02)
+    out, err = process.communicate()
+    assert process.returncode == 0, err.decode()
+    return out.decode().split()
+
+
+def test_offered_resources_are_published_on_attach(bridge):
+    data = np.arange(1000.)
+    bridge.offer([Resource("signal", data, 16000), Resource("table", pd.DataFrame({"a": [1., 2.], "b": [3., 4.]}))])
+    # nothing is copied until a kernel asks
+    assert bridge._blocks == {}
+    assert all("data" not in e for e in bridge.entries.values())
+
+    assert run_attach(bridge, "signal") == [repr(float(data.sum())), "False"]
+    assert list(bridge._blocks) == ["signal"]
+    assert run_attach(bridge, "table") == [repr(10.)]
+
+    # a changed resource is published again on the next attach
+    data[:] = 1
+    bridge.offer([Resource("signal", data, 16000)])
+    assert "signal" not in bridge._blocks
+    assert run_attach(bridge, "signal") == [repr(1000.), "False"]
+
+
+def test_publishing_errors_reach_the_kernel(bridge):
+    bridge.offer([Unloadable("missing", None)])
+    # attach fails in the kernel with the error instead of waiting for the timeout
+    started = time.time()
+    with pytest.raises(AssertionError, match="Cannot publish missing: gone"):
+        run_attach(bridge, "missing")
+    assert time.time() - started < 10
+
+
+def test_unknown_alias(bridge):
+    with pytest.raises(KeyError):
+        attach("nothing", bridge.directory)
+    bridge.offer([Resource("signal", np.zeros(3))])
+    bridge.unpublish("signal")
+    with pytest.raises(KeyError):
+        attach("signal", bridge.directory)
+
+
+def test_timeout_without_main_window(bridge):
+    bridge.offer([Resource("signal", np.zeros(3))])
+    with pytest.raises(BridgeError, match="did not publish"):
+        attach("signal", bridge.directory, timeout=.2)
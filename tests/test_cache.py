@@ -0,0 +1,86 @@
+import os
+import wave
+
+import numpy as np
+
+from praatkatili.cache import FeatureCache, cached_short_term_feature_matrix, source_key
+from praatkatili.features import short_term_feature_matrix
+from praatkatili.wav import memmap_wav
+
+
+def write_wav(path, samples, Fs):
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(Fs)
+        f.writeframes(samples.astype("<i2").tobytes())
+
+
+def test_modified_signal_is_keyed_on_content(tmp_path):
+    Fs = 16000
+    samples = (8000 * np.sin(np.arange(Fs) * .05)).astype(np.int16)
+    path = str(tmp_path / "tone.wav")
+    write_wav(path, samples, Fs)
+    _, mapped = memmap_wav(path)
+    assert source_key(mapped, path).startswith("file:")
+    # a transformed copy, or a view, of the file's samples is not the file
+    assert source_key(mapped * 2, path).startswith("data:")
+    assert source_key(mapped[::2], path).startswith("data:")
+
+    cache = FeatureCache(str(tmp_path / "cache"))
+    original = cached_short_term_feature_matrix(cache, mapped, Fs, 800, 400, path)
+    modified = np.array(mapped)
+    modified[:Fs // 2] = 0
+    np.testing.assert_array_equal(cached_short_term_feature_matrix(cache, modified, Fs, 800, 400, path),
+                                  short_term_feature_matrix(modified, Fs, 800, 400))
+    assert not np.array_equal(original[:10], short_term_feature_matrix(modified, Fs, 800, 400)[:10])
+
+
+def tone_file(tmp_path, Fs=16000):
+    samples = (8000 * np.sin(np.arange(Fs) * .05)).astype(np.int16)
+    path = str(tmp_path / "tone.wav")
+    write_wav(path, samples, Fs)
+    return path
+
+
+def test_hit_returns_the_stored_matrix(tmp_path):
+    path = tone_file(tmp_path)
+    Fs, mapped = memmap_wav(path)
+    cache = FeatureCache(str(tmp_path / "cache"))
+    first = cached_short_term_feature_matrix(cache, mapped, Fs, 800, 400, path)
+    (entry,) = [p for _, _, p in cache.entries()]
+    # tamper with the entry; a hit must return it instead of computing again
+    np.save(entry, first + 1)
+    np.testing.assert_array_equal(cached_short_term_feature_matrix(cache, mapped, Fs, 800, 400, path), first + 1)
+    # other parameters are another entry
+    cached_short_term_feature_matrix(cache, mapped, Fs, 800, 200, path)
+    assert len(cache.entries()) == 2
+
+
+def test_file_change_invalidates(tmp_path):
+    path = tone_file(tmp_path)
+    Fs, mapped = memmap_wav(path)
+    cache = FeatureCache(str(tmp_path / "cache"))
+    cached_short_term_feature_matrix(cache, mapped, Fs, 800, 400, path)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    Fs, mapped = memmap_wav(path)
+    cached_short_term_feature_matrix(cache, mapped, Fs, 800, 400, path)
+    assert len(cache.entries()) == 2
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    matrix = np.zeros((100, 34))
+    cache = FeatureCache(str(tmp_path / "cache"))
+    for i, key in enumerate("abc"):
+        cache.put(key, matrix)
+        # distinct mtimes, a before b before c
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    entry_size = os.path.getsize(cache._path("a"))
+    # a hit makes a the most recently used
+    assert cache.get("a") is not None
+    cache.max_bytes = 3 * entry_size
+    cache.put("d", matrix)
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in "acd")
+    assert cache.size() <= cache.max_bytes
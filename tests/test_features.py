@@ -0,0 +1,73 @@
+"""
+Parity of the vectorized short term features with pyAudioAnalysis'
+stFeatureExtraction, which computes them one frame at a time; the parity tests are
+skipped without it.
+"""
+import numpy as np
+import pytest
+
+from praatkatili.features import N_FEATURES, count_frames, iter_short_term_features, short_term_feature_matrix
+
+# largest absolute difference allowed; the two differ by float rounding only
+TOLERANCE = 1e-8
+
+
+def make_signal(seconds, Fs, seed=0):
+    """
+    A tone with a glide and noise, as 16 bit samples.
+    """
+    rng = np.random.RandomState(seed)
+    t = np.arange(int(seconds * Fs)) / float(Fs)
+    tone = np.sin(2 * np.pi * (220. + 80. * t) * t) + .5 * np.sin(2 * np.pi * 1375. * t)
+    samples = 8000. * tone + 1000. * rng.randn(len(t))
+    return samples.astype(np.int16)
+
+
+def reference(signal, Fs, win, step):
+    # only the parity tests need pyAudioAnalysis
+    audioFeatureExtraction = pytest.importorskip("pyAudioAnalysis.audioFeatureExtraction")
+    return audioFeatureExtraction.stFeatureExtraction(signal, Fs, win, step).T
+
+
+@pytest.mark.parametrize("Fs, win, step", [
+    (8000, 200, 80),
+    (16000, 800, 400),
+    (16000, 512, 512),
+    (22050, 1102, 441),
+    (44100, 2205, 1102),
+])
+def test_matrix_matches_reference(Fs, win, step):
+    signal = make_signal(.5, Fs)
+    expected = reference(signal, Fs, win, step)
+    actual = short_term_feature_matrix(signal, Fs, win, step)
+    assert actual.shape == expected.shape == (count_frames(len(signal), win, step), N_FEATURES)
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=TOLERANCE)
+
+
+@pytest.mark.parametrize("chunk_size", [None, 800, 801, 1999, 4000, 10 ** 6])
+def test_chunks_match_reference(chunk_size):
+    Fs, win, step = 16000, 800, 300
+    signal = make_signal(.4, Fs, seed=1)
+    expected = reference(signal, Fs, win, step)
+    blocks = list(iter_short_term_features(signal, Fs, win, step, chunk_size))
+    if chunk_size is not None and chunk_size < len(signal) // 2:
+        # the chunk boundaries actually fall inside the signal
+        assert len(blocks) > 1
+    actual = np.vstack(blocks)
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=TOLERANCE)
+    np.testing.assert_allclose(short_term_feature_matrix(signal, Fs, win, step, chunk_size), actual,
+                               rtol=0, atol=0)
+
+
+def test_memmapped_signal(tmp_path):
+    Fs, win, step = 16000, 400, 160
+    signal = make_signal(.3, Fs, seed=2)
+    path = str(tmp_path / "samples.raw")
+    signal.tofile(path)
+    mapped = np.memmap(path, dtype=np.int16, mode="r")
+    np.testing.assert_allclose(short_term_feature_matrix(mapped, Fs, win, step, chunk_size=1000),
+                               reference(signal, Fs, win, step), rtol=0, atol=TOLERANCE)
+
+
+def test_too_short_signal():
+    assert short_term_feature_matrix(np.zeros(10, dtype=np.int16), 16000, 400, 160).shape == (0, N_FEATURES)
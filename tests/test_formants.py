@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from praatkatili.formants import formant_labels, formant_track, levinson, polynomial_roots
+
+
+def resonate(x, freq, bandwidth, Fs):
+    """
+    Two-pole resonator, y[n] = x[n] + a1 y[n-1] + a2 y[n-2].
+    """
+    r = np.exp(-np.pi * bandwidth / Fs)
+    a1, a2 = 2 * r * np.cos(2 * np.pi * freq / Fs), -r * r
+    y = np.zeros(len(x))
+    for n in range(len(x)):
+        y[n] = x[n] + a1 * y[n - 1] * (n > 0) + a2 * y[n - 2] * (n > 1)
+    return y
+
+
+def vowel(formants, seconds, Fs, f0=120., bandwidths=(80., 90., 120.)):
+    """
+    Impulse train at f0 through a cascade of resonators. The train first goes
+    through a one-pole low-pass at 50 Hz, the -6 dB per octave of voiced speech
+    that the tracker's pre-emphasis undoes; without it F1 comes out too high.
+    """
+    pulses = np.zeros(int(seconds * Fs))
+    pulses[::int(round(Fs / f0))] = 1.
+    tilt = np.exp(-2 * np.pi * 50. / Fs)
+    source = np.zeros(len(pulses))
+    for n in range(len(pulses)):
+        source[n] = pulses[n] + tilt * source[n - 1] * (n > 0)
+    for freq, bandwidth in zip(formants, bandwidths):
+        source = resonate(source, freq, bandwidth, Fs)
+    return (8000 * source / np.abs(source).max()).astype(np.int16)
+
+
+@pytest.mark.parametrize("formants, Fs", [((700., 1220., 2600.), 16000),
+                                          ((300., 2300., 3000.), 16000),
+                                          ((500., 1500., 2500.), 22050)])
+def test_formants_of_a_vowel(formants, Fs):
+    track = formant_track(vowel(formants, .5, Fs), Fs, .025 * Fs, .01 * Fs)
+    assert list(track.columns) == formant_labels(3)
+    # frames away from the onset
+    middle = track.iloc[3:-1]
+    for i, expected in enumerate(formants):
+        measured = middle["F{}".format(i + 1)]
+        # an occasional frame may lose a formant to a spurious pole, as in Praat
+        assert measured.notna().mean() > .9
+        assert abs(measured.median() - expected) < .05 * expected
+        assert (middle["B{}".format(i + 1)].dropna() > 0).all()
+
+
+def test_silence_has_no_formants():
+    track = formant_track(np.zeros(8000, dtype=np.int16), 16000, 400, 160)
+    assert track.isna().all().all()
+
+
+def test_levinson_recovers_the_polynomial():
+    # autocorrelation of an AR(2) process with poles at .9 * exp(+-i pi / 4)
+    pole = .9 * np.exp(1j * np.pi / 4)
+    a = np.real(np.poly([pole, np.conj(pole)]))
+    rng = np.random.RandomState(0)
+    noise = rng.randn(200000)
+    x = np.zeros(len(noise))
+    for n in range(2, len(x)):
+        x[n] = noise[n] - a[1] * x[n - 1] - a[2] * x[n - 2]
+    r = np.array([[np.dot(x[:len(x) - k], x[k:]) for k in range(3)]])
+    np.testing.assert_allclose(levinson(r, 2)[0], a, atol=.01)
+    roots = np.sort_complex(polynomial_roots(levinson(r, 2))[0])
+    np.testing.assert_allclose(roots, np.sort_complex([np.conj(pole), pole]), atol=.01)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from praatkatili.pitch import PITCH_LABELS, fft_size, pitch_track
+
+
+def harmonic_tone(f0, seconds, Fs, harmonics=5):
+    t = np.arange(int(seconds * Fs)) / float(Fs)
+    tone = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, harmonics + 1))
+    return (8000 * tone / np.abs(tone).max()).astype(np.int16)
+
+
+@pytest.mark.parametrize("f0, Fs", [(100., 16000), (220., 16000), (330., 44100), (150., 8000)])
+def test_f0_of_a_tone(f0, Fs):
+    track = pitch_track(harmonic_tone(f0, .5, Fs), Fs, .01 * Fs)
+    assert list(track.columns) == PITCH_LABELS
+    assert track.index.name == "Time (s)"
+    assert track["F0"].notna().all()
+    np.testing.assert_allclose(track["F0"], f0, rtol=.01)
+    assert (track["Voicing"] > .9).all()
+
+
+def test_chunks_do_not_change_the_track():
+    Fs = 16000
+    signal = harmonic_tone(180., 1., Fs)
+    whole = pitch_track(signal, Fs, 160)
+    chunked = pitch_track(signal, Fs, 160, chunk_size=3000)
+    np.testing.assert_allclose(chunked.values, whole.values, atol=1e-6)
+
+
+def test_silence_and_noise_are_unvoiced():
+    Fs = 16000
+    rng = np.random.RandomState(0)
+    signal = np.concatenate((np.zeros(Fs // 2), 3000 * rng.randn(Fs // 2), harmonic_tone(200., .5, Fs)))
+    track = pitch_track(signal.astype(np.int16), Fs, 160)
+    times = track.index.values
+    assert track["F0"][times < .45].isna().all()
+    assert track["F0"][(times > .55) & (times < .95)].isna().mean() > .9
+    np.testing.assert_allclose(track["F0"][times > 1.05], 200., rtol=.01)
+
+
+def test_fft_size_is_smooth():
+    for n in (1, 7, 97, 641, 1283, 4097):
+        size = fft_size(n)
+        assert size >= n
+        m = size
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        assert m == 1
+        assert size <= 1 << int(np.ceil(np.log2(n)))
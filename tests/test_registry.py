@@ -0,0 +1,27 @@
+from praatkatili.registry import ResourceRegistry
+
+
+class Resource(object):
+    def __init__(self, alias, path=None):
+        self.alias = alias
+        if path is not None:
+            self.path = path
+
+
+def test_unique_aliases_and_names():
+    registry = ResourceRegistry([Resource("a"), Resource("a"), Resource("a-1")])
+    assert [r.alias for r in registry] == ["a", "a_1", "a-1_1"]
+    assert registry.by_name("a_1") is registry[1]
+
+
+def test_removing_a_resource_renamed_in_the_console():
+    first, second = Resource("x", "/tmp/x.wav"), Resource("z")
+    registry = ResourceRegistry([first, second])
+    first.alias = "y"
+    registry.remove(first)
+    assert first not in registry and registry.by_path("/tmp/x.wav") is None
+    assert list(registry) == [second]
+    # the old alias is free again
+    assert registry.unique_alias("x") == "x"
+    registry.remove_rows(0, 0)
+    assert len(registry) == 0 and registry.namespace() == {}
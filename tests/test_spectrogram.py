@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from praatkatili.spectrogram import TILE_FRAMES, SpectrogramTiles, window_size
+
+
+def full_stft(signal, n_fft, hop):
+    """
+    Frame by frame STFT over the whole signal, in dB, with the last frames zero padded.
+    """
+    window = np.hanning(n_fft)
+    padded = np.concatenate((np.asarray(signal, dtype=np.float64), np.zeros(n_fft)))
+    rows = []
+    for start in range(0, len(signal), hop):
+        frame = padded[start:start + n_fft].copy()
+        frame[max(0, len(signal) - start):] = 0.
+        frame -= frame.mean()
+        rows.append(20 * np.log10(np.abs(np.fft.rfft(frame * window)) + 1e-10))
+    return np.array(rows)
+
+
+def make_signal(n, Fs):
+    rng = np.random.RandomState(0)
+    t = np.arange(n) / float(Fs)
+    return (6000 * np.sin(2 * np.pi * 440 * t) + 500 * rng.randn(n)).astype(np.int16)
+
+
+@pytest.mark.parametrize("Fs, hop", [(16000, 64), (16000, 512), (44100, 128)])
+def test_tiles_assemble_to_full_stft(Fs, hop):
+    # not a whole number of tiles, so that the last one is partial
+    signal = make_signal(3 * TILE_FRAMES * hop + 5 * hop + 7, Fs)
+    tiles = SpectrogramTiles(signal, Fs)
+    assert tiles.n_fft == window_size(Fs)
+    indices = tiles.tiles_in(0., tiles.duration(), hop)
+    assert indices == [0, 1, 2, 3]
+    assembled = np.vstack([tiles.compute(hop, i) for i in indices])
+    expected = full_stft(signal, tiles.n_fft, hop)
+    assert assembled.shape == expected.shape
+    # the tiles are float32
+    np.testing.assert_allclose(assembled, expected, atol=1e-3)
+    assert tiles.compute(hop, len(indices)) is None
+
+
+def test_tile_spans_cover_the_signal():
+    Fs, hop = 16000, 256
+    tiles = SpectrogramTiles(make_signal(Fs * 10, Fs), Fs)
+    spans = [tiles.tile_span(hop, i) for i in tiles.tiles_in(0., 10., hop)]
+    assert spans[0][0] == 0. and spans[-1][1] == pytest.approx(10.)
+    assert all(a[1] == pytest.approx(b[0]) for a, b in zip(spans, spans[1:]))
+    assert tiles.tiles_in(4.2, 4.3, hop) == [int(4.2 * Fs // (TILE_FRAMES * hop))]
+
+
+def test_channels_are_averaged_and_cached():
+    Fs, hop = 16000, 32
+    # two tiles
+    mono = make_signal(Fs, Fs)
+    stereo = np.column_stack((mono, mono))
+    tiles = SpectrogramTiles(stereo, Fs, max_tiles=1)
+    np.testing.assert_allclose(tiles.compute(hop, 0), SpectrogramTiles(mono, Fs).compute(hop, 0), atol=1e-4)
+    assert tiles.get(hop, 0) is not None
+    tiles.compute(hop, 1)
+    # evicted
+    assert tiles.get(hop, 0) is None
@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from praatkatili.tabular import SAMPLE_ROWS, load_table, read_sidecar, read_table, sidecar_path, sniff
+
+
+def write(path, text):
+    with open(path, "w", newline="") as f:
+        f.write(text)
+    return path
+
+
+@pytest.mark.parametrize("delimiter", [",", ";", "\t", "|"])
+def test_sniff_delimiter_and_header(tmp_path, delimiter):
+    rows = [["time", "f0", "label"]] + [["{:.2f}".format(i * .01), str(100 + i), "a{}".format(i % 3)]
+                                        for i in range(20)]
+    path = write(str(tmp_path / "t.csv"), "\n".join(delimiter.join(r) for r in rows) + "\n")
+    assert sniff(path) == (delimiter, True)
+    path = write(str(tmp_path / "u.csv"), "\n".join(delimiter.join(r) for r in rows[1:]) + "\n")
+    assert sniff(path) == (delimiter, False)
+
+
+def test_text_columns_are_categorical(tmp_path):
+    labels = ["short", "x" * 500, "", "short"]
+    lines = ["n,label"] + ["{},{}".format(i, labels[i % 4]) for i in range(3000)]
+    path = write(str(tmp_path / "t.csv"), "\n".join(lines) + "\n")
+    columns = read_table(path, chunk_rows=700)
+    label = columns["label"]
+    assert isinstance(label, pd.Categorical)
+    # one code per row, each distinct value once
+    assert label.codes.dtype == np.int8
+    assert len(label.categories) == 2
+    expected = [None if not l else l for l in labels] * 750
+    assert [None if pd.isna(v) else v for v in label] == expected
+    np.testing.assert_array_equal(columns["n"], np.arange(3000.))
+
+
+def test_types_beyond_the_sample_are_read_again(tmp_path):
+    values = [str(i) for i in range(SAMPLE_ROWS + 500)]
+    values[SAMPLE_ROWS + 100] = "unknown"
+    path = write(str(tmp_path / "t.csv"), "a,b\n" + "\n".join("{},{}".format(v, i) for i, v in enumerate(values)) + "\n")
+    columns = read_table(path, chunk_rows=400)
+    assert isinstance(columns["a"], pd.Categorical)
+    assert columns["a"][SAMPLE_ROWS + 100] == "unknown"
+    assert columns["a"][5] == "5"
+    np.testing.assert_array_equal(columns["b"], np.arange(len(values)))
+
+
+def test_sidecar_roundtrip_and_invalidation(tmp_path):
+    path = write(str(tmp_path / "t.csv"), "x;y;name\n1;2.5;ä\n3;4.5;b\n5;;ä\n")
+    columns = load_table(path)
+    assert os.path.isdir(sidecar_path(path))
+    mapped = read_sidecar(path)
+    assert isinstance(mapped["x"], np.memmap)
+    assert list(mapped["name"]) == ["ä", "b", "ä"]
+    np.testing.assert_array_equal(mapped["y"], columns["y"])
+
+    # same size, other mtime
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert read_sidecar(path) is None
+    load_table(path)
+    assert read_sidecar(path) is not None
+    # other size
+    write(path, "x;y;name\n1;2.5;ä\n3;4.5;b\n5;6.5;c\n7;8.5;d\n")
+    assert read_sidecar(path) is None
+    assert list(load_table(path)["name"]) == ["ä", "b", "c", "d"]
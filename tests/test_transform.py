@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from praatkatili.transform import Transform, TransformError, apply_transform, can_write
+
+
+def test_mixed_dtype_frame_keeps_labels():
+    frame = pd.DataFrame({"a": [0, 1, 2], "b": [0., 1., 2.]}, index=[10, 11, 12])
+    assert not can_write(frame)
+    result = apply_transform(Transform("_data * 0"), frame)
+    assert list(result.columns) == ["a", "b"]
+    assert list(result.index) == [10, 11, 12]
+    assert (result.values == 0).all()
+    # the original is untouched
+    assert frame["a"].tolist() == [0, 1, 2]
+
+
+def test_frame_is_not_transformed_in_place():
+    with pytest.raises(TransformError):
+        apply_transform(Transform("_data + 1"), pd.DataFrame({"a": [1., 2.]}), in_place=True)
+
+
+def test_chunked_series_keeps_index_and_name():
+    series = pd.Series(np.arange(10.), index=np.arange(10) * .5, name="F0")
+    result = apply_transform(Transform("_data * 2"), series, chunk_size=3)
+    assert result.name == "F0"
+    np.testing.assert_array_equal(result.index, series.index)
+    np.testing.assert_array_equal(result.values, series.values * 2)
+
+
+def test_in_place_writes_the_buffer():
+    data = np.ones((4, 2))
+    assert can_write(data)
+    assert apply_transform(Transform("_data * 3"), data, in_place=True, chunk_size=3) is data
+    assert (data == 3).all()
+
+
+def test_read_only_buffer_is_not_writable():
+    data = np.ones(3)
+    data.flags.writeable = False
+    assert not can_write(data)
+    with pytest.raises(TransformError):
+        apply_transform(Transform("_data + 1"), data, in_place=True)